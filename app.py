@@ -1,37 +1,36 @@
-import pickle
-import pandas as pd
-from source.charts_manager import ChartsManager, city_canton_jobs
-from source.plotting import draw_canton_and_bubble_chart, draw_pie_chart, draw_bar_charts
-
-# Loads dataframes
+import os
+from source.snapshot import load_snapshot
+from source.search import load_index
+from source.timeseries import load_timeseries
+from source.charts_manager import ChartsManager
+
+# Loads the prepared state of the app : counts, initial figures and dropdown options
+# built by `python -m source.snapshot ./Data/`, rebuilt here if missing or outdated
 DATA_DIR = './Data/'
-df_city_coordinates = pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')
-df_canton_naming = pd.read_csv(DATA_DIR +'canton_naming.csv', index_col='Idx')
-df_jobs = pickle.load(open(DATA_DIR +'/df_jobs.p', 'rb'))
-df_count_city, df_count_canton = city_canton_jobs(df_jobs=df_jobs, city_coordinates=df_city_coordinates,
-                                                 job_function=False, canton_naming=df_canton_naming)
-
-bar_plot_height = 150
-scale_bubble = 1 #800 / df_count_city['All Jobs'].max()
-job_function = 'All Jobs'
-fig_map = draw_canton_and_bubble_chart(job_function, df_count_city, df_count_canton, scale_bubble, DATA_DIR, bar_plot_height)
-
-# Pie chart
-fig_pie = draw_pie_chart(df_jobs, bar_plot_height)
-
-# Bar charts
-fig_Canton_bar, fig_city_bar = draw_bar_charts(df_count_city, df_count_canton, job_function, bar_plot_height)
+snapshot = load_snapshot(DATA_DIR)
+# full-text index of the job descriptions built by `python -m source.search ./Data/`, the search box is disabled
+# without it
+search_index = load_index(DATA_DIR)
+# daily counts of the jobs built by `python -m source.timeseries ./Data/`, the line chart is hidden without them
+timeseries = load_timeseries(DATA_DIR)
+dataset_version = '-'.join([snapshot.version] + [data.version for data in (search_index, timeseries)
+                                                 if data is not None])
 
 selected_button_style = {'border-color': '#e14c4e', 'background-color': '#dc1e14', 'color': '#FFFFFF', 'border-width': '2px'}
 unselected_button_style = {}
 
-job_map_app = ChartsManager(df_jobs, df_city_coordinates, df_canton_naming,
-                fig_map, fig_pie, fig_Canton_bar, fig_city_bar,
-                selected_button_style, unselected_button_style)
+job_map_app = ChartsManager(snapshot.job_cube,
+                snapshot.figures['Swiss-Employment-Map'], snapshot.figures['fun-pie'],
+                snapshot.figures['Canton_bar'], snapshot.figures['city_bar'],
+                selected_button_style, unselected_button_style,
+                layout_options=snapshot.layout_options, dataset_version=dataset_version,
+                profiling=os.environ.get('SWISSJOBMAP_PROFILING') == '1',
+                diagnostics=os.environ.get('SWISSJOBMAP_METRICS') == '1', search_index=search_index,
+                dedup_cube=snapshot.dedup_cube, timeseries=timeseries)
 
-del df_count_city, df_count_canton, df_jobs
+del snapshot
 
 server = job_map_app.app.server
 
 if __name__ == '__main__':
-    job_map_app.app.run_server(debug=False)
\ No newline at end of file
+    job_map_app.app.run_server(debug=False)
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+sys.path.append('scrapping')  # the scrapper modules are run as scripts from their folder
+from data_formatting import canton_cleaning, get_canton_from_city, CANTON_CODE
+from benchmarks.synthetic import DATA_DIR
+
+"""
+Compares `canton_cleaning` with the former per row loop on scrapped-like locations, and times the municipality
+lookup with and without its cache. The official municipality geojson is not shipped with the repo : it is
+replaced by one built from the city coordinates.
+Run from the repository root : python -m benchmarks.bench_canton_cleaning [n_rows]
+"""
+
+
+def canton_cleaning_loop(df, DATA_DIR):
+    """
+    Former implementation : one .loc read and write per job, then a lambda over the unknown cantons
+    """
+    for job in df.index:
+        try:
+            df.loc[job, 'canton'] = CANTON_CODE[df.loc[job, 'canton']]
+        except KeyError:
+            df.loc[job, 'canton'] = 'unknown'
+    df.loc[df.city == 'Zurich', 'canton'] = 'ZH'
+    df.loc[df.city == 'Geneve', 'canton'] = 'GE'
+    df.loc[df.city == 'Bern', 'canton'] = 'BE'
+    df.loc[df.city == 'Basel', 'canton'] = 'BS'
+
+    city_canton_hash = get_canton_from_city(DATA_DIR)
+    df.loc[df.canton == 'unknown', 'canton'] = \
+        df.loc[df.canton == 'unknown', 'city']. \
+            apply(lambda x: city_canton_hash[x] if x in city_canton_hash.keys() \
+            else 'unknown')
+    return df
+
+
+def write_municipalities(df_city_coordinates, TMP_DIR) -> None:
+    """
+    Writes a SwissMunicipalities.geojson holding the municipalities of the city coordinates
+    """
+    features = [{'type': 'Feature', 'properties': {'NAME': row.municipality, 'CantonCODE': row.canton},
+                 'geometry': {'type': 'Point', 'coordinates': [row.lon, row.lat]}}
+                for row in df_city_coordinates.itertuples()]
+    with open(os.path.join(TMP_DIR, 'SwissMunicipalities.geojson'), 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def make_locations(n_rows, df_city_coordinates, seed=0) -> pd.DataFrame:
+    """
+    Scrapped-like `city` and `canton` columns : canton names in several languages, cantons missing or
+    unknown, cities outside of the municipalities, missing cities
+    """
+    rng = np.random.default_rng(seed)
+    cities = np.concatenate([df_city_coordinates['municipality'].values, ['Zurich', 'Geneve', 'Basel', 'Bern',
+                                                                          'Greater Zurich', 'unknown', 'Nowhere']])
+    cantons = np.array(list(CANTON_CODE) + ['Zurich Area', 'Switzerland', 'ZH'], dtype=object)
+    df = pd.DataFrame({'title': 'job', 'city': rng.choice(cities, n_rows).astype(object),
+                       'canton': rng.choice(cantons, n_rows)})
+    df.loc[rng.random(n_rows) < 0.1, 'canton'] = np.nan
+    df.loc[rng.random(n_rows) < 0.02, 'city'] = np.nan
+    return df
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    df_city_coordinates = pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')
+    df = make_locations(n_rows, df_city_coordinates)
+
+    with tempfile.TemporaryDirectory() as TMP_DIR:
+        TMP_DIR += '/'
+        write_municipalities(df_city_coordinates, TMP_DIR)
+        start = time.perf_counter()
+        get_canton_from_city(TMP_DIR)
+        t_geojson = time.perf_counter() - start
+        start = time.perf_counter()
+        get_canton_from_city(TMP_DIR)
+        t_cache = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = canton_cleaning_loop(df.copy(), TMP_DIR)
+        t_loop = time.perf_counter() - start
+        start = time.perf_counter()
+        cleaned = canton_cleaning(df.copy(), TMP_DIR)
+        t_vectorized = time.perf_counter() - start
+
+    n_mismatch = int((expected['canton'] != cleaned['canton']).sum())
+    print('{} jobs'.format(n_rows))
+    print('municipality lookup : geojson {:.4f}s - cache {:.4f}s'.format(t_geojson, t_cache))
+    print('per row loop : {:.3f}s - vectorized : {:.4f}s - x{:.0f}'.format(t_loop, t_vectorized,
+                                                                          t_loop / t_vectorized))
+    print('cantons differing : {}'.format(n_mismatch))
+    sys.exit(1 if n_mismatch else 0)
@@ -0,0 +1,65 @@
+import sys
+import time
+import pandas as pd
+from source.charts_manager import city_canton_jobs
+from source.locations import Locations
+from benchmarks.synthetic import make_df_jobs, to_dense_df_jobs, DATA_DIR
+
+"""
+Compares `city_canton_jobs` with the former per job function groupby/merge loop.
+Run from the repository root : python -m benchmarks.bench_city_canton_jobs [n_rows]
+"""
+
+
+def city_canton_jobs_loop(df_jobs, city_coordinates, canton_naming=None):
+    """
+    Former implementation : one groupby and one merge per job function over a dense dummy dataframe
+    """
+    df_count = df_jobs[['title', 'city', 'canton']].groupby(['city', 'canton']). \
+        count().rename(columns={'title': 'All Jobs'}).reset_index()
+    df_count_city = df_count.merge(city_coordinates,
+                                   left_on=['city', 'canton'],
+                                   right_on=['municipality', 'canton']).drop(columns=['city'])
+    for job_function in df_jobs.columns[5:]:
+        df_count_tmp = df_jobs[[job_function, 'city', 'canton']]. \
+            groupby(['city', 'canton']).sum().astype(int).reset_index()
+        df_count_city = df_count_city.merge(df_count_tmp, left_on=['municipality', 'canton'],
+                                            right_on=['city', 'canton']).drop(columns=['city'])
+
+    df_count_canton = df_count_city.drop(columns=['municipality', 'lat', 'lon']). \
+        groupby('canton').sum().reset_index()
+    if canton_naming is not None:
+        df_count_canton = df_count_canton.merge(canton_naming, left_on=['canton'], right_on=['canton'])
+    return df_count_city, df_count_canton
+
+
+def timeit(func, *args, **kwargs) -> [float, object]:
+    """
+    Returns the wall time of a single call and its result
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    df_city_coordinates = pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')
+    df_canton_naming = pd.read_csv(DATA_DIR + 'canton_naming.csv', index_col='Idx')
+    locations = Locations(df_city_coordinates, df_canton_naming)
+    df_jobs, function_matrix = make_df_jobs(n_rows)
+    df_jobs_dense = to_dense_df_jobs(df_jobs, function_matrix)
+
+    t_loop, (city_loop, canton_loop) = timeit(city_canton_jobs_loop, df_jobs_dense, df_city_coordinates,
+                                              df_canton_naming)
+    t_single, (city_single, canton_single) = timeit(city_canton_jobs, df_jobs, function_matrix, locations)
+    pd.testing.assert_frame_equal(city_loop, city_single, check_dtype=False)
+    pd.testing.assert_frame_equal(canton_loop, canton_single, check_dtype=False)
+
+    subset = function_matrix.functions[:10]
+    t_subset, _ = timeit(city_canton_jobs, df_jobs, function_matrix, locations, functions=subset)
+
+    print('{:,} jobs - {} job functions'.format(n_rows, len(function_matrix.functions)))
+    print('per function loop   : {:8.3f} s'.format(t_loop))
+    print('single aggregation  : {:8.3f} s  (x{:.1f})'.format(t_single, t_loop / t_single))
+    print('10 functions subset : {:8.3f} s'.format(t_subset))
@@ -0,0 +1,112 @@
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from source.storage import append_jobs, load_jobs
+from benchmarks.synthetic import make_df_jobs, DATA_DIR
+
+"""
+Cold start of the web app : time from the start of the server process to the first byte of the page, then latency
+of the first callbacks. The former start up (eager) counted every job function twice, with `city_canton_jobs` and
+in the cube, and computed the common views before serving. The job functions are now computed on demand (lazy),
+the common views and remaining job functions being computed in a background thread once the app is built.
+Each mode is served by werkzeug in a fresh process loading the jobs from a columnar dataset.
+Run from the repository root : python -m benchmarks.bench_cold_start [n_rows] [n_days]
+"""
+
+
+def serve(mode, JOBS_DIR, port) -> None:
+    """
+    Builds the app as `app.py` does and serves it until killed
+    """
+    import pandas as pd
+    from werkzeug.serving import make_server
+    from source.locations import Locations
+    from source.charts_manager import city_canton_jobs
+    from benchmarks.bench_concurrency import build_app
+    df_jobs, function_matrix = load_jobs(JOBS_DIR, columns=['city', 'canton', 'date'])
+    if mode == 'eager':
+        city_canton_jobs(df_jobs, function_matrix, Locations(pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')))
+    job_map_app = build_app(df_jobs, function_matrix, lazy=mode == 'lazy')
+    if mode == 'eager':
+        job_map_app.warm_cache()
+    make_server('127.0.0.1', port, job_map_app.app.server, threaded=True).serve_forever()
+
+
+def first_byte(url, start, timeout=600) -> float:
+    """
+    Seconds from `start` to the first byte of `url`, retried until the server listens
+    """
+    while True:
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read(1)
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            if time.perf_counter() - start > timeout:
+                raise
+            time.sleep(0.005)
+
+
+def callback_time(url, dependency, prop_id, value) -> float:
+    """
+    Seconds of a callback of the main figure update triggered by `prop_id`
+    """
+    body = {'output': dependency['output'], 'outputs': [], 'changedPropIds': [prop_id],
+            'inputs': [{'id': i['id'], 'property': i['property'],
+                        'value': value if i['id'] + '.' + i['property'] == prop_id else None}
+                       for i in dependency['inputs']],
+            'state': [{'id': 'view-state', 'property': 'data', 'value': None}]}
+    request = urllib.request.Request(url + '/_dash-update-component', data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def measure(mode, JOBS_DIR, functions, city) -> dict:
+    """
+    Timings of a cold start of the app
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    url = 'http://127.0.0.1:{}'.format(port)
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_cold_start', 'serve', mode, JOBS_DIR,
+                               str(port)])
+    try:
+        timings = {'first byte': first_byte(url + '/', start)}
+        with urllib.request.urlopen(url + '/_dash-dependencies') as response:
+            dependency = [d for d in json.loads(response.read()) if 'view-state' in d['output']][0]
+        timings['first job function'] = callback_time(url, dependency, 'function-DD.value', functions[-1])
+        timings['first city'] = callback_time(url, dependency, 'city_DD.value', city)
+        timings['next job function'] = callback_time(url, dependency, 'function-DD.value', functions[-2])
+    finally:
+        server.kill()
+        server.wait()
+    return timings
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        sys.exit(0)
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n_days = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    df_jobs, function_matrix = make_df_jobs(n_rows, n_days=n_days)
+    with tempfile.TemporaryDirectory() as JOBS_DIR:
+        append_jobs(df_jobs, function_matrix, JOBS_DIR)
+        results = {mode: measure(mode, JOBS_DIR, function_matrix.functions, df_jobs['city'].iloc[0])
+                   for mode in ('eager', 'lazy')}
+
+    print('{:,} jobs - {} job functions - {} days'.format(n_rows, len(function_matrix.functions), n_days))
+    for name in results['eager']:
+        print('{:20s} : eager {:7.3f}s - lazy {:7.3f}s'.format(name, results['eager'][name], results['lazy'][name]))
@@ -0,0 +1,127 @@
+import sys
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from source.locations import Locations
+from source.aggregation import JobCube
+from source.charts_manager import ChartsManager
+from source.plotting import draw_canton_and_bubble_chart, draw_pie_chart, draw_bar_charts
+from benchmarks.synthetic import make_df_jobs, DATA_DIR
+
+"""
+Fires interleaved callbacks from simulated sessions on a single app instance (as gunicorn threads would) and checks
+that every session gets the responses it gets when it is alone on the server. The response and payload caches are
+emptied before each pass, so that the concurrent pass computes the views and responses instead of replaying the
+ones cached by the sequential pass, and their hit rates are reported.
+Run from the repository root : python -m benchmarks.bench_concurrency [n_sessions] [n_threads]
+"""
+
+N_STEPS = 30
+
+
+def build_app(df_jobs, function_matrix, lazy=True, search_index=None, timeseries=None,
+              delta_updates=True) -> ChartsManager:
+    """
+    Builds the web app as `app.py` does (its diagnostics routes served), all the job functions being computed at
+    creation if not `lazy`
+    """
+    df_city_coordinates = pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')
+    df_canton_naming = pd.read_csv(DATA_DIR + 'canton_naming.csv', index_col='Idx')
+    locations = Locations(df_city_coordinates, df_canton_naming)
+    job_cube = JobCube(df_jobs, function_matrix, locations, lazy=lazy)
+    df_count_city, df_count_canton = job_cube.city_canton_frames((0, len(job_cube.dates) - 1), columns=['All Jobs'])
+    fig_map = draw_canton_and_bubble_chart('All Jobs', df_count_city, df_count_canton, 1, DATA_DIR, 150)
+    fig_pie = draw_pie_chart(function_matrix, 150)
+    fig_Canton_bar, fig_city_bar = draw_bar_charts(df_count_city, df_count_canton, 'All Jobs', 150)
+    return ChartsManager(job_cube,
+                         fig_map, fig_pie, fig_Canton_bar, fig_city_bar,
+                         {'background-color': '#dc1e14'}, {}, delta_updates=delta_updates,
+                         search_index=search_index, timeseries=timeseries, diagnostics=True)
+
+
+def session_interactions(job_map_app, seed) -> list:
+    """
+    Random sequence of (prop_id, value) interactions of a user
+    """
+    rng = random.Random(seed)
+    cube = job_map_app.cube
+    n_dates = len(cube.dates)
+    choices = [lambda: ('map-' + rng.choice('cCb') + '.n_clicks', 1),
+               lambda: ('function-DD.value', rng.choice(cube.job_functions)),
+               lambda: ('fun-pie.clickData', {'points': [{'label': rng.choice(cube.job_functions)}]}),
+               lambda: ('Canton_DD.value', rng.choice(list(cube.cantons))),
+               lambda: ('city_DD.value', rng.choice(list(cube.df_cities['municipality']))),
+               lambda: ('staff-' + rng.choice(['on', 'off']) + '.n_clicks', 1),
+               lambda: ('DateSlider.value', sorted(rng.sample(range(n_dates), 2)))]
+    return [rng.choice(choices)() for _ in range(N_STEPS)]
+
+
+def run_session(client, dependency, interactions, date_range=(0, 1)) -> list:
+    """
+    Plays the interactions of a session, the view state returned by a callback is sent back with the next one
+    """
+    values = {'DateSlider.value': list(date_range)}
+    view_state, responses = None, []
+    for prop_id, value in interactions:
+        values[prop_id] = value
+        body = {'output': dependency['output'], 'outputs': [], 'changedPropIds': [prop_id],
+                'inputs': [{'id': i['id'], 'property': i['property'],
+                            'value': values.get(i['id'] + '.' + i['property'])} for i in dependency['inputs']],
+                'state': [{'id': 'view-state', 'property': 'data', 'value': view_state}]}
+        response = json.loads(client.post('/_dash-update-component', json=body).data)['response']
+        view_state = response['view-state']['data']
+        responses.append(response)
+    return responses
+
+
+def hit_rates(job_map_app, run) -> [object, dict]:
+    """
+    Empties the response and payload caches, calls `run()` and returns its result with the hit rate of each cache
+    """
+    caches = {'response': job_map_app.response_cache.callbacks, 'payload': job_map_app.payload_cache}
+    for cache in caches.values():
+        cache.invalidate()
+    before = {name: cache.stats() for name, cache in caches.items()}
+    result = run()
+    rates = {}
+    for name, cache in caches.items():
+        hits, misses = (cache.stats()[counter] - before[name][counter] for counter in ('hits', 'misses'))
+        rates[name] = hits / max(hits + misses, 1)
+    return result, rates
+
+
+if __name__ == '__main__':
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    job_map_app = build_app(*make_df_jobs(100000))
+    client = job_map_app.app.server.test_client()
+    dependency = [d for d in client.get('/_dash-dependencies').get_json() if 'view-state' in d['output']][0]
+    sessions = [session_interactions(job_map_app, seed) for seed in range(n_sessions)]
+
+    def run_concurrent():
+        with ThreadPoolExecutor(n_threads) as pool:
+            return list(pool.map(lambda interactions: run_session(job_map_app.app.server.test_client(),
+                                                                  dependency, interactions), sessions))
+
+    start = time.perf_counter()
+    expected, sequential_rates = hit_rates(
+        job_map_app, lambda: [run_session(client, dependency, interactions) for interactions in sessions])
+    t_sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent, concurrent_rates = hit_rates(job_map_app, run_concurrent)
+    t_concurrent = time.perf_counter() - start
+
+    n_mismatch = sum(e != c for e, c in zip(expected, concurrent))
+    n_requests = n_sessions * N_STEPS
+    print('{} sessions x {} callbacks - {} threads - caches emptied before each pass'.format(n_sessions, N_STEPS,
+                                                                                           n_threads))
+    for name, t_pass, rates in [('sequential', t_sequential, sequential_rates),
+                                ('concurrent', t_concurrent, concurrent_rates)]:
+        print('{} : {:8.1f} callbacks/s - hit rate : response cache {:5.1%}, payload cache {:5.1%}'.format(
+            name, n_requests / t_pass, rates['response'], rates['payload']))
+    print('sessions with diverging responses : {}'.format(n_mismatch))
+    sys.exit(1 if n_mismatch else 0)
@@ -0,0 +1,131 @@
+import sys
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+sys.path.append('scrapping')  # the scrapper modules are run as scripts from their folder
+from scrapper import EXTRACTORS, parse_job_page
+from extractors import extract_fields
+from dates import parse_job_date, parse_job_dates
+from benchmarks.job_pages import load_job_pages
+
+"""
+Posting dates of job pages whose `posted time ago` texts take the forms met on the job pages, fetched at FETCHED :
+ - pages : pages failed to be parsed and pages with a wrong date, with the former parser (split text, anchored to
+   the day of the parsing) and with each extraction backend anchored to the fetch,
+ - column : a column of `n_texts` texts fetched at different times parsed at once by `parse_job_dates`, against
+   `parse_job_date` and the former parser row by row, the dates of the column being compared with the row ones.
+Run from the repository root : python -m benchmarks.bench_dates [n_pages] [n_texts]
+"""
+
+FETCHED = datetime(2020, 12, 31, 1, 30)
+# `posted time ago` HTML --> posting date of a page fetched at FETCHED
+POSTED_DATES = {'30 minutes ago': date(2020, 12, 31),
+                'an hour ago': date(2020, 12, 31),
+                '2 hours ago': date(2020, 12, 30),
+                'Just now': date(2020, 12, 31),
+                'Yesterday': date(2020, 12, 30),
+                '1 day ago': date(2020, 12, 30),
+                '3 days ago': date(2020, 12, 28),
+                'Reposted 3 days ago': date(2020, 12, 28),
+                '1 week ago': date(2020, 12, 24),
+                '2 weeks ago': date(2020, 12, 17),
+                '30+ days ago': date(2020, 12, 1),
+                '1 month ago': date(2020, 11, 30),
+                '2 months ago': date(2020, 10, 31),
+                '1 year ago': date(2019, 12, 31),
+                '<time datetime="2020-12-15">Dec 15, 2020</time>': date(2020, 12, 15)}
+
+
+def former_parse_job_date(time_text: str) -> date:
+    """
+    Former parser : the first two words of the text, relative to the day of the parsing, a month being 4 weeks
+    """
+    time_raw = time_text.split()[:2]
+    time_scale = time_raw[1]
+    if time_scale in ['minutes', 'minute', 'hour', 'hours', 'seconds', 'Just']:
+        return date.today()
+    elif time_scale in ('day', 'days'):
+        return date.today() - timedelta(days=int(time_raw[0]))
+    elif time_scale in ('week', 'weeks'):
+        return date.today() - timedelta(weeks=int(time_raw[0]))
+    elif time_scale in ('month', 'months'):
+        return date.today() - timedelta(weeks=4 * int(time_raw[0]))
+    raise ValueError
+
+
+def former_dates(texts) -> list:
+    """
+    Dates of the former parser, None when it raises
+    """
+    dates = []
+    for text in texts:
+        try:
+            dates.append(former_parse_job_date(text))
+        except (ValueError, IndexError):
+            dates.append(None)
+    return dates
+
+
+def bench_pages(n_pages) -> int:
+    """
+    Prints the failed pages and wrong dates of each parser, returns the number of failed checks
+    """
+    posted = list(POSTED_DATES)
+    pages = list(load_job_pages(n_pages, posted=posted).values())
+    expected = [POSTED_DATES[posted[i % len(posted)]] for i in range(n_pages)]
+    print('{} pages - {} forms of posting dates, fetched on {}'.format(n_pages, len(posted), FETCHED))
+
+    dates = former_dates(extract_fields(page)['posted'] for page in pages)
+    print('former parser : {:5d} pages failed - {:5d} wrong dates'.format(
+        sum(day is None for day in dates), sum(day is not None and day != ref for day, ref in zip(dates, expected))))
+
+    n_failed = 0
+    for extractor in EXTRACTORS:
+        start = time.perf_counter()
+        jobs = [parse_job_page(page, extractor, fetched=FETCHED) for page in pages]
+        elapsed = time.perf_counter() - start
+        failed = sum(not job for job in jobs)
+        wrong = sum(bool(job) and job['date'] != ref for job, ref in zip(jobs, expected))
+        print('{:13s} : {:5d} pages failed - {:5d} wrong dates - {:8.1f} pages/s'.format(
+            extractor, failed, wrong, n_pages / elapsed))
+        n_failed += failed + wrong
+    return n_failed
+
+
+def bench_column(n_texts, seed=0) -> int:
+    """
+    Prints the parsing time of a column of texts, returns the number of dates differing from the row by row ones
+    """
+    rng = np.random.default_rng(seed)
+    texts = [text for text in POSTED_DATES if not text.startswith('<')]
+    time_texts = pd.Series(np.array(texts, dtype=object)[rng.integers(0, len(texts), n_texts)])
+    fetched = pd.Series(pd.Timestamp(FETCHED) - pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, n_texts), unit='s'))
+    datetime_attrs = pd.Series(np.where(rng.random(n_texts) < 0.1, '2020-12-15T08:00:00', None))
+
+    start = time.perf_counter()
+    dates = parse_job_dates(time_texts, fetched, datetime_attrs)
+    t_column = time.perf_counter() - start
+
+    start = time.perf_counter()
+    row_dates = [parse_job_date(text, day, datetime_attr) for text, day, datetime_attr in
+                 zip(time_texts, fetched.dt.to_pydatetime(), datetime_attrs)]
+    t_rows = time.perf_counter() - start
+
+    start = time.perf_counter()
+    former = former_dates(time_texts)
+    t_former = time.perf_counter() - start
+
+    n_differing = int((dates.values != np.array(row_dates, dtype=object)).sum())
+    print('{} texts : column {:.3f}s - row by row {:.3f}s - former parser row by row {:.3f}s ({} failed)'.format(
+        n_texts, t_column, t_rows, t_former, sum(day is None for day in former)))
+    print('  dates of the column differing from the row by row ones : {}'.format(n_differing))
+    return n_differing
+
+
+if __name__ == '__main__':
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    n_texts = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+
+    n_failed = bench_pages(n_pages) + bench_column(n_texts)
+    sys.exit(1 if n_failed else 0)
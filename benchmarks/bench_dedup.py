@@ -0,0 +1,149 @@
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from source.storage import append_jobs, load_jobs, job_keys, CLUSTER_COLUMN
+from source.dedup import NearDuplicates, job_texts
+from benchmarks.synthetic import make_df_jobs, make_df_content, SIZES
+
+"""
+Near-duplicate detection on synthetic jobs holding known near-duplicates : a share of the jobs is posted again
+later, either unchanged (repost) or lightly edited (a few words replaced, a paragraph dropped, a title suffix).
+The jobs are assigned to their clusters in the order of their dates, by chunks of `chunk_size` jobs as the scrapping
+pipeline does, and the clusters are compared with the known ones :
+ - precision and recall over the pairs of jobs of a same cluster,
+ - ingest time per 1000 jobs as the dataset grows, that stays flat as long as the candidate lookups are sub-linear,
+ - the clusters of a run stored by append_jobs and resumed from the stored signatures, same as the in-memory run.
+Run from the repository root : python -m benchmarks.bench_dedup [sizes] [chunk_size]      e.g. 10k,100k 1000
+"""
+
+DUPLICATE_SHARE = 0.2
+EDITED_SHARE = 0.5  # among the duplicates
+MIN_PRECISION, MIN_RECALL = 0.95, 0.9
+# the distinct offers are described by distinct paragraphs (the scrapped descriptions share many short ones)
+MIN_WORDS = 20
+
+
+def edit_content(content, rng) -> str:
+    """
+    Light edit of a job description : a paragraph dropped (if any left) and 1% of the words replaced
+    """
+    paragraphs = content.split('<br/>')
+    if len(paragraphs) > 3:
+        del paragraphs[rng.integers(1, len(paragraphs))]
+    words = '<br/>'.join(paragraphs).split(' ')
+    for idx in rng.integers(0, len(words), max(1, len(words) // 100)):
+        words[idx] = 'edited'
+    return ' '.join(words)
+
+
+def make_near_duplicates(n_rows, seed=0) -> [pd.DataFrame, object, pd.DataFrame, np.ndarray]:
+    """
+    Synthetic jobs and contents, `DUPLICATE_SHARE` of them being posted again 1 to 10 days later, `EDITED_SHARE`
+    of the copies being edited
+
+    Returns the jobs (ordered by date), their FunctionMatrix, their contents and the index of the original job of
+    each job (known cluster)
+    """
+    rng = np.random.default_rng(seed)
+    df_jobs, function_matrix = make_df_jobs(n_rows, seed=seed)
+    df_content = make_df_content(df_jobs, seed=seed, min_words=MIN_WORDS)
+    originals = np.sort(rng.choice(n_rows, int(DUPLICATE_SHARE * n_rows), replace=False))
+    edited = rng.random(len(originals)) < EDITED_SHARE
+
+    df_copies = df_jobs.iloc[originals].reset_index(drop=True)
+    df_copies['date'] = (pd.to_datetime(df_copies['date']) +
+                         pd.to_timedelta(rng.integers(1, 11, len(originals)), unit='D')).dt.date
+    df_copies.loc[edited, 'title'] = df_copies.loc[edited, 'title'] + ' (m/w/d)'
+    df_copy_content = df_content.iloc[originals].reset_index(drop=True)
+    df_copy_content[['title', 'date']] = df_copies[['title', 'date']].astype(str).values
+    df_copy_content.loc[edited, 'content'] = [edit_content(content, rng)
+                                              for content in df_copy_content.loc[edited, 'content']]
+
+    df_all = pd.concat([df_jobs, df_copies], ignore_index=True)
+    order = np.argsort(pd.to_datetime(df_all['date']).values, kind='stable')
+    truth = np.concatenate([np.arange(n_rows), originals])[order]
+    return (df_all.iloc[order].reset_index(drop=True), function_matrix.take(np.concatenate([np.arange(n_rows),
+                                                                                           originals])[order]),
+            pd.concat([df_content, df_copy_content], ignore_index=True), truth)
+
+
+def pair_scores(clusters, truth) -> [float, float]:
+    """
+    Precision and recall of the pairs of jobs put in a same cluster
+    """
+    def n_pairs(*labels):
+        counts = pd.DataFrame({idx: label for idx, label in enumerate(labels)}).value_counts().values
+        return int((counts * (counts - 1) // 2).sum())
+    found, expected, correct = n_pairs(clusters), n_pairs(truth), n_pairs(clusters, truth)
+    return correct / max(found, 1), correct / max(expected, 1)
+
+
+def ingest(near_duplicates, texts, keys, chunk_size, timings=None) -> np.ndarray:
+    """
+    Assigns the jobs chunk by chunk, the wall time of each chunk being appended to `timings`
+    """
+    clusters = []
+    for begin in range(0, len(keys), chunk_size):
+        start = time.perf_counter()
+        clusters.append(near_duplicates.assign(texts[begin:begin + chunk_size], keys[begin:begin + chunk_size])[0])
+        if timings is not None:
+            timings.append(time.perf_counter() - start)
+    return np.concatenate(clusters)
+
+
+def stored_run(df_jobs, function_matrix, df_content, chunk_size) -> np.ndarray:
+    """
+    Clusters of the jobs appended chunk by chunk with append_jobs, the second half being appended by a new index
+    loaded from the stored signatures (a later scrapping run)
+    """
+    half = len(df_jobs) // 2 // chunk_size * chunk_size
+    with tempfile.TemporaryDirectory() as DATA_DIR:
+        for begin in range(0, len(df_jobs), chunk_size):
+            if begin in (0, half):
+                near_duplicates = NearDuplicates.load(DATA_DIR)
+            df_chunk = df_jobs.iloc[begin:begin + chunk_size]
+            append_jobs(df_chunk, function_matrix.take(np.arange(begin, begin + len(df_chunk))), DATA_DIR,
+                        near_duplicates=near_duplicates, texts=job_texts(df_chunk, df_content))
+        return load_jobs(DATA_DIR, columns=[CLUSTER_COLUMN])[0][CLUSTER_COLUMN].values
+
+
+def bench_size(n_rows, chunk_size) -> int:
+    """
+    Prints the scores and ingest timings on `n_rows` synthetic jobs and their near-duplicates, returns the number
+    of failed checks
+    """
+    df_jobs, function_matrix, df_content, truth = make_near_duplicates(n_rows)
+    # the identical jobs are stored once by append_jobs
+    keys = job_keys(df_jobs)
+    is_unique = ~pd.Series(keys).duplicated().values
+    df_jobs, function_matrix = df_jobs[is_unique].reset_index(drop=True), function_matrix.take(is_unique)
+    keys, truth = keys[is_unique], truth[is_unique]
+    texts = job_texts(df_jobs, df_content)
+    print('{} jobs, {} known near-duplicates - {:.0f} words per text'.format(
+        len(df_jobs), len(df_jobs) - len(np.unique(truth)), np.mean([len(text.split()) for text in texts])))
+
+    timings = []
+    clusters = ingest(NearDuplicates(), texts, keys, chunk_size, timings)
+    precision, recall = pair_scores(clusters, truth)
+    print('  {} clusters ({} expected) - precision {:.3f}, recall {:.3f}'.format(
+        len(np.unique(clusters)), len(np.unique(truth)), precision, recall))
+    for idx in sorted({0, len(timings) // 4, len(timings) // 2, len(timings) - 1}):
+        print('  ingest with {:7d} jobs stored : {:6.1f} ms per 1000 jobs'.format(
+            idx * chunk_size, 1e3 * timings[idx] / min(chunk_size, len(keys) - idx * chunk_size) * 1000))
+
+    same = np.array_equal(stored_run(df_jobs, function_matrix, df_content, chunk_size), clusters)
+    print('  stored and resumed run : same clusters {}'.format(same))
+    # the ingest time of the last chunks must not grow with the dataset (a linear scan would)
+    flat = len(timings) < 8 or np.median(timings[-len(timings) // 4:]) < 2 * np.median(timings[:len(timings) // 4])
+    return (precision < MIN_PRECISION) + (recall < MIN_RECALL) + (not same) + (not flat)
+
+
+if __name__ == '__main__':
+    sizes = sys.argv[1].split(',') if len(sys.argv) > 1 else ['10k']
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    n_failed = sum(bench_size(SIZES[size], chunk_size) for size in sizes)
+    print('{} failed checks'.format(n_failed))
+    sys.exit(1 if n_failed else 0)
@@ -0,0 +1,74 @@
+import sys
+import time
+import tempfile
+sys.path.append('scrapping')  # the scrapper modules are run as scripts from their folder
+from selenium.common.exceptions import WebDriverException
+from scrapper import Scrapper
+from discovery import ListingDiscovery, extract_job_links, PAGE_SIZE
+from benchmarks.job_pages import make_result_cards, JobSearchServer
+
+"""
+Discovery of the job links of a paginated job search served with an artificial latency by a local stub server :
+ - http : the listing pages requested over HTTP by waves of `concurrency` pages (ListingDiscovery), also against a
+   server throttling every 10th request (429 with a Retry-After delay),
+ - selenium : the search page scrolled by a headless Chrome (`Scrapper.browse_links`, 2 seconds waited after each
+   click), skipped if Chrome is not available.
+The links found are compared with the ones of the result cards.
+Run from the repository root : python -m benchmarks.bench_discovery [n_results] [latency] [concurrency]
+"""
+
+THROTTLE_EVERY = 10
+
+
+def run_http(cards, latency, concurrency, throttle_every=0) -> [list, float, JobSearchServer]:
+    """
+    Links found by the ListingDiscovery and elapsed seconds
+    """
+    with JobSearchServer(cards, latency, PAGE_SIZE, throttle_every) as server:
+        start = time.perf_counter()
+        job_links = ListingDiscovery(server.search_link(), concurrency=concurrency)()
+        return job_links, time.perf_counter() - start, server
+
+
+def run_selenium(cards, latency) -> [list, float]:
+    """
+    Links found by scrolling the search page in the browser and elapsed seconds, None if Chrome is not available
+    """
+    with JobSearchServer(cards, latency, PAGE_SIZE) as server, tempfile.TemporaryDirectory() as DATA_DIR:
+        scrapper = Scrapper(server.search_link(), DATA_DIR=DATA_DIR, discovery='selenium')
+        start = time.perf_counter()
+        try:
+            scrapper.search_links()
+        except WebDriverException as exc:
+            print('selenium : skipped - {}'.format(str(exc).strip().splitlines()[0]))
+            return None, None
+        return scrapper.job_links, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    n_results = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    cards = make_result_cards(n_results)
+    expected = extract_job_links('\n'.join(cards))
+    n_pages = -(-n_results // PAGE_SIZE)
+    print('{} results ({} pages) - {:.0f} ms latency'.format(n_results, n_pages, latency * 1000))
+
+    n_failed = 0
+    for throttle_every in (0, THROTTLE_EVERY):
+        job_links, seconds, server = run_http(cards, latency, concurrency, throttle_every)
+        same = job_links == expected
+        n_failed += not same
+        print('http {:10s}: {:6.2f}s - {} requests ({} throttled) - same links {}'.format(
+            'throttled' if throttle_every else '', seconds, server.n_requests, server.n_throttled, same))
+
+    job_links, seconds = run_selenium(cards, latency)
+    if job_links is not None:
+        same = job_links == expected
+        n_failed += not same
+        print('selenium       : {:6.2f}s - same links {}'.format(seconds, same))
+    else:
+        # fixed waits of the scroll loop : 2s at the connection and after each of the `n_pages` clicks
+        print('selenium       : at least {:.0f}s of fixed waits'.format(2 * (n_pages + 1)))
+    sys.exit(1 if n_failed else 0)
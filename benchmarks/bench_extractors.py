@@ -0,0 +1,45 @@
+import sys
+import time
+from bs4 import BeautifulSoup
+sys.path.append('scrapping')  # the scrapper modules are run as scripts from their folder
+from scrapper import EXTRACTORS, parse_job_page
+from benchmarks.job_pages import load_job_pages
+
+"""
+Job page extraction backends over a corpus of saved job pages : pages/s of each backend and parity with the
+reference soup extraction. The raw description of the streaming backend is compared to the reference once
+re-serialized with `.prettify()`.
+Run from the repository root : python -m benchmarks.bench_extractors [n_pages]
+"""
+
+
+def same_job(reference, scrapped) -> bool:
+    """
+    True if the extraction `scrapped` holds the same job information as the `reference` soup extraction
+    """
+    if set(reference) != set(scrapped):
+        return False
+    content = BeautifulSoup(scrapped['content'], 'html.parser').div.prettify()
+    return content == reference['content'] and all(reference[key] == scrapped[key]
+                                                    for key in reference if key != 'content')
+
+
+if __name__ == '__main__':
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    pages = list(load_job_pages(n_pages).values())
+    print('{} pages - {:.1f} kB per page'.format(n_pages, sum(map(len, pages)) / n_pages / 1000))
+
+    extractions = {}
+    for extractor in EXTRACTORS:
+        start = time.perf_counter()
+        extractions[extractor] = [parse_job_page(page, extractor) for page in pages]
+        elapsed = time.perf_counter() - start
+        content_size = sum(len(job.get('content', '')) for job in extractions[extractor]) / n_pages
+        print('{:8s} : {:8.1f} pages/s - {:.1f} kB of content per page'.format(extractor, n_pages / elapsed,
+                                                                             content_size / 1000))
+
+    n_failed = {extractor: sum(not job for job in jobs) for extractor, jobs in extractions.items()}
+    n_mismatch = sum(not same_job(reference, scrapped)
+                     for reference, scrapped in zip(extractions['soup'], extractions['stream']))
+    print('pages failed to be parsed : {} - pages differing from the reference : {}'.format(n_failed, n_mismatch))
+    sys.exit(1 if any(n_failed.values()) or n_mismatch else 0)
@@ -0,0 +1,68 @@
+import sys
+import time
+from email.utils import formatdate
+from multiprocessing import cpu_count, Pool
+sys.path.append('scrapping')  # the scrapper modules are run as scripts from their folder
+from scrapper import scrap_job_page, parse_job_page
+from fetcher import Fetcher
+from benchmarks.job_pages import load_job_pages, JobPageServer
+
+"""
+Fetching and parsing of job pages served with an artificial latency by a local stub server :
+a `multiprocessing.Pool(cpu_count())` of `requests.get` (one connection per page) against the pooled Fetcher.
+The retries are checked on a server answering the first request of some pages by a 503, with a Retry-After header
+in seconds, as an HTTP-date or unreadable (the backoff applies) : every page must be fetched, after the delay.
+Run from the repository root : python -m benchmarks.bench_fetcher [n_pages] [latency] [concurrency]
+"""
+
+RETRY_AFTER = {'seconds': lambda: '1',
+               'http-date': lambda: formatdate(time.time() + 2, usegmt=True),  # whole seconds : waits 1-2 s
+               'unreadable': lambda: 'soon'}
+
+
+def bench_retry_after(pages, concurrency, throttle_every=10, backoff=0.2) -> int:
+    """
+    Prints the pages fetched and the elapsed time for each form of the Retry-After header, returns the number of
+    failed pages and of retries sent before the delay
+    """
+    n_failed = 0
+    for form, retry_after in RETRY_AFTER.items():
+        with JobPageServer(pages, 0, throttle_every, retry_after) as server:
+            with Fetcher(concurrency=concurrency, retries=2, backoff=backoff, parse_workers=0) as fetcher:
+                scrapped = fetcher.fetch_all(server.links(), parse_job_page)
+        failed = sum(not page for page in scrapped)
+        min_delay = backoff if form == 'unreadable' else 1
+        too_early = fetcher.stats['seconds'] < min_delay
+        print('Retry-After {:10s} : {} pages throttled - {} failed - {:.2f}s (at least {:.1f}s expected)'.format(
+            form, len(server.throttled), failed, fetcher.stats['seconds'], min_delay))
+        n_failed += failed + too_early
+    return n_failed
+
+if __name__ == '__main__':
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+
+    pages = load_job_pages(n_pages)
+    print('{} pages - {:.0f} ms latency - {} CPUs'.format(n_pages, latency * 1000, cpu_count()))
+
+    with JobPageServer(pages, latency) as server:
+        links = server.links()
+
+        start = time.perf_counter()
+        with Pool(cpu_count()) as p:
+            expected = p.map(scrap_job_page, links)
+        t_pool = time.perf_counter() - start
+        connections_pool, server.n_connections = server.n_connections, 0
+
+        with Fetcher(concurrency=concurrency) as fetcher:
+            scrapped = fetcher.fetch_all(links, parse_job_page)
+        t_fetcher = fetcher.stats['seconds']
+
+    n_failed = sum(not page for page in scrapped)
+    n_mismatch = sum(e != s for e, s in zip(expected, scrapped))
+    print('process pool : {:8.1f} pages/s - {} connections'.format(n_pages / t_pool, connections_pool))
+    print('fetcher      : {:8.1f} pages/s - {} connections'.format(n_pages / t_fetcher, server.n_connections))
+    print('pages failed to be parsed : {} - pages differing : {}'.format(n_failed, n_mismatch))
+    n_failed += bench_retry_after(dict(list(pages.items())[:50]), concurrency)
+    sys.exit(1 if n_failed or n_mismatch else 0)
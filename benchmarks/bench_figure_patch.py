@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+from benchmarks.synthetic import make_df_jobs
+from benchmarks.bench_concurrency import build_app, session_interactions, run_session
+
+"""
+Round trip of the figure deltas : random sessions are played against the app in delta mode, the figure deltas
+returned by the callbacks are merged into the figures of the served layout by the clientside function of the
+browser (assets/figure_patch.js, run by node), and the patched figures are compared after each interaction with the
+whole figures returned by the app with `delta_updates=False`. The sizes of the figure updates recorded per
+interaction (`/_payload-sizes`) are compared with the ones of the whole figures.
+Run from the repository root : python -m benchmarks.bench_figure_patch [n_jobs] [n_sessions]
+"""
+
+GRAPHS = ['Swiss-Employment-Map', 'fun-pie', 'Canton_bar', 'city_bar']
+PATCH_SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'source', 'assets', 'figure_patch.js')
+# applies the deltas one after the other, as the browser does, and prints the figures after each of them
+NODE_PATCH = '''
+const fs = require('fs');
+global.window = {dash_clientside: {no_update: {}}};
+require(process.argv[1]);
+const patch = window.dash_clientside.figures.patch;
+const session = JSON.parse(fs.readFileSync(process.argv[2]));
+let figures = session.figures;
+const states = session.deltas.map(function (delta) {
+    figures = patch(delta, ...figures).map(function (figure, i) {
+        return figure === window.dash_clientside.no_update ? figures[i] : figure;
+    });
+    return figures;
+});
+fs.writeFileSync(process.argv[3], JSON.stringify(states));
+'''
+
+
+def layout_figures(layout) -> dict:
+    """
+    Figures of the graphs of a served layout (JSON), by graph id
+    """
+    figures, components = {}, [layout]
+    while components:
+        component = components.pop()
+        if isinstance(component, list):
+            components += component
+        elif isinstance(component, dict) and 'props' in component:
+            if component['props'].get('id') in GRAPHS:
+                figures[component['props']['id']] = component['props']['figure']
+            components.append(component['props'].get('children'))
+    return figures
+
+
+def patched_figures(figures, deltas) -> list:
+    """
+    Figures after each delta, merged by the clientside function run by node
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        session_path, states_path = os.path.join(tmp_dir, 'session.json'), os.path.join(tmp_dir, 'states.json')
+        with open(session_path, 'w') as f:
+            json.dump({'figures': [figures[graph_id] for graph_id in GRAPHS], 'deltas': deltas}, f)
+        subprocess.run(['node', '-e', NODE_PATCH, os.path.abspath(PATCH_SCRIPT), session_path, states_path],
+                       check=True)
+        with open(states_path) as f:
+            return json.load(f)
+
+
+if __name__ == '__main__':
+    n_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    if shutil.which('node') is None:
+        print('node is not available - the clientside function cannot be run')
+        sys.exit(1)
+
+    df_jobs, function_matrix = make_df_jobs(n_jobs, n_functions=40)
+    apps = {'delta': build_app(df_jobs, function_matrix), 'whole': build_app(df_jobs, function_matrix,
+                                                                             delta_updates=False)}
+    clients = {mode: job_map_app.app.server.test_client() for mode, job_map_app in apps.items()}
+    dependencies = {mode: [d for d in client.get('/_dash-dependencies').get_json() if 'view-state' in d['output']][0]
+                    for mode, client in clients.items()}
+    figures = layout_figures(clients['delta'].get('/_dash-layout').get_json())
+    date_range = apps['delta'].initial_view_state['date_range']
+
+    n_mismatch, n_steps, whole_bytes = 0, 0, 0
+    for seed in range(n_sessions):
+        interactions = session_interactions(apps['delta'], seed)
+        # the slider starts at the date range of the served figures, as in the browser
+        deltas = [response['figure-delta']['data'] for response in
+                  run_session(clients['delta'], dependencies['delta'], interactions, date_range)]
+        wholes = run_session(clients['whole'], dependencies['whole'], interactions, date_range)
+        for step, (patched, whole) in enumerate(zip(patched_figures(figures, deltas), wholes)):
+            expected = [whole[graph_id]['figure'] for graph_id in GRAPHS]
+            whole_bytes += len(json.dumps(expected))
+            if patched != expected:
+                n_mismatch += 1
+                print('session {} step {} {} : patched figures differ from the whole figures'.format(
+                    seed, step, interactions[step][0]))
+        n_steps += len(interactions)
+
+    payload_sizes = clients['delta'].get('/_payload-sizes').get_json()
+    print('{} jobs - {} sessions x {} interactions'.format(n_jobs, n_sessions, n_steps // n_sessions))
+    for callb_id, sizes in sorted(payload_sizes['triggers'].items()):
+        print('  {:22s} {:4d} interactions - figure updates mean {:8.0f} bytes, max {:8.0f} bytes'.format(
+            callb_id, sizes['count'], sizes['mean_bytes'], sizes['max_bytes']))
+    print('  whole figures : mean {:.0f} bytes per interaction'.format(whole_bytes / n_steps))
+    print('interactions whose patched figures differ from the whole figures : {}'.format(n_mismatch))
+    sys.exit(1 if n_mismatch or len(payload_sizes['interactions']) != n_steps else 0)
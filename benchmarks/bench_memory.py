@@ -0,0 +1,62 @@
+import sys
+import resource
+import subprocess
+import pandas as pd
+from source.charts_manager import city_canton_jobs
+from source.aggregation import JobCube
+from source.locations import Locations
+from benchmarks.synthetic import make_df_jobs, to_dense_df_jobs, DATA_DIR
+
+"""
+Peak resident memory of the aggregation of the jobs with a dense dummy dataframe (former layout) and with the sparse
+FunctionMatrix. Each layout is measured in a fresh process.
+Run from the repository root : python -m benchmarks.bench_memory [n_rows]
+"""
+
+
+def city_canton_jobs_dense(df_jobs, city_coordinates):
+    """
+    Single groupby over the dense int16 dummy columns
+    """
+    functions = list(df_jobs.columns[5:])
+    df_grouped = df_jobs[['city', 'canton'] + functions].groupby(['city', 'canton'])
+    df_count = df_grouped[functions].sum().astype(int)
+    df_count.insert(0, 'All Jobs', df_grouped.size())
+    return df_count.reset_index().merge(city_coordinates, left_on=['city', 'canton'],
+                                        right_on=['municipality', 'canton'])
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of the current process (Linux : ru_maxrss in KB)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(layout, n_rows) -> None:
+    df_city_coordinates = pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')
+    df_jobs, function_matrix = make_df_jobs(n_rows)
+    if layout == 'dense':
+        df_jobs = to_dense_df_jobs(df_jobs, function_matrix)
+        del function_matrix
+        city_canton_jobs_dense(df_jobs, df_city_coordinates)
+        df_jobs[df_jobs.columns[5:]].sum()
+    else:
+        locations = Locations(df_city_coordinates)
+        city_canton_jobs(df_jobs, function_matrix, locations)
+        JobCube(df_jobs, function_matrix, locations)
+        function_matrix.sum()
+    print(peak_rss_mb())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run(sys.argv[2], int(sys.argv[1]))
+        sys.exit(0)
+
+    n_rows = sys.argv[1] if len(sys.argv) > 1 else '1000000'
+    peaks = {layout: float(subprocess.check_output([sys.executable, '-m', 'benchmarks.bench_memory', n_rows, layout]))
+             for layout in ('dense', 'sparse')}
+    print('{:,} jobs - peak RSS'.format(int(n_rows)))
+    print('dense dummies   : {:8.1f} MB'.format(peaks['dense']))
+    print('FunctionMatrix  : {:8.1f} MB'.format(peaks['sparse']))
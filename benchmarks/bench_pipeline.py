@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+sys.path.append('scrapping')  # the scrapper modules are run as scripts from their folder
+from scrapper import Scrapper
+from pipeline import ScrapPipeline, format_pages
+from data_formatting import save_dataframes
+from source.storage import load_jobs, load_content
+from benchmarks.job_pages import load_job_pages, JobPageServer
+from benchmarks.bench_canton_cleaning import write_municipalities
+from benchmarks.synthetic import DATA_DIR
+
+"""
+Scrapping runs over job pages served by a local stub server :
+ - batch : the former run, every page being kept in memory until the whole run is formatted and saved,
+ - streaming : the ScrapPipeline, the pages being formatted and stored chunk by chunk,
+ - interrupted : the ScrapPipeline stopped after two chunks, then restarted.
+The peak memory allocated by the python process (tracemalloc, the pages being parsed in worker processes) and the
+stored jobs and contents of each run are compared.
+Run from the repository root : python -m benchmarks.bench_pipeline [n_pages] [chunk_size]
+"""
+
+
+class StubScrapper(Scrapper):
+    """
+    Scrapper whose search finds the links of the stub server
+    """
+
+    def __init__(self, links, DATA_DIR):
+        super().__init__(access_link=None, DATA_DIR=DATA_DIR)
+        self.found_links = links
+        self.n_searches = 0
+
+    def search_links(self) -> None:
+        self.n_searches += 1
+        self.job_links = list(self.found_links)
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedPipeline(ScrapPipeline):
+    """
+    ScrapPipeline stopped after `n_chunks` chunks
+    """
+
+    def __init__(self, scrapper, DATA_DIR, chunk_size, n_chunks):
+        super().__init__(scrapper, DATA_DIR, chunk_size)
+        self.n_chunks = n_chunks
+
+    def commit_chunk(self, chunk, state) -> None:
+        if state['chunks'] == self.n_chunks:
+            raise Interrupted
+        super().commit_chunk(chunk, state)
+
+
+def batch_run(scrapper, RUN_DIR) -> None:
+    """
+    Former scrap.py : the pages of the whole run are collected, then formatted and saved at once
+    """
+    scrapper.search_links()
+    scrapper.skip_known_links()
+    scrapper.scrap_all_list()
+    df_jobs, function_matrix, df_content = format_pages([page for page in scrapper.get_job_pages() if page],
+                                                        RUN_DIR)
+    save_dataframes(df_jobs, function_matrix, df_content, RUN_DIR)
+    scrapper.save_job_links()
+
+
+def stored_jobs(RUN_DIR) -> [pd.DataFrame, pd.DataFrame]:
+    """
+    Stored jobs (with their job functions) and contents, sorted
+    """
+    df_jobs, function_matrix = load_jobs(RUN_DIR)
+    df_jobs = df_jobs.astype(str)
+    functions = np.asarray(function_matrix.functions, dtype=object)
+    df_jobs['functions'] = [','.join(sorted(functions[function_matrix.indices[start:end]]))
+                            for start, end in zip(function_matrix.indptr[:-1], function_matrix.indptr[1:])]
+    df_content = load_content(RUN_DIR).astype(str)
+    return (df_jobs.sort_values(list(df_jobs.columns)).reset_index(drop=True),
+            df_content.sort_values(list(df_content.columns)).reset_index(drop=True))
+
+
+def measure(run, links, TMP_DIR, name) -> [dict, str]:
+    """
+    Runs `run(scrapper, RUN_DIR)` in a new data folder, returns its peak memory and time, and the data folder
+    """
+    RUN_DIR = os.path.join(TMP_DIR, name) + '/'
+    os.makedirs(RUN_DIR)
+    write_municipalities(pd.read_csv(DATA_DIR + 'df_city_coordinates.csv'), RUN_DIR)
+    tracemalloc.start()
+    start = time.perf_counter()
+    run(StubScrapper(links, RUN_DIR), RUN_DIR)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'peak': peak, 'seconds': elapsed}, RUN_DIR
+
+
+def interrupted_run(scrapper, RUN_DIR, chunk_size) -> None:
+    """
+    Pipeline interrupted after two chunks, then restarted
+    """
+    try:
+        InterruptedPipeline(scrapper, RUN_DIR, chunk_size, n_chunks=2)()
+    except Interrupted:
+        pass
+    restarted = StubScrapper(scrapper.found_links, RUN_DIR)
+    state = ScrapPipeline(restarted, RUN_DIR, chunk_size)()
+    print('interrupted run resumed : {} searches after restart, {} chunks, {} pages'.format(
+        restarted.n_searches, state['chunks'], state['pages']))
+
+
+if __name__ == '__main__':
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    pages = load_job_pages(n_pages)
+    print('{} pages - {:.1f} kB per page - chunks of {} pages'.format(
+        n_pages, sum(map(len, pages.values())) / n_pages / 1000, chunk_size))
+
+    with JobPageServer(pages, latency=0.005) as server, tempfile.TemporaryDirectory() as TMP_DIR:
+        links = server.links()
+        results, stored = {}, {}
+        runs = {'batch': batch_run,
+                'streaming': lambda scrapper, RUN_DIR: ScrapPipeline(scrapper, RUN_DIR, chunk_size)(),
+                'interrupted': lambda scrapper, RUN_DIR: interrupted_run(scrapper, RUN_DIR, chunk_size)}
+        for name, run in runs.items():
+            results[name], RUN_DIR = measure(run, links, TMP_DIR, name)
+            stored[name] = stored_jobs(RUN_DIR)
+
+    for name, result in results.items():
+        print('{:12s} : peak memory {:7.1f} MB - {:6.2f}s'.format(name, result['peak'] / 2 ** 20, result['seconds']))
+    n_mismatch = 0
+    for name in ('streaming', 'interrupted'):
+        same = all(expected.equals(actual) for expected, actual in zip(stored['batch'], stored[name]))
+        n_mismatch += not same
+        print('{:12s} : {} jobs, {} contents stored - same as batch : {}'.format(
+            name, len(stored[name][0]), len(stored[name][1]), same))
+    sys.exit(1 if n_mismatch else 0)
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+import numpy as np
+import pandas as pd
+from source.storage import append_jobs, append_content, job_keys
+from source.search import build_index, tokenize, query_terms, SearchIndex, SEARCH_INDEX
+from benchmarks.synthetic import make_df_jobs, make_df_content, SIZES
+from benchmarks.bench_concurrency import build_app
+
+"""
+Full-text search over synthetic job descriptions of several sizes (10k, 100k, 1M jobs) :
+ - build : time to build the index from the stored jobs and contents (`python -m source.search`), size of the
+   compressed postings compared to 4 bytes per posting,
+ - queries : latency of single term, multi-term and prefix queries, and of the search view of the web app
+   (matching jobs counted per city and canton, charts updated), each query being run `n_runs` times.
+The results of the queries are checked against a scan of the documents on the smallest size.
+Run from the repository root : python -m benchmarks.bench_search [sizes] [n_runs]      e.g. 10k,100k 20
+"""
+
+BUDGET = 0.05  # seconds per query
+QUERIES = ['python', 'software engineer', 'pflege*', 'finance bank*', 'sql python java', 'team', 'zurich',
+           'projektleiter erfahrung', 'gestion clients', 'ingegnere']
+
+
+def frequency_queries(search_index) -> list:
+    """
+    Single term queries on the most frequent term, a median term and a rare term, and a query on the two most
+    frequent terms
+    """
+    order = np.argsort(search_index.doc_freq, kind='stable')[::-1]
+    terms = search_index.terms[order]
+    return [terms[0], terms[len(terms) // 2], terms[-1], terms[0] + ' ' + terms[1]]
+
+
+def latency(function, n_runs) -> dict:
+    """
+    Median and max wall time of `n_runs` calls of `function`
+    """
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'max': max(times)}
+
+
+def document_words(df_content) -> list:
+    """
+    Words of the description of each document, the jobs described several times being indexed once
+    """
+    keys = job_keys(df_content.assign(date=pd.to_datetime(df_content['date'])))
+    return [set(tokenize(content)) for content in df_content['content'][~pd.Series(keys).duplicated().values]]
+
+
+def scan(words, query) -> np.ndarray:
+    """
+    Ids of the documents containing all the terms of a query, read from the words of the documents
+    """
+    terms = query_terms(query)
+    return np.array([doc for doc, doc_words in enumerate(words)
+                     if all(any(word.startswith(term[:-1]) for word in doc_words) if term.endswith('*')
+                            else term in doc_words for term in terms)], dtype=np.int64)
+
+
+def bench_size(n_rows, n_runs, check) -> int:
+    """
+    Prints the build and query timings on `n_rows` synthetic jobs, returns the number of queries over budget
+    """
+    df_jobs, function_matrix = make_df_jobs(n_rows)
+    df_content = make_df_content(df_jobs)
+    with tempfile.TemporaryDirectory() as DATA_DIR:
+        append_jobs(df_jobs, function_matrix, DATA_DIR)
+        append_content(df_content, DATA_DIR)
+        start = time.perf_counter()
+        search_index = build_index(DATA_DIR)
+        build_time = time.perf_counter() - start
+        path = search_index.save(os.path.join(DATA_DIR, SEARCH_INDEX))
+        file_size = os.path.getsize(path)
+        start = time.perf_counter()
+        search_index = SearchIndex.load(path)
+        load_time = time.perf_counter() - start
+
+    n_postings = int(search_index.doc_freq.sum())
+    print('{} jobs - {} documents, {} terms, {} postings'.format(n_rows, len(search_index), len(search_index.terms),
+                                                                 n_postings))
+    print('  build {:.1f}s - load {:.0f} ms - postings {:.1f} MB ({:.2f} bytes per posting, {:.1f} MB as int32) - '
+          'index file {:.1f} MB'.format(build_time, 1e3 * load_time, len(search_index.postings) / 2 ** 20,
+                                        len(search_index.postings) / max(n_postings, 1), 4 * n_postings / 2 ** 20,
+                                        file_size / 2 ** 20))
+
+    job_map_app = build_app(df_jobs, function_matrix, lazy=False, search_index=search_index)
+    state = dict(job_map_app.initial_view_state)
+    words = document_words(df_content) if check else None
+    n_over = 0
+    for query in QUERIES + frequency_queries(search_index):
+        doc_ids = search_index.search(query)
+        search = latency(lambda: search_index.search(query), n_runs)
+        view = dict(state, query=' '.join(query_terms(query)))
+        charts = latency(lambda: job_map_app.compute_functions(view), n_runs)
+        n_over += charts['max'] > BUDGET
+        print('  {:28s} {:7d} jobs - search median {:6.2f} ms, max {:6.2f} ms - charts median {:6.2f} ms, '
+              'max {:6.2f} ms'.format(query, len(doc_ids), 1e3 * search['median'], 1e3 * search['max'],
+                                      1e3 * charts['median'], 1e3 * charts['max']))
+        if check and not np.array_equal(doc_ids, scan(words, query)):
+            print('  results of {} differ from the scan of the documents'.format(query))
+            n_over += 1
+    return n_over
+
+
+if __name__ == '__main__':
+    sizes = sys.argv[1].split(',') if len(sys.argv) > 1 else ['10k', '100k']
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    n_failed = 0
+    for idx, size in enumerate(sizes):
+        n_failed += bench_size(SIZES[size], n_runs, check=idx == 0)
+    print('{} queries over {:.0f} ms or wrong'.format(n_failed, 1e3 * BUDGET))
+    sys.exit(1 if n_failed else 0)
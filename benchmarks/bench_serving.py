@@ -0,0 +1,126 @@
+import sys
+import time
+import gzip
+import json
+import brotli
+from benchmarks.synthetic import make_df_jobs
+from benchmarks.bench_concurrency import build_app, session_interactions
+
+"""
+Bytes sent and serving time of the layout and of the callbacks, per accepted encoding :
+ - per request : the Dash views, the layout being serialized and the responses compressed (gzip) by Flask-Compress
+   at each request,
+ - response cache : the layout compressed once (at its first request, counted in its mean time) and revalidated
+   with its ETag, the compressed callback responses cached per request body (see source/serving.py). The sessions
+   are played twice, the second time from the cache.
+The decoded responses of both modes are checked to be identical.
+Run from the repository root : python -m benchmarks.bench_serving [n_rows] [n_sessions]
+"""
+
+N_LAYOUT_REQUESTS = 20
+ACCEPT_ENCODINGS = {'identity': '', 'gzip': 'gzip, deflate', 'br': 'gzip, deflate, br'}
+
+
+def decode(response) -> dict:
+    """
+    JSON content of a (compressed) response
+    """
+    body = response.get_data()
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'br':
+        body = brotli.decompress(body)
+    elif encoding == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+def per_request(job_map_app) -> None:
+    """
+    Restores the Dash views of the layout and of the callbacks
+    """
+    app = job_map_app.app
+    prefix = app.config.routes_pathname_prefix
+    app.server.view_functions[prefix + '_dash-layout'] = app.serve_layout
+    app.server.view_functions[prefix + '_dash-update-component'] = job_map_app.response_cache.dispatch
+
+
+def play_sessions(client, dependency, sessions, accept_encoding) -> [list, int, float]:
+    """
+    Plays the sessions, returns the decoded responses, the bytes received and the time spent
+    """
+    responses, n_bytes, start = [], 0, time.perf_counter()
+    for interactions in sessions:
+        values = {'DateSlider.value': [0, 1]}
+        view_state = None
+        for prop_id, value in interactions:
+            values[prop_id] = value
+            body = {'output': dependency['output'], 'outputs': [], 'changedPropIds': [prop_id],
+                    'inputs': [{'id': i['id'], 'property': i['property'],
+                                'value': values.get(i['id'] + '.' + i['property'])}
+                               for i in dependency['inputs']],
+                    'state': [{'id': 'view-state', 'property': 'data', 'value': view_state}]}
+            response = client.post('/_dash-update-component', json=body,
+                                   headers={'Accept-Encoding': accept_encoding})
+            n_bytes += len(response.get_data())
+            responses.append(decode(response)['response'])
+            view_state = responses[-1]['view-state']['data']
+    return responses, n_bytes, time.perf_counter() - start
+
+
+def serve_layout(client, accept_encoding) -> [dict, int, float]:
+    """
+    Layout, size in bytes and mean serving time of the layout
+    """
+    start = time.perf_counter()
+    for _ in range(N_LAYOUT_REQUESTS):
+        response = client.get('/_dash-layout', headers={'Accept-Encoding': accept_encoding})
+    return decode(response), len(response.get_data()), (time.perf_counter() - start) / N_LAYOUT_REQUESTS
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    n_sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    job_map_app = build_app(*make_df_jobs(n_rows))
+    job_map_app.warm_cache()
+    job_map_app.cube.fill()
+    client = job_map_app.app.server.test_client()
+    dependency = [d for d in client.get('/_dash-dependencies').get_json() if 'view-state' in d['output']][0]
+    sessions = [session_interactions(job_map_app, seed) for seed in range(n_sessions)]
+    n_callbacks = sum(len(interactions) for interactions in sessions)
+
+    results = {}
+    for encoding, accept_encoding in ACCEPT_ENCODINGS.items():
+        layout, layout_bytes, layout_time = serve_layout(client, accept_encoding)
+        etag = client.get('/_dash-layout').headers['ETag']
+        revalidation = client.get('/_dash-layout', headers={'If-None-Match': etag})
+        first = play_sessions(client, dependency, sessions, accept_encoding)
+        cached = play_sessions(client, dependency, sessions, accept_encoding)
+        results[encoding] = {'layout': (layout_bytes, layout_time), 'first': first[1:], 'cached': cached[1:],
+                             'revalidation': (revalidation.status_code, len(revalidation.get_data()))}
+        results[encoding]['checks'] = (layout, first[0], cached[0])
+
+    per_request(job_map_app)
+    client = job_map_app.app.server.test_client()
+    n_mismatch = 0
+    for encoding, accept_encoding in ACCEPT_ENCODINGS.items():
+        layout, layout_bytes, layout_time = serve_layout(client, accept_encoding)
+        responses, n_bytes, t = play_sessions(client, dependency, sessions, accept_encoding)
+        results[encoding]['per request'] = (n_bytes, t)
+        results[encoding]['per request layout'] = (layout_bytes, layout_time)
+        expected = results[encoding].pop('checks')
+        n_mismatch += (expected[0] != layout) + (expected[1] != responses) + (expected[2] != responses)
+
+    print('{:,} jobs - {} sessions x {} callbacks'.format(n_rows, n_sessions, n_callbacks // n_sessions))
+    for encoding, result in results.items():
+        print('{} :'.format(encoding))
+        print('  layout      per request {:9,d} B {:7.2f} ms - response cache {:9,d} B {:7.2f} ms - '
+              'revalidation {} {} B'.format(result['per request layout'][0], 1e3 * result['per request layout'][1],
+                                            result['layout'][0], 1e3 * result['layout'][1],
+                                            *result['revalidation']))
+        for mode in ('per request', 'first', 'cached'):
+            n_bytes, t = result[mode]
+            print('  callbacks   {:12s}: {:7,.0f} B/callback {:7.2f} ms/callback'.format(
+                mode, n_bytes / n_callbacks, 1e3 * t / n_callbacks))
+    print('diverging responses : {}'.format(n_mismatch))
+    sys.exit(1 if n_mismatch else 0)
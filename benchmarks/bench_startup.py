@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import datetime
+import subprocess
+import statistics
+import tempfile
+from source.storage import append_jobs
+from source.snapshot import SNAPSHOT, SOURCE_FILES
+from benchmarks.synthetic import make_df_jobs, DATA_DIR
+
+"""
+Start up time of the web process (`import app`), measured in fresh processes on a copy of the data folder :
+ - imports : time to import the modules of the web process,
+ - boot : time to build the app once imported, from the jobs (no snapshot) or from the prepared snapshot.
+The packages taking the most import time in the web process are listed from `python -X importtime`.
+Run from the repository root : python -m benchmarks.bench_startup [n_rows] [n_runs]
+"""
+
+BOOT = '''
+import time
+start = time.perf_counter()
+import source.snapshot, source.charts_manager
+imported = time.perf_counter()
+import app
+booted = time.perf_counter()
+import sys, json
+print(json.dumps({'imports': imported - start, 'boot': booted - imported,
+                  'figures drawn': 'plotly.graph_objects' in sys.modules}))
+'''
+
+
+def run_boot(APP_DIR, *options) -> str:
+    """
+    Imports the app in a fresh process running in APP_DIR, returns its stdout and stderr
+    """
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    result = subprocess.run([sys.executable] + list(options) + ['-c', BOOT], cwd=APP_DIR, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return result.stdout, result.stderr
+
+
+def import_times(stderr, n_packages=8) -> list:
+    """
+    Packages taking the most import time (seconds), summed over their modules, from the output of `-X importtime`
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            own, _, name = line[len('import time:'):].split('|')
+            if own.strip().isdigit():
+                package = name.strip().split('.')[0]
+                times[package] = times.get(package, 0) + int(own) / 1e6
+    return sorted(times.items(), key=lambda item: -item[1])[:n_packages]
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as APP_DIR:
+        APP_DATA_DIR = os.path.join(APP_DIR, 'Data')
+        os.makedirs(APP_DATA_DIR)
+        for name in SOURCE_FILES:
+            os.symlink(os.path.abspath(os.path.join(DATA_DIR, name)), os.path.join(APP_DATA_DIR, name))
+        append_jobs(*make_df_jobs(n_rows), APP_DATA_DIR, scrap_date=datetime.date(2020, 12, 28))
+
+        runs = {'no snapshot': [], 'snapshot': []}
+        for _ in range(n_runs):
+            for mode in runs:
+                if mode == 'no snapshot' and os.path.exists(os.path.join(APP_DATA_DIR, SNAPSHOT)):
+                    os.remove(os.path.join(APP_DATA_DIR, SNAPSHOT))
+                runs[mode].append(json.loads(run_boot(APP_DIR)[0].splitlines()[-1]))
+        snapshot_size = os.path.getsize(os.path.join(APP_DATA_DIR, SNAPSHOT))
+        _, importtime = run_boot(APP_DIR, '-X', 'importtime')
+
+    print('{:,} jobs - median of {} runs - snapshot of {:.1f} MB'.format(n_rows, n_runs, snapshot_size / 2 ** 20))
+    for mode, timings in runs.items():
+        imports = statistics.median(timing['imports'] for timing in timings)
+        boot = statistics.median(timing['boot'] for timing in timings)
+        print('{:12s} : imports {:6.3f}s - boot {:6.3f}s - total {:6.3f}s - figures drawn : {}'.format(
+            mode, imports, boot, imports + boot, timings[-1]['figures drawn']))
+    print('import time of the web process (snapshot) :')
+    for package, seconds in import_times(importtime):
+        print('  {:24s} {:6.3f}s'.format(package, seconds))
@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import statistics
+import subprocess
+import numpy as np
+import pandas as pd
+import dash
+from source.locations import Locations
+from source.aggregation import JobCube
+from source.figure_delta import FigureDelta
+from source.charts_manager import city_canton_jobs
+from source.plotting import draw_canton_and_bubble_chart, draw_pie_chart, draw_bar_charts
+from benchmarks.synthetic import make_df_jobs, SIZES, DATA_DIR
+from benchmarks.bench_concurrency import build_app
+
+"""
+Timings of the hot paths of the dashboard on synthetic jobs of several sizes (10k, 100k, 1M jobs) :
+ - the counts : city_canton_jobs, JobCube, ChartsManager.date_filtering,
+ - the pie updates (computed, and read from the payload cache),
+ - the figures : draw_canton_and_bubble_chart, draw_pie_chart, draw_bar_charts,
+ - full callback round trips through the Dash test client, the caches being emptied before each call (computed)
+   or not (cached).
+The timings (min, median and mean of the runs, in seconds) are saved as JSON with the commit and the library
+versions, two result files are compared with `compare`.
+Run from the repository root :
+    python -m benchmarks.bench_suite [sizes] [n_runs] [output.json]     e.g. 10k,100k 5
+    python -m benchmarks.bench_suite compare base.json new.json
+"""
+
+RESULTS_DIR = 'benchmarks/results/'
+INTERACTIONS = [('function-DD.value', 'Pharmaceuticals'), ('DateSlider.value', [3, 12]),
+                ('Canton_DD.value', 'VD'), ('city_DD.value', 'Zug'), ('staff-off.n_clicks', 1),
+                ('map-C.n_clicks', 1)]
+
+
+def timings(function, n_runs, setup=None) -> dict:
+    """
+    Min, median and mean wall time of `n_runs` calls of `function`, `setup` being called (not timed) before each
+    """
+    times = []
+    for _ in range(n_runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times), 'runs': n_runs}
+
+
+def callback_body(dependency, prop_id, value) -> dict:
+    """
+    Request body of the main callback triggered by `prop_id`, from the initial view
+    """
+    return {'output': dependency['output'], 'outputs': [], 'changedPropIds': [prop_id],
+            'inputs': [{'id': i['id'], 'property': i['property'],
+                        'value': value if i['id'] + '.' + i['property'] == prop_id else None}
+                       for i in dependency['inputs']],
+            'state': [{'id': 'view-state', 'property': 'data', 'value': None}]}
+
+
+def bench_size(n_rows, n_runs) -> dict:
+    """
+    Timings of the hot paths on `n_rows` synthetic jobs
+    """
+    df_jobs, function_matrix = make_df_jobs(n_rows)
+    locations = Locations(pd.read_csv(DATA_DIR + 'df_city_coordinates.csv'),
+                          pd.read_csv(DATA_DIR + 'canton_naming.csv', index_col='Idx'))
+    results = {'city_canton_jobs': timings(lambda: city_canton_jobs(df_jobs, function_matrix, locations), n_runs),
+               'JobCube': timings(lambda: JobCube(df_jobs, function_matrix, locations, lazy=False), n_runs)}
+
+    job_map_app = build_app(df_jobs, function_matrix, lazy=False)
+    cube = job_map_app.cube
+    date_range = [0, len(cube.dates) - 1]
+    results['date_filtering'] = timings(lambda: job_map_app.date_filtering(date_range), n_runs)
+
+    state = dict(job_map_app.initial_view_state)
+    views = [state, dict(state, canton='ZH'), dict(state, city='Zurich'), dict(state, staff_and_recr=False)]
+    results['pie_update (computed)'] = timings(lambda: [job_map_app.compute_pie(view) for view in views], n_runs)
+    results['pie_update (cached)'] = timings(lambda: [job_map_app.pie_update(FigureDelta(), view) for view in views],
+                                             n_runs)
+
+    df_count_city, df_count_canton = job_map_app.date_filtering(date_range)
+    results['draw_canton_and_bubble_chart'] = timings(
+        lambda: draw_canton_and_bubble_chart('All Jobs', df_count_city, df_count_canton, 1, DATA_DIR, 150), n_runs)
+    results['draw_pie_chart'] = timings(lambda: draw_pie_chart(function_matrix, 150), n_runs)
+    results['draw_bar_charts'] = timings(
+        lambda: draw_bar_charts(df_count_city, df_count_canton, 'All Jobs', 150), n_runs)
+
+    def empty_caches():
+        job_map_app.payload_cache.invalidate()
+        job_map_app.response_cache.invalidate()
+
+    client = job_map_app.app.server.test_client()
+    dependency = [d for d in client.get('/_dash-dependencies').get_json() if 'view-state' in d['output']][0]
+    for prop_id, value in INTERACTIONS:
+        body = callback_body(dependency, prop_id, value)
+        post = lambda: client.post('/_dash-update-component', json=body, headers={'Accept-Encoding': 'br'}).data
+        results['callback {} (computed)'.format(prop_id)] = timings(post, n_runs, setup=empty_caches)
+        results['callback {} (cached)'.format(prop_id)] = timings(post, n_runs)
+    return results
+
+
+def git_commit() -> str:
+    """
+    Hash of the checked out commit, None outside of a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, new) -> None:
+    """
+    Prints the ratio of the median timings of two result files
+    """
+    print('{} ({}) --> {} ({})'.format(base['commit'], base['date'], new['commit'], new['date']))
+    for size, cases in new['sizes'].items():
+        print('{} jobs :'.format(size))
+        for case, timing in cases.items():
+            if case in base['sizes'].get(size, {}):
+                before = base['sizes'][size][case]['median']
+                print('  {:42s} {:9.2f} ms --> {:9.2f} ms  x{:5.2f}'.format(
+                    case, 1e3 * before, 1e3 * timing['median'], timing['median'] / before))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        with open(sys.argv[2]) as f_base, open(sys.argv[3]) as f_new:
+            compare(json.load(f_base), json.load(f_new))
+        sys.exit(0)
+
+    sizes = sys.argv[1].split(',') if len(sys.argv) > 1 else list(SIZES)
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    commit = git_commit()
+    output = sys.argv[3] if len(sys.argv) > 3 else RESULTS_DIR + '{}.json'.format(commit or 'results')
+
+    results = {'commit': commit, 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+               'dash': dash.__version__, 'sizes': {}}
+    for size in sizes:
+        results['sizes'][size] = bench_size(SIZES[size], n_runs)
+        for case, timing in results['sizes'][size].items():
+            print('{:5s} {:42s} median {:9.2f} ms - min {:9.2f} ms'.format(size, case, 1e3 * timing['median'],
+                                                                          1e3 * timing['min']))
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Results saved to {}'.format(output))
@@ -0,0 +1,219 @@
+import sys
+import json
+import time
+import random
+import statistics
+import numpy as np
+import pandas as pd
+import plotly.utils
+from source.locations import Locations
+from source.aggregation import JobCube
+from source.timeseries import TimeSeries, DAY_BITS, DAY_MASK
+from benchmarks.synthetic import make_df_jobs, SIZES, DATA_DIR
+from benchmarks.bench_concurrency import build_app
+
+"""
+Time series of synthetic jobs of several sizes (10k, 100k, 1M jobs) published over N_DAYS days :
+ - append : the jobs are appended scrap by scrap (SCRAP_DAYS days at a time), as after each scrapping run, and the
+   series is compared with the one built at once ; time per append and size of the arrays,
+ - queries : latency of the daily and weekly counts, growth and trending functions of the country, of a canton and
+   of a city, and of the line chart update of the web app for random views, each being run `n_runs` times,
+ - check : the counts, growth and trending functions are compared with groupbys of the jobs, and the counts over
+   the whole period with the ones of the JobCube, and the line chart served with the layout (no callback is fired
+   at load) with the one of the initial view state.
+Run from the repository root : python -m benchmarks.bench_timeseries [sizes] [n_runs]      e.g. 10k,100k 20
+"""
+
+N_DAYS = 120
+SCRAP_DAYS = 3
+BUDGET = 0.05  # seconds per query
+
+
+def latency(function, n_runs) -> dict:
+    """
+    Median and max wall time of `n_runs` calls of `function`
+    """
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'max': max(times)}
+
+
+def city_entries(timeseries, columns) -> pd.Series:
+    """
+    Counts of the city entries of a series keyed by (column name, city, day), comparable between two series
+    """
+    series = timeseries.city_keys >> DAY_BITS
+    return pd.Series(timeseries.city_counts, index=pd.MultiIndex.from_arrays([
+        np.asarray(timeseries.columns, dtype=object)[series // timeseries.n_cities], series % timeseries.n_cities,
+        timeseries.city_keys & DAY_MASK])).reindex(columns, level=0).sort_index()
+
+
+def entry_frame(df_jobs, function_matrix, locations, timeseries) -> pd.DataFrame:
+    """
+    (job, column) entries of the jobs with their day index, canton and city code, to be grouped
+    """
+    city_codes = locations.encode_cities(df_jobs['city'], df_jobs['canton'])
+    day_idx = (pd.to_datetime(df_jobs['date']).values.astype('datetime64[D]').astype(np.int64) -
+               timeseries.first_day)
+    rows = np.concatenate([np.arange(len(df_jobs)), function_matrix.row_ids()])
+    columns = np.concatenate([np.full(len(df_jobs), 'All Jobs', dtype=object),
+                              np.asarray(function_matrix.functions, dtype=object)[function_matrix.indices]])
+    df_entries = pd.DataFrame({'column': columns, 'day': day_idx[rows], 'city': city_codes[rows]})
+    df_entries['canton'] = locations.cantons[locations.city_cantons[df_entries['city']]]
+    return df_entries[df_entries['city'] >= 0]
+
+
+def check_queries(timeseries, df_entries, rng, n_checks=20) -> int:
+    """
+    Compares the daily counts, growth and trending functions of random (column, area) pairs with groupbys of the
+    (job, column) entries, returns the number of differences
+    """
+    n_failed = 0
+    for _ in range(n_checks):
+        column = rng.choice(timeseries.columns[:20])
+        area = rng.choice([{}, {'canton': rng.choice(list(df_entries['canton']))},
+                           {'city': int(rng.choice(list(df_entries['city'])))}])
+        df_area = df_entries[df_entries[list(area)].eq(pd.Series(area)).all(axis=1)] if area else df_entries
+        expected = df_area[df_area['column'] == column].groupby('day').size().reindex(
+            range(timeseries.n_days), fill_value=0).values
+        last = rng.randrange(14, timeseries.n_days)
+        df_current = df_area[df_area['day'].between(last - 6, last)].groupby('column').size()
+        df_previous = df_area[df_area['day'].between(last - 13, last - 7)].groupby('column').size()
+        df_expected = pd.DataFrame({'current': df_current, 'previous': df_previous}).fillna(0).astype(int)
+        df_expected = df_expected[(df_expected['previous'] >= 5) & (df_expected.index != 'All Jobs')]
+        df_expected['growth'] = df_expected['current'] / df_expected['previous'] - 1
+        df_expected = df_expected.sort_index().sort_values(['growth', 'current'], ascending=False,
+                                                           kind='stable').head(5)
+        df_trending = timeseries.trending(last, **area)
+        previous = df_previous.get(column, 0)
+        growth = df_current.get(column, 0) / previous - 1 if previous else float('nan')
+        same = np.array_equal(timeseries.daily(column, **area), expected) and \
+            np.allclose(timeseries.growth(column, last, **area), growth, equal_nan=True) and \
+            np.array_equal(df_trending['growth'].values, df_expected['growth'].values)
+        if not same:
+            print('  {} {} : differs from the groupby of the jobs'.format(column, area))
+        n_failed += not same
+    return n_failed
+
+
+def check_initial_view(job_map_app) -> int:
+    """
+    Compares the line chart and trending functions of the served layout, shown before any callback, and the ones
+    returned by the callback for the initial view state with the ones computed for this state, returns the number
+    of differences
+    """
+    expected = json.loads(json.dumps(job_map_app.compute_time_series(job_map_app.initial_view_state),
+                                     cls=plotly.utils.PlotlyJSONEncoder))
+    client = job_map_app.app.server.test_client()
+    components, served = [client.get('/_dash-layout').get_json()], {}
+    while components:
+        component = components.pop()
+        if isinstance(component, list):
+            components += component
+        elif isinstance(component, dict) and 'props' in component:
+            served[component['props'].get('id')] = component['props']
+            components.append(component['props'].get('children'))
+    in_layout = [served['time-series']['figure'], served['trending-functions']['children']] == expected
+    in_store = served['view-state']['data'] == job_map_app.initial_view_state
+
+    body = {'output': '..time-series.figure...trending-functions.children..', 'outputs': [],
+            'changedPropIds': ['view-state.data'],
+            'inputs': [{'id': 'view-state', 'property': 'data', 'value': job_map_app.initial_view_state}]}
+    response = json.loads(client.post('/_dash-update-component', json=body).data)['response']
+    from_callback = [response['time-series']['figure'], response['trending-functions']['children']] == expected
+    print('  initial view : layout as computed {} - view-state store initialized {} - callback as layout {}'.format(
+        in_layout, in_store, from_callback))
+    return (not in_layout) + (not in_store) + (not from_callback)
+
+
+def bench_size(n_rows, n_runs) -> int:
+    """
+    Prints the append and query timings on `n_rows` synthetic jobs, returns the number of failed checks
+    """
+    df_jobs, function_matrix = make_df_jobs(n_rows, n_days=N_DAYS)
+    locations = Locations(pd.read_csv(DATA_DIR + 'df_city_coordinates.csv'),
+                          pd.read_csv(DATA_DIR + 'canton_naming.csv', index_col='Idx'))
+    dates = pd.to_datetime(df_jobs['date'])
+
+    timeseries = TimeSeries.empty(locations)
+    scraps = (dates - dates.min()).dt.days.values // SCRAP_DAYS
+    append_times = []
+    for scrap in np.unique(scraps):
+        in_scrap = scraps == scrap
+        start = time.perf_counter()
+        timeseries.append(df_jobs[in_scrap], function_matrix.take(in_scrap), locations,
+                          parts=['scrap-{}'.format(scrap)])
+        append_times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    built = TimeSeries.empty(locations)
+    built.append(df_jobs, function_matrix, locations)
+    build_time = time.perf_counter() - start
+    n_bytes = timeseries.canton_counts.nbytes + timeseries.city_keys.nbytes + timeseries.city_counts.nbytes
+    print('{} jobs over {} days - {} appends : median {:.1f} ms, max {:.1f} ms - built at once in {:.1f} ms - '
+          'arrays {:.1f} MB ({} city entries)'.format(n_rows, timeseries.n_days, len(append_times),
+                                                      1e3 * statistics.median(append_times), 1e3 * max(append_times),
+                                                      1e3 * build_time, n_bytes / 2 ** 20, len(timeseries.city_keys)))
+
+    n_failed = 0
+    columns = [built.column_index[column] for column in timeseries.columns]
+    same = timeseries.first_day == built.first_day and \
+        np.array_equal(timeseries.canton_counts, built.canton_counts[:, :, columns]) and \
+        city_entries(timeseries, built.columns).equals(city_entries(built, built.columns))
+    print('  appended scrap by scrap : same counts as built at once {}'.format(same))
+    n_failed += not same
+
+    cube = JobCube(df_jobs, function_matrix, locations)
+    whole = (0, len(cube.dates) - 1)
+    canton_idx = [cube.canton_index[canton] for canton in timeseries.cantons if canton in cube.canton_index]
+    consistent = all(np.array_equal(cube.canton_counts(whole)[:, cube.column_index[column]],
+                                     timeseries.canton_counts[:, :, timeseries.column_index[column]].sum(axis=0)[
+                                         [timeseries.canton_index[canton] for canton in cube.cantons]])
+                     for column in cube.columns[:20])
+    print('  counts of the whole period : same as the JobCube {}'.format(consistent))
+    n_failed += (not consistent) + (len(canton_idx) != len(cube.cantons))
+
+    rng = random.Random(0)
+    if n_rows <= 100000:
+        n_failed += check_queries(timeseries, entry_frame(df_jobs, function_matrix, locations, timeseries), rng)
+
+    top_city = int(cube.city_codes[np.argmax(cube.column_counts(whole, 'All Jobs')[0])])
+    areas = {'country': {}, 'canton ZH': {'canton': 'ZH'}, 'city': {'city': top_city}}
+    column = cube.job_functions[0]
+    for name, area in areas.items():
+        queries = {'daily': lambda: timeseries.daily(column, **area),
+                   'weekly': lambda: timeseries.weekly(column, **area),
+                   'growth': lambda: timeseries.growth(column, **area),
+                   'trending': lambda: timeseries.trending(**area)}
+        timings = {query: latency(function, n_runs) for query, function in queries.items()}
+        n_failed += sum(timing['max'] > BUDGET for timing in timings.values())
+        print('  {:10s} '.format(name) + ' - '.join('{} median {:.2f} ms, max {:.2f} ms'.format(
+            query, 1e3 * timing['median'], 1e3 * timing['max']) for query, timing in timings.items()))
+
+    job_map_app = build_app(df_jobs, function_matrix, timeseries=timeseries)
+    n_failed += check_initial_view(job_map_app)
+    states = [dict(job_map_app.initial_view_state, job_function=rng.choice(cube.columns),
+                   date_range=sorted(rng.sample(range(len(cube.dates)), 2)),
+                   **rng.choice([{}, {'canton': rng.choice(list(cube.cantons))},
+                                 {'city': rng.choice(list(cube.df_cities['municipality']))}]))
+              for _ in range(n_runs)]
+    times = []
+    for state in states:
+        start = time.perf_counter()
+        job_map_app.compute_time_series(state)
+        times.append(time.perf_counter() - start)
+    n_failed += max(times) > BUDGET
+    print('  line chart update of {} random views : median {:.2f} ms, max {:.2f} ms'.format(
+        len(states), 1e3 * statistics.median(times), 1e3 * max(times)))
+    return n_failed
+
+
+if __name__ == '__main__':
+    sizes = sys.argv[1].split(',') if len(sys.argv) > 1 else ['10k', '100k']
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    n_failed = sum(bench_size(SIZES[size], n_runs) for size in sizes)
+    print('{} failed checks or queries over {:.0f} ms'.format(n_failed, 1e3 * BUDGET))
+    sys.exit(1 if n_failed else 0)
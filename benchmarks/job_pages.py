@@ -0,0 +1,297 @@
+import re
+import pickle
+import threading
+import time
+import html
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""
+Saved job pages and job search results for the scrapper benchmarks.
+The job pages are rebuilt from the scrapped jobs of `df_jobs_content.p` with the markup of the LinkedIn job pages
+and served by a local stub HTTP server adding an artificial latency to each response. The result cards of a job
+search are served page by page as by the search page and its listing endpoint (JobSearchServer).
+"""
+
+DATA_DIR = './Data/'
+
+JOB_PAGE = '''<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title} - {company} - {city}</title></head>
+<body>
+<main id="main-content">
+<section class="topcard">
+<h1 class="topcard__title">{title}</h1>
+<h3 class="topcard__flavor-row">
+<span class="topcard__flavor"><a class="topcard__org-name-link" href="https://ch.linkedin.com/company/{job_id}">{company}</a></span>
+<span class="topcard__flavor topcard__flavor--bullet">{city}, {canton}, Switzerland</span>
+</h3>
+<h3 class="topcard__flavor-row">
+<span class="topcard__flavor--metadata posted-time-ago__text">{posted}</span>
+</h3>
+</section>
+<section class="description">
+{content}
+<ul class="job-criteria__list">
+<li class="job-criteria__item"><h3 class="job-criteria__subheader">Seniority level</h3><span class="job-criteria__text job-criteria__text--criteria">{seniority}</span></li>
+<li class="job-criteria__item"><h3 class="job-criteria__subheader">Employment type</h3><span class="job-criteria__text job-criteria__text--criteria">{employment}</span></li>
+<li class="job-criteria__item"><h3 class="job-criteria__subheader">Job function</h3>{functions}</li>
+<li class="job-criteria__item"><h3 class="job-criteria__subheader">Industries</h3>{industries}</li>
+</ul>
+</section>
+</main>
+<aside class="similar-jobs">
+<h2 class="similar-jobs__header">People also viewed</h2>
+<ul class="similar-jobs__list">
+{similar}
+</ul>
+</aside>
+</body></html>
+'''
+
+SIMILAR_JOB = '''<li class="result-card job-result-card">
+<a class="result-card__full-card-link" href="https://ch.linkedin.com/jobs/view/{slug}-{job_id}?refId=similar-jobs&amp;trk=similar-jobs"><span class="screen-reader-text">{title}</span></a>
+<div class="result-card__contents job-result-card__contents">
+<h3 class="result-card__title job-result-card__title">{title}</h3>
+<h4 class="result-card__subtitle job-result-card__subtitle">{company}</h4>
+<div class="result-card__meta job-result-card__meta"><span class="job-result-card__location">{city}, {canton}, Switzerland</span></div>
+</div>
+</li>'''
+N_SIMILAR = 25
+CRITERIA = '<span class="job-criteria__text job-criteria__text--criteria">{}</span>'
+POSTED = ['2 hours ago', '1 day ago', '3 days ago', '1 week ago', '2 weeks ago', '1 month ago']
+INDUSTRIES = [['Information Technology and Services'], ['Staffing and Recruiting'],
+              ['Banking', 'Financial Services'], ['Pharmaceuticals'], ['Hospital & Health Care']]
+FUNCTIONS = [['Engineering', 'Information Technology'], ['Sales'], ['Finance'], ['Research', 'Analyst'], ['Other']]
+
+
+def load_job_pages(n_pages, DATA_DIR=DATA_DIR, posted=POSTED) -> dict:
+    """
+    Returns `n_pages` job pages (dict job id --> html), the scrapped jobs being repeated as needed, the `posted time
+    ago` HTML of the pages cycling through `posted`
+    """
+    df_jobs_content = pickle.load(open(DATA_DIR + 'df_jobs_content.p', 'rb'))
+    jobs = df_jobs_content.to_dict('records')
+    pages = {}
+    for i in range(n_pages):
+        job = jobs[i % len(jobs)]
+        job_id = str(2300000000 + i)
+        similar = []
+        for j in range(i + 1, i + 1 + N_SIMILAR):
+            other = jobs[j % len(jobs)]
+            similar.append(SIMILAR_JOB.format(slug=html.escape('-'.join(other['title'].lower().split()[:4])),
+                                              job_id=2300000000 + j,
+                                              title=html.escape(other['title']), company=html.escape(other['company']),
+                                              city=html.escape(other['city']), canton=html.escape(other['canton'])))
+        pages[job_id] = JOB_PAGE.format(
+            job_id=job_id,
+            title=html.escape(job['title']), company=html.escape(job['company']),
+            city=html.escape(job['city']), canton=html.escape(job['canton']),
+            posted=posted[i % len(posted)], content=job['content'],
+            seniority=html.escape(job['Seniority level']), employment=html.escape(job['Employment type']),
+            functions=''.join(CRITERIA.format(f) for f in FUNCTIONS[i % len(FUNCTIONS)]),
+            industries=''.join(CRITERIA.format(html.escape(f)) for f in INDUSTRIES[i % len(INDUSTRIES)]),
+            similar='\n'.join(similar))
+    return pages
+
+
+class JobPageServer:
+    """
+    Local HTTP server serving job pages at `/jobs/view/<job id>`, used as a context manager.
+
+    Inputs:
+     - pages : dict job id --> html
+     - latency : float, seconds waited before each response
+     - throttle_every : int, the first request of every `throttle_every`-th page is answered by a 503 with a
+       Retry-After header, never if 0
+     - retry_after : function returning the value of the Retry-After header
+    """
+
+    def __init__(self, pages, latency=0.05, throttle_every=0, retry_after=lambda: '0'):
+        self.pages = pages
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.throttled = set()  # job ids answered by a 503
+        self.page_index = {job_id: i for i, job_id in enumerate(pages)}
+        self.n_requests = 0
+        self.n_connections = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def setup(self):
+                super().setup()
+                server.n_connections += 1
+
+            def do_GET(self):
+                job_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+                with server.lock:
+                    server.n_requests += 1
+                    throttled = server.throttle_every and job_id not in server.throttled and \
+                        server.page_index.get(job_id, -1) % server.throttle_every == 0
+                    if throttled:
+                        server.throttled.add(job_id)
+                time.sleep(server.latency)
+                if throttled:
+                    self.send_response(503)
+                    self.send_header('Retry-After', server.retry_after())
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                page = server.pages.get(job_id)
+                body = (page or 'Not found').encode()
+                self.send_response(200 if page else 404)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+
+    def links(self) -> list:
+        return [self.url + '/jobs/view/' + job_id for job_id in self.pages]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+SEARCH_PAGE = '''<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>Jobs in Switzerland</title></head>
+<body>
+<main id="main-content">
+<div>
+<section class="results__list">
+<ul class="jobs-search__results-list">
+{cards}
+</ul>
+<button class="infinite-scroller__show-more-button" type="button" onclick="showMore()">See more jobs</button>
+</section>
+</div>
+</main>
+<script>
+var start = {page_size};
+function showMore() {{
+  fetch('{listing}' + start).then(function (response) {{ return response.text(); }}).then(function (cards) {{
+    if (cards.trim()) {{
+      document.querySelector('.jobs-search__results-list').insertAdjacentHTML('beforeend', cards);
+      start += {page_size};
+    }}
+  }});
+}}
+</script>
+</body></html>
+'''
+
+
+def make_result_cards(n_results, DATA_DIR=DATA_DIR) -> list:
+    """
+    Returns the HTML of `n_results` result cards of a job search, the scrapped jobs being repeated as needed
+    """
+    df_jobs_content = pickle.load(open(DATA_DIR + 'df_jobs_content.p', 'rb'))
+    jobs = df_jobs_content.to_dict('records')
+    cards = []
+    for i in range(n_results):
+        job = jobs[i % len(jobs)]
+        cards.append(SIMILAR_JOB.format(slug='-'.join(re.findall(r'[a-z0-9]+', job['title'].lower())[:4]),
+                                        job_id=2300000000 + i, title=html.escape(job['title']),
+                                        company=html.escape(job['company']), city=html.escape(job['city']),
+                                        canton=html.escape(job['canton'])).replace('similar-jobs', 'jobs-search'))
+    return cards
+
+
+class JobSearchServer:
+    """
+    Local HTTP server mimicking a paginated job search, used as a context manager :
+     - `/jobs/search/` : search page holding the first `page_size` result cards, its `See more jobs` button loading
+       the next ones from the listing endpoint,
+     - `/jobs-guest/jobs/api/seeMoreJobPostings/search?...&start=<offset>` : listing endpoint, the `page_size` result
+       cards starting at `offset`, empty past the last one.
+
+    Inputs:
+     - cards : list of the HTML of the result cards
+     - latency : float, seconds waited before each response
+     - page_size : int, number of result cards per page
+     - throttle_every : int, every `throttle_every`-th listing request is answered by a 429 with a Retry-After delay
+       of `retry_after` seconds, never if 0
+     - retry_after : float, Retry-After delay in seconds
+    """
+
+    def __init__(self, cards, latency=0.05, page_size=25, throttle_every=0, retry_after=0.2):
+        self.cards = cards
+        self.latency = latency
+        self.page_size = page_size
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.n_requests = 0
+        self.n_throttled = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                with server.lock:
+                    server.n_requests += 1
+                    throttled = server.throttle_every and path.endswith('/search') and \
+                        server.n_requests % server.throttle_every == 0
+                    server.n_throttled += bool(throttled)
+                time.sleep(server.latency)
+                if throttled:
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(server.retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if path.rstrip('/') == '/jobs/search':
+                    body = SEARCH_PAGE.format(cards='\n'.join(server.cards[:server.page_size]),
+                                              page_size=server.page_size,
+                                              listing='/jobs-guest/jobs/api/seeMoreJobPostings/search?start=')
+                else:
+                    start = int(dict(parameter.split('=', 1) for parameter in query.split('&') if '=' in parameter
+                                     ).get('start', 0))
+                    body = '\n'.join(server.cards[start:start + server.page_size])
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+
+    def search_link(self) -> str:
+        return self.url + '/jobs/search/?location=Switzerland&sortBy=DD'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
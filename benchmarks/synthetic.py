@@ -0,0 +1,147 @@
+import re
+import pickle
+import datetime
+import numpy as np
+import pandas as pd
+from source.sparse import FunctionMatrix
+
+"""
+Synthetic job dataframes for the benchmarks - the scrapped jobs are not shipped with the repo.
+The jobs follow the skewed distributions of the scrapped data : a few cities (Zurich, Geneve, Basel ...) and
+industries (Staffing and Recruiting, IT ...) gather most of the jobs, big companies post many offers, less jobs are
+published during the week-ends and some offers are published again on later days.
+The job descriptions are made of paragraphs of the scrapped descriptions shipped with the repo (df_jobs_content.p).
+"""
+
+DATA_DIR = './Data/'
+SIZES = {'10k': 10000, '100k': 100000, '1M': 1000000}
+
+# cities with the most jobs, by decreasing number of jobs
+BIG_CITIES = ['Zurich', 'Geneve', 'Basel', 'Lausanne', 'Bern', 'Zug', 'Lugano', 'Winterthur', 'Luzern', 'St. Gallen',
+              'Baden', 'Schlieren', 'Fribourg', 'Neuchatel', 'Biel/Bienne']
+# LinkedIn industries with the most jobs, by decreasing number of jobs
+INDUSTRIES = ['Staffing and Recruiting', 'Information Technology and Services', 'Financial Services',
+              'Pharmaceuticals', 'Banking', 'Hospital & Health Care', 'Computer Software', 'Insurance',
+              'Management Consulting', 'Biotechnology', 'Retail', 'Construction',
+              'Mechanical or Industrial Engineering', 'Medical Devices', 'Food & Beverages', 'Telecommunications', 'Education Management', 'Accounting',
+              'Logistics and Supply Chain', 'Hospitality', 'Real Estate', 'Research', 'Chemicals',
+              'Non-profit Organization Management', 'Government Administration']
+SENIORITIES = ['', 'Junior ', 'Senior ', 'Lead ', 'Head of ', 'Praktikant ', 'Stagiaire ']
+ROLES = ['Software Engineer', 'Data Scientist', 'Project Manager', 'Sales Manager', 'Accountant', 'Pflegefachperson',
+         'Ingenieur', 'Business Analyst', 'Kundenberater', 'Collaborateur administratif', 'Chemist', 'Logistiker',
+         'Marketing Specialist', 'Elektroinstallateur', 'Product Owner', 'Controller', 'Research Scientist',
+         'Assistant de direction', 'Informatiker', 'Verkaufsberater']
+SUFFIXES = ['', '', ' (m/w/d)', ' 80-100%', ' (f/h)', ' - Temporary']
+SENIORITY_LEVELS = ['Associate', 'Entry level', 'Mid-Senior level', 'Not Applicable', 'Internship']
+EMPLOYMENT_TYPES = ['Full-time', 'Contract', 'Part-time', 'Internship']
+
+
+def zipf_weights(n, exponent=1.0) -> np.ndarray:
+    """
+    Probabilities proportional to 1 / rank ** exponent
+    """
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def make_df_jobs(n_rows, n_functions=150, n_days=20, seed=0, DATA_DIR=DATA_DIR,
+                 repost_rate=0.1) -> [pd.DataFrame, FunctionMatrix]:
+    """
+    Creates a df_jobs-like pd.DataFrame (`title`, `company`, `city`, `canton`, `date`) and the FunctionMatrix of
+    its job functions. Each job has 1 to 3 job functions and is located in a known city.
+
+    Inputs:
+     - n_rows : int, number of jobs
+     - n_functions : int, number of job functions, the first ones being real LinkedIn industries
+     - n_days : int, number of publishing dates
+     - seed : int, random seed
+     - DATA_DIR : data folder directory
+     - repost_rate : float, share of the jobs that are offers published again (same title, company and city)
+
+    Returns a pd.DataFrame and a FunctionMatrix
+    """
+    rng = np.random.default_rng(seed)
+    df_city_coordinates = pd.read_csv(DATA_DIR + 'df_city_coordinates.csv')
+
+    # cities ranked by number of jobs : the big cities first, then the others in a random order
+    municipalities = list(df_city_coordinates['municipality'])
+    big_cities = [municipalities.index(city) for city in BIG_CITIES if city in municipalities]
+    others = rng.permutation([idx for idx in range(len(municipalities)) if idx not in big_cities])
+    city_ranking = np.concatenate([big_cities, others]).astype(np.int64)
+    city_idx = city_ranking[rng.choice(len(city_ranking), n_rows, p=zipf_weights(len(city_ranking), 1.1))]
+
+    # more jobs are published during the week than during the week-ends
+    dates = np.array([datetime.date(2020, 12, 10) + datetime.timedelta(days=d) for d in range(n_days)])
+    date_weights = np.array([0.3 if date.weekday() >= 5 else 1 for date in dates])
+    date_idx = rng.choice(n_days, n_rows, p=date_weights / date_weights.sum())
+
+    n_companies = max(n_rows // 20, 10)
+    titles = np.array([seniority + role + suffix for seniority in SENIORITIES for role in ROLES
+                       for suffix in SUFFIXES], dtype=object)
+    df_jobs = pd.DataFrame({'title': titles[rng.choice(len(titles), n_rows, p=zipf_weights(len(titles), 0.8))],
+                            'company': pd.Series(rng.choice(n_companies, n_rows, p=zipf_weights(n_companies))
+                                                 ).astype(str).radd('Company '),
+                            'city': df_city_coordinates['municipality'].values[city_idx],
+                            'canton': df_city_coordinates['canton'].values[city_idx]})
+
+    # 1 to 3 distinct job functions per job, the big industries being the most frequent
+    functions = (INDUSTRIES + ['Function {:03d}'.format(f) for f in range(len(INDUSTRIES), n_functions)])[:n_functions]
+    n_job_functions = rng.choice([1, 2, 3], n_rows, p=[0.45, 0.35, 0.2])
+    rows = np.repeat(np.arange(n_rows), n_job_functions)
+    codes = rng.choice(n_functions, len(rows), p=zipf_weights(n_functions, 0.9))
+
+    # reposted offers : copies of earlier (not reposted) jobs, published again one to three days later
+    reposts = np.flatnonzero(rng.random(n_rows) < repost_rate)
+    candidates = np.setdiff1d(np.arange(n_rows), reposts)
+    originals = candidates[(rng.random(len(reposts)) * np.searchsorted(candidates, reposts)).astype(np.int64)]
+    df_jobs.iloc[reposts, :4] = df_jobs.iloc[originals, :4].values
+    date_idx[reposts] = np.minimum(date_idx[originals] + rng.integers(1, 4, len(reposts)), n_days - 1)
+    df_jobs['date'] = dates[date_idx]
+
+    function_matrix = FunctionMatrix.from_coordinates(rows, codes, n_rows, functions)
+    source = np.arange(n_rows)
+    source[reposts] = originals
+    function_matrix = function_matrix.take(source)
+
+    return df_jobs, function_matrix
+
+
+def to_dense_df_jobs(df_jobs, function_matrix) -> pd.DataFrame:
+    """
+    df_jobs with one int16 dummy column per job function, as in the former pickled df_jobs.p
+    """
+    return pd.concat([df_jobs, pd.DataFrame(function_matrix.to_dense(np.int16), columns=function_matrix.functions)],
+                     axis=1)
+
+
+def make_df_content(df_jobs, min_paragraphs=6, max_paragraphs=14, seed=0, DATA_DIR=DATA_DIR,
+                    min_words=0) -> pd.DataFrame:
+    """
+    Creates a df_jobs_content-like pd.DataFrame aligned with the jobs of `make_df_jobs` : the `content` of each job
+    is its title followed by `min_paragraphs` to `max_paragraphs` paragraphs drawn from the scrapped descriptions.
+    With `min_words`, the paragraphs are drawn among the distinct ones of at least `min_words` words, so that the
+    descriptions of two jobs rarely share more than a paragraph.
+
+    Returns a pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    df_scrapped = pickle.load(open(DATA_DIR + 'df_jobs_content.p', 'rb'))
+    paragraphs = np.array([paragraph for content in df_scrapped['content']
+                           for paragraph in re.split(r'(?:\s*<br/>\s*)+', content) if paragraph.strip()],
+                          dtype=object)
+    if min_words:
+        paragraphs = np.array([paragraph for paragraph in pd.unique(paragraphs)
+                               if len(paragraph.split()) >= min_words], dtype=object)
+    n_paragraphs = rng.integers(min_paragraphs, max_paragraphs + 1, len(df_jobs))
+    drawn = paragraphs[rng.integers(0, len(paragraphs), n_paragraphs.sum())]
+    ends = np.cumsum(n_paragraphs)
+    contents = ['<div class="description__text"><strong>' + title + '</strong><br/>' +
+                '<br/>'.join(drawn[end - n:end]) + '</div>'
+                for title, n, end in zip(df_jobs['title'], n_paragraphs, ends)]
+
+    df_content = df_jobs[['title', 'company', 'city', 'canton']].copy()
+    df_content.insert(2, 'date', pd.to_datetime(df_jobs['date']).dt.strftime('%Y-%m-%d'))
+    df_content['Seniority level'] = rng.choice(SENIORITY_LEVELS, len(df_jobs))
+    df_content['Employment type'] = rng.choice(EMPLOYMENT_TYPES, len(df_jobs), p=[0.9, 0.06, 0.03, 0.01])
+    df_content['content'] = contents
+    return df_content
@@ -1,42 +1,104 @@
+import os
 import pickle
 import json
 import pandas as pd
-import numpy as np
+from source.storage import append_jobs
+from source.dedup import NearDuplicates, job_texts
+from source.sparse import FunctionMatrix
 
 """
  Cleaning/Formatting functions for job dataframe
 """
 
-
-def get_job_functions(df: pd.DataFrame) -> pd.DataFrame:
+MUNICIPALITY_CACHE = 'municipality_canton.json'
+
+# translation of the canton names into the two letter abbrevation
+CANTON_CODE = {'Zurich': 'ZH',
+               'Bern': 'BE',
+               'Berne': 'BE',
+               'Luzern': 'LU',
+               'Lucerne': 'LU',
+               'Uri': 'UR',
+               'Schwyz': 'SZ',
+               'Obwalden': 'OW',
+               'Nidwalden': 'NW',
+               'Glarus': 'GL',
+               'Zug': 'ZG',
+               'Fribourg': 'FR',
+               'Freiburg': 'FR',
+               'Solothurn': 'SO',
+               'Basel': 'BS',
+               'Basel-Stadt': 'BS',
+               'Basel-Landschaft': 'BL',
+               'Basel-Country': 'BL',
+               'Schaffhausen': 'SH',
+               'Appenzell Ausserrhoden': 'AR',
+               'Appenzell Innerrhoden': 'AI',
+               'Appenzell Outer-Rhoden': 'AR',
+               'Appenzell Inner-Rhoden': 'AI',
+               'St. Gallen': 'SG',
+               'St Gallen': 'SG',
+               'Graubunden': 'GR',
+               'Grigioni': 'GR',
+               'Grischun': 'GR',
+               'Aargau': 'AG',
+               'Thurgau': 'TG',
+               'Ticino': 'TI',
+               'Vaud': 'VD',
+               'Valais': 'VS',
+               'Wallis': 'VS',
+               'Neuchatel': 'NE',
+               'Geneve': 'GE',
+               'Geneva': 'GE',
+               'Jura': 'JU'}
+# major cities whose canton is often mistaken
+CITY_CANTON = {'Zurich': 'ZH',
+               'Geneve': 'GE',
+               'Bern': 'BE',
+               'Basel': 'BS'}
+
+
+def get_job_functions(df: pd.DataFrame) -> [pd.DataFrame, FunctionMatrix]:
     """
-    From the list of job functions contained in the `job function` columns,
-    creates dummy variables and returns them added to the dataframe
+    From the list of job functions contained in the `Industries` column,
+    creates the sparse job x function matrix (rows aligned with the
+    dataframe) and returns it with the dataframe without the list columns
     """
-    df = df.join(pd.get_dummies(df.Industries.apply(pd.Series).stack()). \
-                 sum(level=0)).drop(columns=['Industries'])
-    df.drop(columns=['Job function'], inplace=True)
-    return df
+    function_matrix = FunctionMatrix.from_lists(df['Industries'])
+    df = df.drop(columns=['Industries', 'Job function'])
+    return df, function_matrix
 
 
 def get_canton_from_city(DATA_DIR: str) -> dict:
     """
     Creates a dict with city as key and canton as value from the official
-    geojson
+    geojson. The dict is cached in `municipality_canton.json`, next to the
+    geojson, and rebuilt when the geojson changes
     """
     JSON_PATH = DATA_DIR + 'SwissMunicipalities.geojson'
-    with open(JSON_PATH, 'r') as j:
-        geojson_municipality = json.loads(j.read())
+    CACHE_PATH = DATA_DIR + MUNICIPALITY_CACHE
+    source = None
+    if os.path.exists(JSON_PATH):
+        source = {'size': os.path.getsize(JSON_PATH), 'mtime': os.path.getmtime(JSON_PATH)}
 
-    nb_municipalicites = len(geojson_municipality["features"])
+    try:
+        with open(CACHE_PATH, 'r') as j:
+            cache = json.load(j)
+        # geojson unchanged, or not available anymore
+        if source is None or cache['source'] == source:
+            return cache['cantons']
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
 
-    city_canton_hash = {}
-    for muni in range(nb_municipalicites):
-        name = geojson_municipality["features"][muni]['properties']['NAME']
-        canton = geojson_municipality["features"][muni]['properties']['CantonCODE']
-        city_canton_hash[name] = canton
+    with open(JSON_PATH, 'r') as j:
+        geojson_municipality = json.loads(j.read())
 
+    city_canton_hash = {muni['properties']['NAME']: muni['properties']['CantonCODE']
+                        for muni in geojson_municipality["features"]}
     city_canton_hash['unknown'] = 'unknown'
+
+    with open(CACHE_PATH, 'w') as j:
+        json.dump({'source': source, 'cantons': city_canton_hash}, j)
     return city_canton_hash
 
 
@@ -44,69 +106,27 @@ def canton_cleaning(df: pd.DataFrame, DATA_DIR: str) ->pd.DataFrame:
     """
     Translate the canton into the two letter abbrevation form to get rid of
     language issues/translations. Treats NaN as well
+
+    The canton of a job is, by order of priority, the canton of the major
+    cities (CITY_CANTON), the translation of its canton name (CANTON_CODE),
+    the canton of its municipality (`get_canton_from_city`) or 'unknown'
     """
-    canton_code = {'Zurich': 'ZH',
-                   'Bern': 'BE',
-                   'Berne': 'BE',
-                   'Luzern': 'LU',
-                   'Lucerne': 'LU',
-                   'Uri': 'UR',
-                   'Schwyz': 'SZ',
-                   'Obwalden': 'OW',
-                   'Nidwalden': 'NW',
-                   'Glarus': 'GL',
-                   'Zug': 'ZG',
-                   'Fribourg': 'FR',
-                   'Freiburg': 'FR',
-                   'Solothurn': 'SO',
-                   'Basel': 'BS',
-                   'Basel-Stadt': 'BS',
-                   'Basel-Landschaft': 'BL',
-                   'Basel-Country': 'BL',
-                   'Schaffhausen': 'SH',
-                   'Appenzell Ausserrhoden': 'AR',
-                   'Appenzell Innerrhoden': 'AI',
-                   'Appenzell Outer-Rhoden': 'AR',
-                   'Appenzell Inner-Rhoden': 'AI',
-                   'St. Gallen': 'SG',
-                   'St Gallen': 'SG',
-                   'Graubunden': 'GR',
-                   'Grigioni': 'GR',
-                   'Grischun': 'GR',
-                   'Aargau': 'AG',
-                   'Thurgau': 'TG',
-                   'Ticino': 'TI',
-                   'Vaud': 'VD',
-                   'Valais': 'VS',
-                   'Wallis': 'VS',
-                   'Neuchatel': 'NE',
-                   'Geneve': 'GE',
-                   'Geneva': 'GE',
-                   'Jura': 'JU'}
-    for job in df.index:
-        try:
-            df.loc[job, 'canton'] = canton_code[df.loc[job, 'canton']]
-        except KeyError:
-            df.loc[job, 'canton'] = 'unknown'
-    df.loc[df.city == 'Zurich', 'canton'] = 'ZH'
-    df.loc[df.city == 'Geneve', 'canton'] = 'GE'
-    df.loc[df.city == 'Bern', 'canton'] = 'BE'
-    df.loc[df.city == 'Basel', 'canton'] = 'BS'
+    canton = df['canton'] if 'canton' in df.columns else pd.Series(None, index=df.index, dtype=object)
+    canton = df['city'].map(CITY_CANTON).fillna(canton.map(CANTON_CODE))
 
     city_canton_hash = get_canton_from_city(DATA_DIR)
-    df.loc[df.canton == 'unknown', 'canton'] = \
-        df.loc[df.canton == 'unknown', 'city']. \
-            apply(lambda x: city_canton_hash[x] if x in city_canton_hash.keys() \
-            else 'unknown')
+    df['canton'] = canton.fillna(df['city'].map(city_canton_hash)).fillna('unknown')
     return df
 
 
-def split_data_frame(df: pd.DataFrame) -> [pd.DataFrame, pd.DataFrame]:
+def split_data_frame(df: pd.DataFrame, function_matrix: FunctionMatrix) -> [pd.DataFrame, FunctionMatrix,
+                                                                            pd.DataFrame]:
     """
     Splits the overall dataframe into two smaller version each having its
     use. They would be able to be merged through their `title`, `compagny`
     `date` attributes present in both dataframes
-    - df_jobs =  contains the job functions
+    - df_jobs =  contains the job location and date, its job functions
+    being in the returned FunctionMatrix (rows aligned with df_jobs)
     - df_job_content = contains the html page (str) and other info
     """
     df_job_content = df[['title', 'company', 'date',
@@ -117,52 +137,46 @@ def split_data_frame(df: pd.DataFrame) -> [pd.DataFrame, pd.DataFrame]:
 
     df_jobs = df.drop(columns=['Seniority level',
                                'Employment type',
-                               'content']).drop_duplicates()
+                               'content'])
+    is_unique = ~df_jobs.duplicated().values
+    df_jobs = df_jobs[is_unique].copy()
+    function_matrix = function_matrix.take(is_unique)
     # treats NaN
     df_jobs['city'] = df_jobs['city'].fillna(value='unknown')
     df_jobs['canton'] = df_jobs['canton'].fillna(value='unknown')
     df_jobs.fillna(value=0, inplace=True)
-    # convert from float to int16
-    df_jobs = df_jobs.astype(np.int16, errors='ignore')
     # datetime.date
     df_jobs['date'] = pd.to_datetime(df_jobs['date'], dayfirst=True). \
         apply(lambda x: x.date())
-    return df_jobs, df_job_content
+    return df_jobs, function_matrix, df_job_content
 
 
-def save_df_jobs(new_df: pd.DataFrame) -> None:
+def save_df_jobs(new_df: pd.DataFrame, function_matrix: FunctionMatrix, DATA_DIR: str = '../Data/',
+                 texts: list = None) -> None:
     """
-    Loads the df_jobs and gather to the previouly scrapped
+    Appends the new jobs to the columnar dataset - already stored jobs are skipped, the new ones are assigned to
+    their near-duplicate clusters (compared on `texts`, see dedup.job_texts)
     """
-    try:
-        job_df_old = pickle.load(open('./Data/df_jobs.p', 'rb'))
-        # append the old list, most recent on top
-        job_df_augmented = job_df_old.append(new_df).drop_duplicates()
-        # if absent job functions are added --> NaN becomes 0
-        job_df_augmented.fillna(value=0, inplace=True)
-        job_df_augmented = job_df_augmented.astype(np.int16, errors='ignore')
-        job_df_augmented.reset_index(drop=True, inplace=True)
-        pickle.dump(job_df_augmented, open('./Data/df_jobs.p', 'wb'))
-    except FileNotFoundError:
-        pickle.dump(new_df, open('../Data/df_jobs.p', 'wb'))
+    append_jobs(new_df, function_matrix, DATA_DIR, near_duplicates=NearDuplicates.load(DATA_DIR), texts=texts)
 
 
-def save_df_jobs_content(new_df: pd.DataFrame) -> None:
+def save_df_jobs_content(new_df: pd.DataFrame, DATA_DIR: str = '../Data/') -> None:
     """
     Loads the df_jobs_content and gather to the previouly scrapped
     """
     try:
-        job_df_old = pickle.load(open('../Data/df_jobs_content.p', 'rb'))
+        job_df_old = pickle.load(open(DATA_DIR + 'df_jobs_content.p', 'rb'))
         # append the old list, most recent on top
         job_df_augmented = job_df_old.append(new_df).drop_duplicates()
-        pickle.dump(job_df_augmented, open('./Data/df_jobs_content.p', 'wb'))
+        pickle.dump(job_df_augmented, open(DATA_DIR + 'df_jobs_content.p', 'wb'))
     except FileNotFoundError:
-        pickle.dump(new_df, open('../Data/df_jobs_content.p', 'wb'))
+        pickle.dump(new_df, open(DATA_DIR + 'df_jobs_content.p', 'wb'))
 
 
-def save_dataframes(df_jobs: pd.DataFrame, df_jobs_content: pd.DataFrame) -> None:
+def save_dataframes(df_jobs: pd.DataFrame, function_matrix: FunctionMatrix, df_jobs_content: pd.DataFrame,
+                    DATA_DIR: str = '../Data/') -> None:
     """
     Save the dataframes
     """
-    save_df_jobs(df_jobs)
-    save_df_jobs_content(df_jobs_content)
+    save_df_jobs(df_jobs, function_matrix, DATA_DIR, texts=job_texts(df_jobs, df_jobs_content))
+    save_df_jobs_content(df_jobs_content, DATA_DIR)
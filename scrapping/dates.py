@@ -0,0 +1,118 @@
+import re
+import calendar
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+
+"""
+Posting dates of the job pages.
+The job pages give the posting date relative to the moment they are served ("2 hours ago", "3 days ago", "30+ days
+ago", "1 month ago") and some give it as the `datetime` attribute of the element. A relative date is anchored to
+the time the page was fetched, not to the time it is parsed : a page parsed later (at the end of a long run, or
+when saved pages are processed again) keeps the date it had when it was downloaded.
+The texts are matched by a compiled regex and there are only a few distinct ones (a number and a unit) : their
+offsets are memoized. A column of texts is parsed at once by `parse_job_dates`, each distinct text being matched
+once. The months and years are calendar months. A text that is not recognized is dated to the fetch, the posting
+being at most as recent.
+"""
+
+RELATIVE_DATE = re.compile(r'\b(\d+|an?|one)\+?\s+(second|minute|hour|day|week|month|year)s?\b'
+                           r'|\b(just now|now|today|yesterday)\b', re.IGNORECASE)
+UNITS = {'second': timedelta(seconds=1), 'minute': timedelta(minutes=1), 'hour': timedelta(hours=1),
+         'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+MONTHS = {'month': 1, 'year': 12}
+WORDS = {'just now': timedelta(0), 'now': timedelta(0), 'today': timedelta(0), 'yesterday': timedelta(days=1)}
+
+
+@lru_cache(maxsize=4096)
+def relative_offset(time_text: str) -> tuple:
+    """
+    (timedelta, number of months) between the fetch and the posting of a `posted time ago` text, None if the text
+    is not recognized
+    """
+    match = RELATIVE_DATE.search(time_text)
+    if match is None:
+        return None
+    number, unit, word = match.groups()
+    if word:
+        return WORDS[word.lower()], 0
+    number = int(number) if number.isdigit() else 1
+    unit = unit.lower()
+    if unit in MONTHS:
+        return timedelta(0), number * MONTHS[unit]
+    return number * UNITS[unit], 0
+
+
+def months_before(day: date, months: int) -> date:
+    """
+    Same day `months` calendar months before, clipped to the end of the month
+    """
+    year, month = divmod(day.year * 12 + day.month - 1 - months, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def absolute_date(datetime_attr: str) -> date:
+    """
+    Date of a `datetime` attribute (ISO 8601), None if it cannot be read
+    """
+    try:
+        return date.fromisoformat(datetime_attr.strip()[:10])
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_job_date(time_text: str, fetched: datetime = None, datetime_attr: str = None) -> date:
+    """
+    Get the posting date from the `posted time ago` text of the job page,
+    anchored to the time the page was `fetched` (now by default). The
+    `datetime` attribute of the element is used when present.
+
+    return a datetime.date type
+    """
+    posted = absolute_date(datetime_attr) if datetime_attr else None
+    if posted is not None:
+        return posted
+    fetched = fetched or datetime.now()
+    offset = relative_offset(time_text or '')
+    if offset is None:
+        return fetched.date()
+    delta, months = offset
+    return months_before((fetched - delta).date(), months)
+
+
+def parse_job_dates(time_texts, fetched, datetime_attrs=None) -> pd.Series:
+    """
+    Posting dates of a column of `posted time ago` texts, as `parse_job_date` of each row
+
+    Inputs:
+     - time_texts : pd.Series of str
+     - fetched : datetime of the fetch of all the pages, or pd.Series of the fetch datetimes aligned with time_texts
+     - datetime_attrs : pd.Series of the `datetime` attributes (None when missing), optional
+
+    Returns a pd.Series of datetime.date aligned with time_texts
+    """
+    time_texts = pd.Series(time_texts)
+    codes, texts = pd.factorize(time_texts.fillna(''))
+    offsets = [relative_offset(text) or (timedelta(0), 0) for text in texts]
+    deltas = np.array([delta for delta, _ in offsets], dtype='timedelta64[us]')[codes]
+    months = np.array([months for _, months in offsets], dtype=np.int64)[codes]
+
+    fetched = pd.to_datetime(fetched)
+    fetched = np.asarray(fetched, dtype='datetime64[us]') if np.ndim(fetched) else np.datetime64(fetched, 'us')
+    days = (fetched - deltas).astype('datetime64[D]')
+    # calendar months : same day of the month, clipped to the end of the month
+    month_starts = days.astype('datetime64[M]') - months
+    month_lengths = ((month_starts + 1).astype('datetime64[D]') - month_starts.astype('datetime64[D]'))
+    day_of_month = days - days.astype('datetime64[M]').astype('datetime64[D]')
+    days = month_starts.astype('datetime64[D]') + np.minimum(day_of_month, month_lengths - 1)
+
+    # few distinct days : converted once to datetime.date
+    codes, unique_days = pd.factorize(days)
+    dates = pd.Series(np.asarray(pd.DatetimeIndex(unique_days).date)[codes], index=time_texts.index)
+    if datetime_attrs is not None:
+        codes, datetime_attrs = pd.factorize(pd.Series(datetime_attrs).fillna(''))
+        posted = np.array([absolute_date(datetime_attr) if datetime_attr else None
+                           for datetime_attr in datetime_attrs], dtype=object)[codes]
+        dates = dates.where(pd.isna(posted), pd.Series(posted, index=time_texts.index))
+    return dates
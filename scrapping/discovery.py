@@ -0,0 +1,92 @@
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from bs4 import BeautifulSoup
+from fetcher import Fetcher
+from link_store import job_id
+
+"""
+Discovery of the job links without a browser.
+The job search page loads its results 25 by 25 from a listing endpoint returning the HTML of the next result cards
+(`LISTING_PATH?<search query>&start=<offset>`). The ListingDiscovery requests these pages directly, a wave of
+`concurrency` offsets at a time over the pooled session of the Fetcher, until a page comes back empty : there is no
+fixed sleep, the requests only wait for the rate limit of the host and, when the host throttles (429/5xx), for its
+Retry-After delay or an exponential backoff (see fetcher.py).
+The links are extracted from the result cards as from the scrolled search page (`extract_job_links`).
+"""
+
+LISTING_PATH = '/jobs-guest/jobs/api/seeMoreJobPostings/search'
+PAGE_SIZE = 25
+
+
+def extract_job_links(html: str) -> list:
+    """
+    Links toward the job pages of the result cards of a search page or of a listing page, in their English version
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    job_raw_links = soup.find_all("a", class_="result-card__full-card-link")
+    # Get the english version and not the german one
+    return [l.attrs["href"].replace('/ch.', '/www.') for l in job_raw_links]
+
+
+def listing_url(access_link: str, start: int) -> str:
+    """
+    Link of the listing page of the search `access_link` starting at the result `start`
+    """
+    scheme, netloc, _, query, _ = urlsplit(access_link)
+    params = [(name, value) for name, value in parse_qsl(query) if name != 'start'] + [('start', start)]
+    return urlunsplit((scheme, netloc, LISTING_PATH, urlencode(params), ''))
+
+
+class ListingDiscovery:
+    """
+    Pages through the listing endpoint of a job search over HTTP.
+
+    Input:
+    _ access_link : str, link of the job search page
+    _ concurrency : int, number of listing pages requested at the same time
+    _ rate_per_host : float, maximum number of requests per second, no limit if None
+    _ max_pages : int, maximum number of listing pages requested
+    _ page_size : int, number of results per listing page
+
+    __call__ returns:
+    _ list of the job links, in the order of the results, each job once
+    """
+
+    def __init__(self, access_link: str, concurrency: int = 8, rate_per_host: float = None, max_pages: int = 200,
+                 page_size: int = PAGE_SIZE):
+        self.access_link = access_link
+        self.concurrency = concurrency
+        self.rate_per_host = rate_per_host
+        self.max_pages = max_pages
+        self.page_size = page_size
+        # listing pages requested and elapsed seconds of the last call
+        self.stats = {'pages': 0, 'seconds': 0.}
+
+    def __call__(self) -> list:
+        pages = {}  # page number --> links, None if the page could not be downloaded
+        n_pages, seconds = 0, 0.
+        with Fetcher(concurrency=self.concurrency, rate_per_host=self.rate_per_host, parse_workers=0) as fetcher:
+            # a wave of pages is requested as long as the previous ones were all full
+            while n_pages < self.max_pages and all(pages.get(page) for page in range(n_pages)):
+                wave = range(n_pages, min(n_pages + self.concurrency, self.max_pages))
+                urls = [listing_url(self.access_link, page * self.page_size) for page in wave]
+                for i, links in fetcher.iter_fetch(urls, extract_job_links):
+                    # a failed download is an empty dict
+                    pages[wave[i]] = links if isinstance(links, list) else None
+                n_pages, seconds = wave.stop, seconds + fetcher.stats['seconds']
+
+        # the results before the first empty (or failed) page, the jobs being shifted by the new postings
+        job_links, known = [], set()
+        for page in range(n_pages):
+            if not pages[page]:
+                if pages[page] is None:
+                    logging.warning('Listing page {} could not be downloaded - discovery stopped'.format(page))
+                break
+            for link in pages[page]:
+                key = job_id(link) or link
+                if key not in known:
+                    known.add(key)
+                    job_links.append(link)
+        self.stats = {'pages': n_pages, 'seconds': seconds}
+        logging.info('{} job links found on {} listing pages in {:.1f}s'.format(len(job_links), n_pages, seconds))
+        return job_links
@@ -0,0 +1,149 @@
+from html.parser import HTMLParser
+
+"""
+Streaming extraction of the job page fields.
+`BeautifulSoup` builds the tree of the whole page before the fields can be searched. The JobPageParser reads the
+page once, only keeps the text of the elements holding the fields and stops as soon as all of them are found.
+The description is kept as the raw HTML of the page instead of being re-serialized with `.prettify()`.
+
+The elements are matched as in the reference soup extraction (`scrapper.get_job_characteristic`) :
+ - title : text of the first <h1>
+ - company, location : text of the first two <span> having the `topcard__flavor` class, `company_link` is True if
+   the first one holds a link
+ - posted : text of the first <span> whose class attribute is `POSTED_CLASSES`
+ - datetime : `datetime` attribute of this <span>, or else of the first <time> element, if any
+ - content : raw HTML of the first <div> whose class attribute is `DESCRIPTION_CLASS`
+ - criteria : {text of the <h3> having the `job-criteria__subheader` class : texts of its next <span> siblings}
+"""
+
+POSTED_CLASSES = ('topcard__flavor--metadata posted-time-ago__text',
+                  'topcard__flavor--metadata posted-time-ago__text posted-time-ago__text--new')
+DESCRIPTION_CLASS = 'description__text description__text--rich'
+CRITERIA_LIST_CLASS = 'job-criteria__list'
+# elements without end tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+                 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'keygen',
+                 'menuitem', 'nextid', 'spacer'}
+FIELDS = ('title', 'company', 'location', 'posted', 'content')
+
+
+class StopParsing(Exception):
+    pass
+
+
+class JobPageParser(HTMLParser):
+    """
+    Single pass parser of a job page, the fields found are in `fields`
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields = {'criteria': {}}
+        self.stack = []  # open elements
+        self.captures = []  # [depth of the element, field, text chunks] of the elements whose text is kept
+        self.n_flavors = 0
+        self.subheaders = []  # [depth of the parent, subheader] waiting for their <span> siblings
+        self.criteria_done = False
+        self.description_start = None
+        self.line_offsets = [0]
+
+    def extract(self, page) -> dict:
+        """
+        Parses the HTML of a page and returns its fields
+        """
+        newline = page.find('\n')
+        while newline >= 0:
+            self.line_offsets.append(newline + 1)
+            newline = page.find('\n', newline + 1)
+        self.page = page
+        try:
+            self.feed(page)
+            self.close()
+        except StopParsing:
+            pass
+        return self.fields
+
+    def position(self) -> int:
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        classes = ''
+        for name, value in attrs:
+            if name == 'class':
+                classes = value or ''
+                break
+        depth = len(self.stack)
+
+        if tag == 'h1' and 'title' not in self.fields:
+            self.captures.append([depth, 'title', []])
+        elif tag == 'span':
+            if self.n_flavors < 2 and 'topcard__flavor' in classes.split():
+                self.captures.append([depth, ('company', 'location')[self.n_flavors], []])
+                self.n_flavors += 1
+            elif classes in POSTED_CLASSES and 'posted' not in self.fields:
+                self.captures.append([depth, 'posted', []])
+                if dict(attrs).get('datetime'):
+                    self.fields['datetime'] = dict(attrs)['datetime']
+            for parent_depth, subheader in self.subheaders:
+                if parent_depth == depth - 1:
+                    self.captures.append([depth, ('criteria', subheader), []])
+        elif tag == 'a' and any(field == 'company' for _, field, _ in self.captures):
+            self.fields['company_link'] = True
+        elif tag == 'h3' and 'job-criteria__subheader' in classes.split():
+            self.captures.append([depth, 'subheader', []])
+        elif tag == 'div' and classes == DESCRIPTION_CLASS and self.description_start is None:
+            self.description_start = (self.position(), depth)
+        elif tag == 'time' and 'datetime' not in self.fields and dict(attrs).get('datetime'):
+            self.fields['datetime'] = dict(attrs)['datetime']
+        elif tag == 'ul' and CRITERIA_LIST_CLASS in classes.split():
+            self.captures.append([depth, 'criteria_list', []])
+
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # as BeautifulSoup, the elements opened after the last `tag` are closed, unmatched end tags are ignored
+        if tag not in self.stack:
+            return
+        depth = len(self.stack) - 1 - self.stack[::-1].index(tag)
+        if self.description_start is not None and depth <= self.description_start[1] and 'content' not in self.fields:
+            # end of the description, its end tag included, or implicit end when a parent element is closed
+            end = self.page.index('>', self.position()) + 1 if depth == self.description_start[1] else self.position()
+            self.fields['content'] = self.page[self.description_start[0]:end]
+        del self.stack[depth:]
+        self.subheaders = [(parent_depth, subheader) for parent_depth, subheader in self.subheaders
+                           if parent_depth < depth]
+        while self.captures and self.captures[-1][0] >= depth:
+            self.end_capture(*self.captures.pop())
+
+        if self.criteria_done and all(field in self.fields for field in FIELDS):
+            raise StopParsing
+
+    def end_capture(self, depth, field, chunks):
+        text = ''.join(chunks)
+        if field == 'subheader':
+            self.subheaders.append((depth - 1, text))
+            self.fields['criteria'].setdefault(text, [])
+        elif field == 'criteria_list':
+            self.criteria_done = True
+        elif isinstance(field, tuple):
+            self.fields['criteria'][field[1]].append(text)
+        else:
+            self.fields.setdefault(field, text)
+
+    def handle_data(self, data):
+        for capture in self.captures:
+            capture[2].append(data)
+
+
+def extract_fields(job_page_html: str) -> dict:
+    """
+    Returns the raw fields of a job page (see the module docstring), the fields not found are missing
+    """
+    return JobPageParser().extract(job_page_html)
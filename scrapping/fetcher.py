@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+Concurrent fetching of the job pages.
+The pages are downloaded by a pool of threads sharing a single keep-alive `requests.Session` (one TLS handshake per
+pooled connection instead of one per page). The downloads are rate limited per host and retried with an exponential
+backoff. The parsing of the HTML is CPU bound : it is handed to a pool of processes so that it never holds the
+threads that are waiting for the network.
+The parsed pages are yielded as soon as they are ready (`iter_fetch`), a bounded number of pages being downloaded or
+parsed at a time, so that the memory does not grow with the number of pages.
+"""
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(retry_after) -> float:
+    """
+    Delay in seconds of a Retry-After header, given in seconds or as an HTTP-date (RFC 7231), 0 if it is missing or
+    cannot be read : the exponential backoff applies
+    """
+    try:
+        return max(float(retry_after), 0.)
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError, IndexError):
+        return 0.
+    if retry_at.tzinfo is None:  # '-0000' zone
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.)
+
+
+class HostRateLimiter:
+    """
+    Spaces the requests sent to a same host by at least 1 / `rate` seconds. Thread safe.
+
+    Inputs:
+     - rate : float, maximum number of requests per second and per host, no limit if None
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host) -> None:
+        """
+        Blocks until a request can be sent to `host`
+        """
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Fetcher:
+    """
+    Downloads web pages concurrently and parses them in worker processes.
+
+    Inputs:
+     - concurrency : int, number of pages downloaded at the same time (threads and pooled connections)
+     - rate_per_host : float, maximum number of requests per second sent to a same host, no limit if None
+     - retries : int, number of new attempts after a connection error, a timeout or a 429/5xx response
+     - backoff : float, delay in seconds before the first new attempt, doubled at each attempt
+     - timeout : float, timeout of the requests in seconds
+     - parse_workers : int, number of parsing processes, cpu count by default. If 0, the pages are parsed in the
+       main process.
+
+    The fetcher is a context manager closing the session and the pools.
+    """
+
+    def __init__(self, concurrency=16, rate_per_host=None, retries=3, backoff=0.5, timeout=10, parse_workers=None):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = HostRateLimiter(rate_per_host)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.fetch_pool = ThreadPoolExecutor(concurrency)
+        self.parse_pool = ProcessPoolExecutor(parse_workers) if parse_workers != 0 else None
+
+        # pages downloaded, failed downloads and elapsed seconds of the last `fetch_all`
+        self.stats = {'pages': 0, 'failed': 0, 'seconds': 0.}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self.fetch_pool.shutdown()
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+        self.session.close()
+
+    def fetch(self, url) -> str:
+        """
+        Downloads a page and returns its text, raises a requests.RequestException once the retries are exhausted
+        """
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait(host)
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.text
+                error = requests.HTTPError('{} for url {}'.format(response.status_code, url), response=response)
+                delay = retry_after_seconds(response.headers.get('Retry-After'))
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error, delay = exc, 0
+            if attempt < self.retries:
+                time.sleep(max(delay, self.backoff * 2 ** attempt))
+        raise error
+
+    def iter_fetch(self, urls, parse, progress=None, max_pending=None, timestamped=False):
+        """
+        Downloads and parses pages, yielding them as soon as they are parsed
+
+        Inputs:
+         - urls : iterable of str, page links, consumed as the downloads progress
+         - parse : picklable function parsing the text of a page
+         - progress : tqdm progress bar updated for each parsed page, optional
+         - max_pending : int, maximum number of pages being downloaded or parsed at a time, 4 x concurrency by default
+         - timestamped : bool, if True, `parse` is also given the datetime the download completed (`fetched`
+           keyword), the pages giving dates relative to the time they are served
+
+        Yields the (index in `urls`, parsed page) pairs in their order of completion. A page that could not be
+        downloaded is an empty dict.
+        """
+        start = time.perf_counter()
+        max_pending = max_pending or 4 * self.concurrency
+        queue = enumerate(urls)
+        downloads, parsings = {}, {}  # future --> (index, url)
+        n_pages, failed = 0, 0
+
+        def submit() -> None:
+            # new downloads are only submitted when pages leave the pipeline
+            for i, url in queue:
+                downloads[self.fetch_pool.submit(self.fetch, url)] = (i, url)
+                if len(downloads) + len(parsings) >= max_pending:
+                    return
+
+        try:
+            submit()
+            while downloads or parsings:
+                done, _ = wait(list(downloads) + list(parsings), return_when=FIRST_COMPLETED)
+                ready = []
+                for future in done:
+                    if future in parsings:
+                        ready.append((parsings.pop(future)[0], future.result()))
+                        continue
+                    i, url = downloads.pop(future)
+                    n_pages += 1
+                    try:
+                        page = future.result()
+                    except requests.RequestException as exc:
+                        logging.warning('Failed to download {} - {}'.format(url, exc))
+                        failed += 1
+                        ready.append((i, {}))
+                        continue
+                    kwargs = {'fetched': datetime.now()} if timestamped else {}
+                    if self.parse_pool is None:
+                        ready.append((i, parse(page, **kwargs)))
+                    else:
+                        parsings[self.parse_pool.submit(parse, page, **kwargs)] = (i, url)
+                submit()
+                for i, parsed in ready:
+                    if progress is not None:
+                        progress.update()
+                    yield i, parsed
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats = {'pages': n_pages - failed, 'failed': failed, 'seconds': elapsed}
+            logging.info('{} pages fetched in {:.1f}s - {:.1f} pages/s - {} failed'
+                         .format(n_pages - failed, elapsed, (n_pages - failed) / max(elapsed, 1e-9), failed))
+
+    def fetch_all(self, urls, parse, progress=None) -> list:
+        """
+        Downloads and parses pages
+
+        Inputs:
+         - urls : list of str, page links
+         - parse : picklable function parsing the text of a page
+         - progress : tqdm progress bar updated for each parsed page, optional
+
+        Returns the list of parsed pages, in the order of `urls`. A page that could not be downloaded is an empty dict.
+        """
+        results = [{}] * len(urls)
+        for i, parsed in self.iter_fetch(urls, parse, progress):
+            results[i] = parsed
+        return results
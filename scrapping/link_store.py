@@ -0,0 +1,96 @@
+import os
+import re
+import pickle
+import sqlite3
+import logging
+from datetime import datetime
+
+"""
+Persistent store of the job links already scrapped.
+The links of the job search results carry tracking parameters that change at each search : a job is identified by
+the numeric id of its `/jobs/view/` link. The ids are the primary key of a SQLite table, so checking a run of links
+against the store is a handful of indexed lookups rather than a rewrite of the whole list of known links.
+"""
+
+JOB_ID_PATTERN = re.compile(r'/jobs/view/(?:[^/?#]*-)?(\d+)')
+DB_FILE = 'job_links.sqlite'
+LEGACY_FILE = 'job_links.p'
+SQLITE_MAX_VARIABLES = 900
+
+
+def job_id(job_link: str) -> int:
+    """
+    Normalized id of a job link, None if the link is not a job page link
+    """
+    match = JOB_ID_PATTERN.search(job_link)
+    return int(match.group(1)) if match else None
+
+
+class LinkStore:
+    """
+    SQLite table of the scrapped job ids, created in the data folder.
+    The links of the former pickled list (`job_links.p`) are imported when the table is created.
+
+    Inputs:
+     - DATA_DIR : data folder directory
+    """
+
+    def __init__(self, DATA_DIR):
+        self.connection = sqlite3.connect(os.path.join(DATA_DIR, DB_FILE))
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS seen_links ('
+                                    'job_id INTEGER PRIMARY KEY, link TEXT, first_seen TEXT)')
+        if not len(self) and os.path.exists(os.path.join(DATA_DIR, LEGACY_FILE)):
+            legacy_links = pickle.load(open(os.path.join(DATA_DIR, LEGACY_FILE), 'rb'))
+            self.add(legacy_links)
+            logging.info('{} job links imported from {}'.format(len(self), LEGACY_FILE))
+
+        # stats of the last `filter_new`
+        self.stats = {'found': 0, 'new': 0, 'skipped': 0}
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM seen_links').fetchone()[0]
+
+    def __contains__(self, job_link):
+        return self.connection.execute('SELECT 1 FROM seen_links WHERE job_id = ?',
+                                       (job_id(job_link),)).fetchone() is not None
+
+    def known_ids(self, ids) -> set:
+        """
+        Returns the ids of `ids` that are in the store
+        """
+        ids, known = list(ids), set()
+        for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[i:i + SQLITE_MAX_VARIABLES]
+            query = 'SELECT job_id FROM seen_links WHERE job_id IN ({})'.format(','.join('?' * len(chunk)))
+            known.update(row[0] for row in self.connection.execute(query, chunk))
+        return known
+
+    def filter_new(self, job_links) -> list:
+        """
+        Returns the links of jobs that are not in the store, each job once and in the order of `job_links`.
+        Links that are not job page links are kept.
+        """
+        ids = [job_id(link) for link in job_links]
+        known = self.known_ids({i for i in ids if i is not None})
+        new_links, batch_ids = [], set()
+        for link, i in zip(job_links, ids):
+            if i is None:
+                new_links.append(link)
+            elif i not in known and i not in batch_ids:
+                batch_ids.add(i)
+                new_links.append(link)
+        self.stats = {'found': len(job_links), 'new': len(new_links), 'skipped': len(job_links) - len(new_links)}
+        return new_links
+
+    def add(self, job_links) -> None:
+        """
+        Records job links as scrapped, already known jobs are ignored
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = [(job_id(link), link, now) for link in job_links if job_id(link) is not None]
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO seen_links VALUES (?, ?, ?)', rows)
+
+    def close(self) -> None:
+        self.connection.close()
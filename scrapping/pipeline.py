@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+from datetime import date
+import pandas as pd
+from source.storage import append_jobs, append_content
+from source.dedup import NearDuplicates, job_texts
+from source.sparse import FunctionMatrix
+from data_formatting import get_job_functions, canton_cleaning, split_data_frame
+
+"""
+Streaming scrapping pipeline.
+The job pages flow from the fetcher through the parsing and the formatting into chunks of `chunk_size` pages. Each
+chunk is committed before the next one is formatted :
+ 1. its jobs are appended to the columnar dataset (a new part of `jobs/`, see source/storage.py), each new job
+    being assigned to its near-duplicate cluster among the stored jobs and the previous ones of the run (see
+    source/dedup.py),
+ 2. its contents are appended as a new part of `jobs_content/<scrap date>/`,
+ 3. its links are recorded in the LinkStore,
+ 4. the checkpoint (`scrap_checkpoint.json`) is updated.
+Only the pages of a chunk are held in memory. The checkpoint keeps the job links found by the search and the date
+of the run : a restarted run skips the search and the links of the committed chunks (they are in the LinkStore) and
+resumes with the remaining ones. A chunk interrupted between steps 1 and 3 is scrapped again, its jobs being
+deduplicated by append_jobs and its contents by load_content. The checkpoint is removed once the run is complete.
+"""
+
+CHECKPOINT = 'scrap_checkpoint.json'
+
+
+def chunked(iterable, chunk_size):
+    """
+    Yields lists of `chunk_size` consecutive items of `iterable`, the last one being shorter
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def format_pages(job_pages, DATA_DIR) -> [pd.DataFrame, FunctionMatrix, pd.DataFrame]:
+    """
+    Formats scrapped job pages (dicts) into the jobs, their FunctionMatrix and the job contents
+    """
+    df_raw = pd.DataFrame(job_pages)
+    df_raw, function_matrix = get_job_functions(df_raw)
+    df_raw = canton_cleaning(df_raw, DATA_DIR)
+    return split_data_frame(df_raw, function_matrix)
+
+
+class Checkpoint:
+    """
+    Progress of a scrapping run, stored in `<DATA_DIR>/scrap_checkpoint.json`.
+
+    Inputs:
+     - DATA_DIR : data folder directory
+    """
+
+    def __init__(self, DATA_DIR):
+        self.path = os.path.join(DATA_DIR, CHECKPOINT)
+
+    def load(self) -> dict:
+        """
+        State of the interrupted run, None if the last run was completed
+        """
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, state) -> None:
+        """
+        Replaces the checkpoint by `state`, the file being replaced only once complete
+        """
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        """
+        Removes the checkpoint, the run being complete
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ScrapPipeline:
+    """
+    Scraps the new job pages and stores them chunk by chunk, resuming an interrupted run.
+
+    Inputs:
+     - scrapper : Scrapper, searching the job links and fetching the pages
+     - DATA_DIR : data folder directory
+     - chunk_size : int, number of pages formatted and committed at once
+
+    The pipeline is callable and returns the counters of the run.
+    """
+
+    def __init__(self, scrapper, DATA_DIR, chunk_size=500):
+        self.scrapper = scrapper
+        self.DATA_DIR = DATA_DIR
+        self.chunk_size = chunk_size
+        self.checkpoint = Checkpoint(DATA_DIR)
+        # index of the job signatures, loaded at the start of the run and updated by each chunk
+        self.near_duplicates = None
+
+    def __call__(self) -> dict:
+        state = self.checkpoint.load()
+        if state is None:
+            self.scrapper.search_links()
+            state = {'scrap_date': date.today().isoformat(), 'job_links': self.scrapper.job_links,
+                     'chunks': 0, 'pages': 0, 'jobs': 0, 'failed': 0}
+            self.checkpoint.save(state)
+        else:
+            logging.info('Resuming the run of {} after {} chunks'.format(state['scrap_date'], state['chunks']))
+            self.scrapper.job_links = state['job_links']
+        # the links of the committed chunks are in the LinkStore
+        self.scrapper.skip_known_links()
+        self.near_duplicates = NearDuplicates.load(self.DATA_DIR)
+
+        job_links = self.scrapper.job_links
+        for chunk in chunked(self.scrapper.iter_job_pages(job_links), self.chunk_size):
+            self.commit_chunk([(job_links[i], page) for i, page in chunk], state)
+
+        self.checkpoint.clear()
+        logging.info('{pages} job pages scrapped - {jobs} new jobs - {failed} failed'.format(**state))
+        return state
+
+    def commit_chunk(self, chunk, state) -> None:
+        """
+        Formats and stores the (link, page) pairs of a chunk, then records its links and the progress of the run
+        """
+        scrap_date = date.fromisoformat(state['scrap_date'])
+        pages = [page for _, page in chunk if page]
+        if pages:
+            df_jobs, function_matrix, df_content = format_pages(pages, self.DATA_DIR)
+            state['jobs'] += append_jobs(df_jobs, function_matrix, self.DATA_DIR, scrap_date=scrap_date,
+                                         near_duplicates=self.near_duplicates, texts=job_texts(df_jobs, df_content))
+            append_content(df_content, self.DATA_DIR, scrap_date)
+        # the failed pages are tried again at the next run
+        self.scrapper.link_store.add([link for link, page in chunk if page])
+
+        state['chunks'] += 1
+        state['pages'] += len(pages)
+        state['failed'] += len(chunk) - len(pages)
+        self.checkpoint.save(state)
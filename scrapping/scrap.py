@@ -1,10 +1,14 @@
+import sys
 import logging.config
 import yaml
-import pandas as pd
+sys.path.append('..')  # `source` package shared with the web app
 from scrapper import Scrapper
-from data_formatting import get_job_functions, canton_cleaning, split_data_frame
+from pipeline import ScrapPipeline
+from source.timeseries import update_timeseries
 """
 Get the publicly available data from LinkedIn and formats it in a DataFrame fro the interactive web app. 
+The pages are stored chunk by chunk as they are scrapped, an interrupted run is resumed at the next start
+(see pipeline.py). The daily counts of the web app are then updated with the new jobs (see source/timeseries.py).
 
 The whole program process is written int eh scrapper_process.log log file.
 """
@@ -15,12 +19,6 @@ logger = logging.getLogger(__name__)
 
 if __name__ == '__main__':
     linkedin_link = 'https://www.linkedin.com/jobs/search/?location=Switzerland&sortBy=DD'
-    scrapping = Scrapper(access_link=linkedin_link)
-    job_pages = scrapping()
-
-    df_raw = pd.DataFrame(job_pages)
-    df_raw.dropna(how='all', inplace=True)
-    df_raw = get_job_functions(df_raw)
-    df_raw = canton_cleaning(df_raw, '../Data/')
-    df_jobs, df_content = split_data_frame(df_raw)
-
+    scrapping = Scrapper(access_link=linkedin_link, DATA_DIR='../Data/')
+    ScrapPipeline(scrapping, '../Data/', chunk_size=500)()
+    update_timeseries('../Data/')
@@ -5,7 +5,7 @@ do
 		echo Scrapping ...		
 		python3 scrap.py
 		git pull
-		git add ../Data/df_jobs_content.p ../Data/df_jobs.p
+		git add ../Data/df_jobs_content.p ../Data/jobs ../Data/jobs_content ../Data/timeseries.npz
 		git commit -m `date +"%a-%d-%b %H"`
 		git push
 
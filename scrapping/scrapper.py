@@ -3,12 +3,16 @@ import requests
 import unidecode
 from tqdm import tqdm
 import io
-from multiprocessing import cpu_count, Pool
-import pickle
+from functools import partial
 from bs4 import BeautifulSoup
-from datetime import timedelta, date
+from datetime import datetime
 from time import sleep
 from selenium import webdriver
+from fetcher import Fetcher
+from link_store import LinkStore
+from extractors import extract_fields
+from dates import parse_job_date
+from discovery import ListingDiscovery, extract_job_links
 
 DATA_DIR = './Data/'
 
@@ -35,9 +39,10 @@ class TqdmToLogger(io.StringIO):
 
 
 # --- Scrapping job page ---
-def get_job_date(html_soup):
+def get_job_date(html_soup, fetched: datetime = None):
     """
-    Get the posting date of the job.
+    Get the posting date of the job, relative to the time the page was
+    `fetched` (see dates.py) unless the element has a `datetime` attribute.
     Best accuracy is at the day scale, then week, then month
 
     return a datetime.date type
@@ -50,22 +55,9 @@ def get_job_date(html_soup):
         time_raw = html_soup.find("span",
                                   class_="topcard__flavor--metadata posted-time-ago__text posted-time-ago__text--new")
 
-    time_raw = time_raw.text.split()[:2]
-    time_scale = time_raw[1]
-
-    today = ['minutes', 'minute', 'hour', 'hours', 'seconds', 'Just']
-    if time_scale in today:
-        job_date = date.today()
-    elif (time_scale == 'day') or (time_scale == 'days'):
-        job_date = date.today() - timedelta(days=int(time_raw[0]))
-    elif (time_scale == 'week') or (time_scale == 'weeks'):
-        job_date = date.today() - timedelta(weeks=int(time_raw[0]))
-    elif (time_scale == 'month') or (time_scale == 'months'):
-        job_date = date.today() - timedelta(weeks=4 * int(time_raw[0]))
-    else:
-        raise ValueError
-
-    return job_date
+    time_tag = html_soup.find("time", attrs={'datetime': True})
+    datetime_attr = (time_raw.get('datetime') if time_raw else None) or (time_tag['datetime'] if time_tag else None)
+    return parse_job_date(time_raw.text if time_raw else '', fetched, datetime_attr)
 
 
 def format_city(city_str: str) -> str:
@@ -96,10 +88,43 @@ def format_city(city_str: str) -> str:
         return city_str
 
 
-def get_job_characteristic(html_soup: BeautifulSoup) -> dict:
+def get_job_location(location_text: str) -> dict:
+    """
+    Get the city and the canton (when available) from the location text
+    of the job page
+    """
+    job_location = {}
+    location = location_text.split(', ')
+    if location:
+        if len(location) > 2:
+            job_location['city'] = format_city(location[0])
+            job_location['canton'] = unidecode.unidecode(location[1])
+
+        elif len(location) == 1:
+            location = location.split()
+            if len(location) > 1:
+                # Greater XXX Area
+                if location[0] == 'Greater':
+                    job_location['city'] = location[1]
+                else:  # XXX Metropolitan Area
+                    job_location['city'] = location[0]
+            else:
+                job_location['country'] = 'Switzerland'
+        else:
+            job_location['city'] = format_city(location[0])
+    else:
+        job_location['city'] = 'unknown'
+    return job_location
+
+
+def get_job_characteristic(html_soup: BeautifulSoup, fetched: datetime = None) -> dict:
     """
     Get the HTML file and extract job information. Store it in a dict format
-    to late append to a pd.DataFrame
+    to late append to a pd.DataFrame. The posting date is relative to the
+    time the page was `fetched`, now by default
+
+    Reference extraction : the whole page is parsed into a soup and the
+    description is re-serialized with `.prettify()`
     """
     job_charac = {}
     job_charac['title'] = html_soup.h1.text
@@ -107,32 +132,11 @@ def get_job_characteristic(html_soup: BeautifulSoup) -> dict:
     job_charac['company'] = company_span.text
 
     if company_span.a:  # if the company name is clickable
-
-        location = html_soup.find_all("span", class_='topcard__flavor')[1] \
-            .text.split(', ')
-        if location:
-            if len(location) > 2:
-                job_charac['city'] = format_city(location[0])
-                job_charac['canton'] = unidecode.unidecode(location[1])
-
-            elif len(location) == 1:
-                location = location.split()
-                if len(location) > 1:
-                    # Greater XXX Area
-                    if location[0] == 'Greater':
-                        job_charac['city'] = location[1]
-                    else:  # XXX Metropolitan Area
-                        job_charac['city'] = location[0]
-                else:
-                    job_charac['country'] = 'Switzerland'
-            else:
-                job_charac['city'] = format_city(location[0])
-        else:
-            job_charac['city'] = 'unknown'
+        job_charac.update(get_job_location(html_soup.find_all("span", class_='topcard__flavor')[1].text))
     else:
         job_charac['city'] = 'unknown'
 
-    job_charac['date'] = get_job_date(html_soup)
+    job_charac['date'] = get_job_date(html_soup, fetched)
     job_charac['content'] = html_soup.find("div",
                                            class_="description__text description__text--rich").prettify()
 
@@ -145,15 +149,52 @@ def get_job_characteristic(html_soup: BeautifulSoup) -> dict:
     return job_charac
 
 
-def scrap_job_page(job_link: str) -> dict:
+def stream_job_characteristic(job_page_html: str, fetched: datetime = None) -> dict:
     """
-    Get a web link, access the page and scrap its content
+    Same job information as `get_job_characteristic` from a single pass
+    over the HTML, which stops once all the fields are found (see
+    extractors.py). The description is stored as its raw HTML.
     """
-    job_page_html = requests.get(job_link).text
-    html_soup = BeautifulSoup(job_page_html, 'html.parser')
+    fields = extract_fields(job_page_html)
+    job_charac = {}
+    job_charac['title'] = fields['title']
+    job_charac['company'] = fields['company']
+
+    if fields.get('company_link'):  # if the company name is clickable
+        job_charac.update(get_job_location(fields['location']))
+    else:
+        job_charac['city'] = 'unknown'
+
+    job_charac['date'] = parse_job_date(fields.get('posted', ''), fetched, fields.get('datetime'))
+    job_charac['content'] = fields['content']
+    job_charac.update(fields['criteria'])
+
+    job_charac['Seniority level'] = job_charac['Seniority level'][0]
+    job_charac['Employment type'] = job_charac['Employment type'][0]
+
+    return job_charac
+
+
+def soup_job_characteristic(job_page_html: str, fetched: datetime = None) -> dict:
+    """
+    Reference extraction of the job information from the page HTML
+    """
+    return get_job_characteristic(BeautifulSoup(job_page_html, 'html.parser'), fetched)
+
+
+# extraction backends : name --> function of the page HTML and of its fetch time
+EXTRACTORS = {'soup': soup_job_characteristic,
+              'stream': stream_job_characteristic}
 
+
+def parse_job_page(job_page_html: str, extractor: str = 'stream', fetched: datetime = None) -> dict:
+    """
+    Parse the HTML of a job page and scrap its content with the `extractor`
+    backend ('soup' or 'stream'), an empty dict if the page could not be
+    parsed. The dates are relative to the time the page was `fetched`.
+    """
     try:
-        scrapped = get_job_characteristic(html_soup)
+        scrapped = EXTRACTORS[extractor](job_page_html, fetched)
     except:
         # .failed_job_links.append(job_link)
         scrapped = {}
@@ -161,19 +202,30 @@ def scrap_job_page(job_link: str) -> dict:
     return scrapped
 
 
+def scrap_job_page(job_link: str, extractor: str = 'stream') -> dict:
+    """
+    Get a web link, access the page and scrap its content
+    """
+    job_page_html = requests.get(job_link).text
+    return parse_job_page(job_page_html, extractor, datetime.now())
+
+
 # --- Scrapper class ---
 class Scrapper:
     """
-    The class connect to LinkedIn and interacts with the page by scrolling
-    and clicking on buttons thanks to a driver `bot`.
+    The class connect to LinkedIn and gets the job results, either from the
+    listing endpoint over HTTP (see discovery.py) or by scrolling and clicking
+    on buttons of the job results page thanks to a driver `bot`.
     The task is decomposed into two steps :
-    _ Get all the links toward individual job add <=> scroll the job results
-    page
+    _ Get all the links toward individual job add <=> page through the job
+    results
     _ Access each individual job page and scrapp the relevant information
 
     The processing is split into two parts to enable multiprocessing time
     optimisation. The list of links retrieved from the first step is ditributed
     to each core.
+    The links of the jobs scrapped during the previous runs are recorded in a
+    LinkStore and skipped.
 
     Once the parsing and information scrapping is done. As the class wraps up
     the pipline, the class is made callable.The class can return a list of dict
@@ -181,19 +233,35 @@ class Scrapper:
 
     Input:
     _ access_link : str, link to connect to LinkeIn
+    _ concurrency : int, number of job pages downloaded at the same time
+    _ rate_per_host : float, maximum number of job page requests per second,
+    no limit if None
+    _ DATA_DIR : str, data folder holding the store of the scrapped links
+    _ extractor : str, job page extraction backend, 'stream' or 'soup' (see
+    EXTRACTORS)
+    _ discovery : str, job links discovery backend, 'http' (listing endpoint,
+    the browser being the fallback when it finds no link) or 'selenium'
 
     __call__ returns:
     _ list of dict about ad information
     """
 
-    def __init__(self, access_link: str):
+    def __init__(self, access_link: str, concurrency: int = 16, rate_per_host: float = None,
+                 DATA_DIR: str = DATA_DIR, extractor: str = 'stream', discovery: str = 'http'):
 
         # Access link and connect
         self.access_link = access_link
+        # job page fetching
+        self.concurrency = concurrency
+        self.rate_per_host = rate_per_host
+        self.extractor = extractor
+        self.discovery = discovery
         # scrapping stopper
         self.stop_scrapping = False
 
         self.job_links = []  # list of links of individual html job ad
+        # links scrapped during the previous runs
+        self.link_store = LinkStore(DATA_DIR)
 
         # list of extracted html content
         self.job_pages = []  # type: list
@@ -206,6 +274,7 @@ class Scrapper:
     # --- Search and scrapp ---
     def __call__(self) -> list:
         self.search_links()
+        self.skip_known_links()
         self.scrap_all_list()
         return self.get_job_pages()
 
@@ -245,30 +314,39 @@ class Scrapper:
         """
         Get the htlm content of the page and scrap the link toward job pages.
         """
-        # get the html content
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        # get the job page links
-        job_raw_links = soup.find_all("a", class_="result-card__full-card-link")
-        # Get teh english version and not the german one
-        return [l.attrs["href"].replace('/ch.', '/www.') for l in job_raw_links]
-
-    def save_job_links(self, job_links) -> None:
+        return extract_job_links(self.driver.page_source)
+
+    def skip_known_links(self) -> None:
         """
-        Loads the list of job links previouly scrapped
+        Removes the links of the jobs already scrapped from the links to scrap
         """
-        try:
-            job_list_old = pickle.load(open('./Data/job_links.p', 'rb'))
-            # appd the old list, most recent on top
-            job_list_augmented = list(set(self.job_links + job_list_old))
-            pickle.dump(job_list_augmented, open('./Data/job_links.p', 'wb'))
+        self.job_links = self.link_store.filter_new(self.job_links)
+        stats = self.link_store.stats
+        logging.info('{} job links found - {} new - {} already scrapped'.format(stats['found'], stats['new'],
+                                                                                 stats['skipped']))
 
-        except FileNotFoundError:
-            pickle.dump(self.job_links, open('./Data/job_links.p', 'wb'))
+    def save_job_links(self) -> None:
+        """
+        Records the links of the successfully scrapped jobs, the failed ones
+        are tried again at the next run
+        """
+        self.link_store.add([link for link, page in zip(self.job_links, self.job_pages) if page])
 
     def search_links(self) -> None:
         """
         Exectue the searching of new job ad links and gathers them.
         """
+        if self.discovery == 'http':
+            self.job_links = ListingDiscovery(self.access_link, rate_per_host=self.rate_per_host)()
+            if self.job_links:
+                return
+            logging.warning('No job link found on the listing endpoint - falling back to the job results page')
+        self.browse_links()
+
+    def browse_links(self) -> None:
+        """
+        Gathers the job ad links by scrolling the job results page in the browser.
+        """
         # connect to LinkedIn
         self.connect()
         logging.info('Inspect job search results')
@@ -280,26 +358,35 @@ class Scrapper:
         logging.info('All available jobs ads collected.')
         # teminates the bot
         self.driver.close()
-        # self.save_job_links(self.job_links)  # save the links
 
     # --- Scrapping job page ---
-    def scrap_all_list(self) -> None:
-
-        if cpu_count() > 1:
-            logging.info('Multiprocessing available - {} CPUs'.format(cpu_count()))
-            with Pool(cpu_count()) as p:
-                self.job_pages = list(tqdm(p.imap(scrap_job_page, self.job_links),
-                                           total=len(self.job_links),
-                                           file=self.tqdm_out,
-                                           miniters=15))
-        else:
-            for job in tqdm(self.job_links, file=self.tqdm_out, miniters=15):
-                self.job_pages.append(scrap_job_page(job))
+    def iter_job_pages(self, job_links: list = None):
+        """
+        Downloads the job pages concurrently over a shared connection pool,
+        parses them in worker processes and yields the (index in `job_links`,
+        page) pairs as soon as they are parsed. A page that could not be
+        downloaded or parsed is an empty dict.
+        """
+        job_links = self.job_links if job_links is None else job_links
+        logging.info('Fetching {} job pages - {} concurrent downloads'.format(len(job_links), self.concurrency))
+        failed_job_links = 0
+        with Fetcher(concurrency=self.concurrency, rate_per_host=self.rate_per_host) as fetcher:
+            for i, page in fetcher.iter_fetch(job_links, partial(parse_job_page, extractor=self.extractor),
+                                              progress=tqdm(total=len(job_links), file=self.tqdm_out,
+                                                            miniters=15), timestamped=True):
+                failed_job_links += not page
+                yield i, page
 
-        # empty dict <=> False, sum of False --> sum of failed scrapping
-        failed_job_links = sum(not dict_ for dict_ in self.job_pages)
         logging.info('{} Jobs failed to be parsed'.format(failed_job_links))
 
+    def scrap_all_list(self) -> None:
+        """
+        Downloads and parses all the job pages, kept in `job_pages`
+        """
+        self.job_pages = [{}] * len(self.job_links)
+        for i, page in self.iter_job_pages():
+            self.job_pages[i] = page
+
     def get_job_pages(self) -> list:
         """
         Access job pages
@@ -0,0 +1,368 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+"""
+Aggregation engine of the web app.
+The job counts are stored in dense arrays so that the charts can be updated without going back to the raw job
+dataframe. The counts of the cantons and the total counts of the cities are computed at start up, the city counts of
+each job function when first requested.
+"""
+
+
+def top_k(counts, k) -> np.ndarray:
+    """
+    Indexes of the `k` largest counts along the first axis, in decreasing order. Equal counts are ranked by
+    index, as a stable sort of the negated counts would rank them. Only the `k` selected counts are sorted.
+
+    Inputs:
+     - counts : (n,) or (n, m) int np.ndarray
+     - k : int, number of indexes to return
+
+    Returns a (k,) or (k, m) np.ndarray of indexes
+    """
+    counts = np.asarray(counts)
+    n = len(counts)
+    k = min(k, n)
+    # unique keys : the counts, ties broken by the index
+    tie_break = (n - 1 - np.arange(n)).reshape((-1,) + (1,) * (counts.ndim - 1))
+    keys = -(counts.astype(np.int64) * n + tie_break)
+    if k == n:
+        return np.argsort(keys, axis=0)
+    candidates = np.argpartition(keys, k - 1, axis=0)[:k]
+    order = np.argsort(np.take_along_axis(keys, candidates, axis=0), axis=0)
+    return np.take_along_axis(candidates, order, axis=0)
+
+
+def first_postings(df_jobs) -> np.ndarray:
+    """
+    Boolean mask of the first posting (earliest date, then first stored) of each near-duplicate cluster of jobs
+    """
+    order = np.argsort(df_jobs['date'].values, kind='stable')
+    is_first = np.zeros(len(df_jobs), dtype=bool)
+    is_first[order[~pd.Series(df_jobs['cluster'].values[order]).duplicated().values]] = True
+    return is_first
+
+
+class RankingIndex:
+    """
+    Rankings of the cities and of the cantons of every column (job function and `All Jobs`) of a JobCube.
+    The order of all the cantons is computed for every column at once the first time a date window is requested,
+    the top `k` cities of a column the first time the column is ranked in this window. The rankings are kept for the
+    `max_windows` most recently used windows, so that a ranking is then a lookup of its first entries.
+
+    Inputs:
+     - cube : JobCube
+     - k : int, number of cities ranked per column, larger rankings are computed on demand
+     - max_windows : int, number of date windows kept
+    """
+
+    def __init__(self, cube, k=25, max_windows=64):
+        self.cube = cube
+        self.k = k
+        self.max_windows = max_windows
+        # (begin, end) --> (top cities per column {column index: (k,) np.ndarray}, canton order (cantons, columns))
+        self.windows = OrderedDict()
+        self.lock = threading.Lock()
+
+    def window(self, date_boundaries) -> [dict, np.ndarray]:
+        """
+        Top `k` cities of the columns ranked so far and order of the cantons of every column between two date indexes
+        """
+        key = (int(date_boundaries[0]), int(date_boundaries[1]))
+        with self.lock:
+            if key in self.windows:
+                self.windows.move_to_end(key)
+                return self.windows[key]
+        rankings = ({}, top_k(self.cube.canton_counts(key), len(self.cube.cantons)))
+        with self.lock:
+            rankings = self.windows.setdefault(key, rankings)
+            if len(self.windows) > self.max_windows:
+                self.windows.popitem(last=False)
+        return rankings
+
+    def top_cities(self, date_boundaries, column, k=10) -> np.ndarray:
+        """
+        Indexes (city axis) of the `k` cities with the most jobs of `column` between two date indexes
+        """
+        if k > self.k:
+            return top_k(self.cube.column_counts(date_boundaries, column)[0], k)
+        top_cities, _ = self.window(date_boundaries)
+        col = self.cube.column_index[column]
+        if col not in top_cities:
+            top_cities[col] = top_k(self.cube.column_counts(date_boundaries, column)[0], self.k)
+        return top_cities[col][:k]
+
+    def canton_order(self, date_boundaries, column) -> np.ndarray:
+        """
+        Indexes (canton axis) of the cantons by decreasing number of jobs of `column` between two date indexes
+        """
+        return self.window(date_boundaries)[1][:, self.cube.column_index[column]]
+
+
+class JobCube:
+    """
+    Count cube of the jobs indexed by (date, city, job function).
+    The first function slot holds the total number of jobs (`All Jobs`).
+
+    The counts are stored as cumulative sums along the date axis : the number of jobs published between
+    two dates is obtained with two slices and a subtraction, whatever the number of jobs.
+    A twin cube indexed by (date, canton, job function) is kept for the cantons, and the rankings of the cities
+    and cantons are indexed by `rankings`.
+
+    Only the canton cube and the `All Jobs` city counts are computed at creation. The city counts of a job function
+    are computed the first time they are requested (`city_column`), or by `fill` that the web app runs in a
+    background thread once it is built. Until then, the (job, function) entries are kept grouped by function.
+
+    Inputs:
+     - df_jobs : pd.DataFrame with the `city`, `canton` and `date` of the jobs
+     - function_matrix : FunctionMatrix of the job functions, aligned with df_jobs
+     - locations : Locations, shared dictionary of the cities and cantons
+     - ranking_k : int, number of cities held by the ranking index per function and date window
+     - lazy : bool, if False all the job functions are computed at creation
+     - axes : optional (dates, city codes) of the date and city axes, e.g. the ones of another cube, the jobs
+       outside of them not being counted. By default the dates and cities of the jobs.
+    """
+
+    def __init__(self, df_jobs, function_matrix, locations, ranking_k=25, lazy=True, axes=None):
+        # date axis - sorted so that any [begin, end] index range is a time window
+        dates = pd.Index(df_jobs['date'].unique()).sort_values() if axes is None else pd.Index(axes[0])
+        date_idx = dates.get_indexer(df_jobs['date'])
+
+        # city axis - cities having coordinates and at least one job, ordered by name
+        location_codes = locations.encode_cities(df_jobs['city'], df_jobs['canton'])
+        if axes is None:
+            city_codes = locations.sorted_cities(np.unique(location_codes[location_codes >= 0]))
+        else:
+            city_codes = np.asarray(axes[1], dtype=np.int64)
+        city_position = np.full(len(locations.df_cities) + 1, -1)  # the last entry for the unknown cities
+        city_position[city_codes] = np.arange(len(city_codes))
+        # jobs without coordinates can not be drawn
+        located = (city_position[location_codes] >= 0) & (date_idx >= 0)
+        city_idx = city_position[location_codes[located]]
+
+        self.set_axes(locations, function_matrix.functions, dates, city_codes)
+
+        # (date, city) key of the jobs
+        n_dates, n_cities, n_cantons, n_columns = len(self.dates), len(self.df_cities), len(self.cantons), \
+            len(self.columns)
+        key = np.full(len(df_jobs), -1, dtype=np.int64)
+        key[located] = date_idx[located] * n_cities + city_idx
+
+        # (date, canton, function) counts - every job function is counted in a single pass
+        canton_key = np.where(key >= 0, key // n_cities * n_cantons + self.city_canton_idx[key % n_cities], -1)
+        canton_counts = np.zeros((n_dates * n_cantons, n_columns), dtype=np.int32)
+        canton_counts[:, 0] = np.bincount(canton_key[located], minlength=n_dates * n_cantons)
+        canton_counts[:, 1:] = function_matrix.group_sum(canton_key, n_dates * n_cantons)
+        self.cum_canton = np.zeros((n_dates + 1, n_cantons, n_columns), dtype=np.int32)
+        np.cumsum(canton_counts.reshape(n_dates, n_cantons, n_columns), axis=0, out=self.cum_canton[1:])
+
+        # (date, city) counts, one cumulative array per column with a leading zero row - None until computed
+        self.cum_city = [None] * n_columns
+        self.cum_city[0] = self.cumulate(np.bincount(key[located], minlength=n_dates * n_cities))
+
+        # (date, city) keys of the (job, function) entries, grouped by function : the entries of function `f` are
+        # entry_keys[entry_ptr[f]:entry_ptr[f + 1]]
+        entry_keys = key[function_matrix.row_ids()]
+        located_entries = entry_keys >= 0
+        entry_functions = function_matrix.indices[located_entries]
+        self.entry_keys = entry_keys[located_entries][np.argsort(entry_functions, kind='stable')]
+        self.entry_ptr = np.zeros(len(self.job_functions) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entry_functions, minlength=len(self.job_functions)), out=self.entry_ptr[1:])
+        self.fill_lock = threading.Lock()
+
+        self.rankings = RankingIndex(self, k=ranking_k)
+        if not lazy:
+            self.fill()
+
+    @classmethod
+    def distinct_offers(cls, df_jobs, function_matrix, cube, lazy=True) -> 'JobCube':
+        """
+        Cube of the distinct offers on the axes of `cube` : each near-duplicate cluster of jobs (`cluster` column,
+        see dedup.py) is counted once, at its first posting
+        """
+        is_first = first_postings(df_jobs)
+        return cls(df_jobs[is_first], function_matrix.take(is_first), cube.locations, ranking_k=cube.rankings.k,
+                   lazy=lazy, axes=(cube.dates, cube.city_codes))
+
+    def set_axes(self, locations, job_functions, dates, city_codes) -> None:
+        """
+        Sets the function, date, city and canton axes of the cube, the cities being given by their codes in `locations`
+        """
+        self.locations = locations
+        self.job_functions = list(job_functions)
+        self.columns = ['All Jobs'] + self.job_functions
+        self.column_index = {column: idx for idx, column in enumerate(self.columns)}
+        self.dates = pd.Index(dates)
+
+        # city axis
+        self.city_codes = np.asarray(city_codes, dtype=np.int64)
+        self.df_cities = locations.df_cities.iloc[self.city_codes].reset_index(drop=True)
+
+        # canton axis
+        self.cantons = np.sort(self.df_cities['canton'].unique())
+        self.city_canton_idx = np.searchsorted(self.cantons, self.df_cities['canton'])
+        self.canton_naming = locations.canton_naming
+        if self.canton_naming is not None:
+            self.canton_names = self.canton_naming.set_index('canton')['Name'].reindex(self.cantons).values
+        else:
+            self.canton_names = self.cantons
+
+        # name --> index lookups of the selections of the UI (a municipality name can exist in two cantons)
+        self.city_index = {}
+        for idx, municipality in enumerate(self.df_cities['municipality']):
+            self.city_index.setdefault(municipality, []).append(idx)
+        self.canton_index = {canton: idx for idx, canton in enumerate(self.cantons)}
+
+    def to_arrays(self) -> dict:
+        """
+        Arrays of the cube, every job function being computed, from which `from_arrays` restores it
+        """
+        self.fill()
+        return {'job_functions': np.array(self.job_functions, dtype=str),
+                'dates': np.asarray(self.dates.values).astype('datetime64[ns]'),
+                'city_codes': self.city_codes, 'cum_city': np.stack(self.cum_city), 'cum_canton': self.cum_canton,
+                'ranking_k': np.array(self.rankings.k)}
+
+    @classmethod
+    def from_arrays(cls, arrays, locations) -> 'JobCube':
+        """
+        Restores a cube from the arrays of `to_arrays` and the Locations it was built with
+        """
+        cube = cls.__new__(cls)
+        cube.set_axes(locations, arrays['job_functions'].tolist(), arrays['dates'], arrays['city_codes'])
+        cube.cum_city = list(arrays['cum_city'])
+        cube.cum_canton = arrays['cum_canton']
+        cube.entry_keys, cube.entry_ptr = None, None
+        cube.fill_lock = threading.Lock()
+        cube.rankings = RankingIndex(cube, k=int(arrays['ranking_k']))
+        return cube
+
+    def cumulate(self, counts) -> np.ndarray:
+        """
+        Cumulative sums along the date axis, with a leading zero row, of flat (date, city) counts
+        """
+        cum = np.zeros((len(self.dates) + 1, len(self.df_cities)), dtype=np.int32)
+        np.cumsum(counts.reshape(len(self.dates), len(self.df_cities)), axis=0, out=cum[1:])
+        return cum
+
+    def city_column(self, col) -> np.ndarray:
+        """
+        Cumulative (date, city) counts of a column index, computed the first time they are requested
+        """
+        cum = self.cum_city[col]
+        if cum is not None:
+            return cum
+        with self.fill_lock:
+            if self.cum_city[col] is None:
+                keys = self.entry_keys[self.entry_ptr[col - 1]:self.entry_ptr[col]]
+                self.cum_city[col] = self.cumulate(np.bincount(keys, minlength=len(self.dates) * len(self.df_cities)))
+                if all(cum is not None for cum in self.cum_city):
+                    self.entry_keys = None  # every function is computed, the entries are no longer needed
+            return self.cum_city[col]
+
+    def fill(self) -> None:
+        """
+        Computes the city counts of all the job functions not requested yet
+        """
+        for col in range(1, len(self.columns)):
+            self.city_column(col)
+
+    @property
+    def filled(self) -> bool:
+        return self.entry_keys is None
+
+    def city_counts(self, date_boundaries, columns=None) -> np.ndarray:
+        """
+        Number of jobs per city and function (all the columns by default) between two date indexes (both included)
+        """
+        begin, end = date_boundaries[0], date_boundaries[1] + 1
+        cols = [self.column_index[column] for column in (self.columns if columns is None else columns)]
+        return np.stack([cum[end] - cum[begin] for cum in map(self.city_column, cols)], axis=1)
+
+    def canton_counts(self, date_boundaries) -> np.ndarray:
+        """
+        Number of jobs per canton and function between two date indexes (both included)
+        """
+        return self.cum_canton[date_boundaries[1] + 1] - self.cum_canton[date_boundaries[0]]
+
+    def column_counts(self, date_boundaries, column) -> [np.ndarray, np.ndarray]:
+        """
+        Number of jobs of a single function (or `All Jobs`) per city and per canton between two date indexes
+        """
+        begin, end, col = date_boundaries[0], date_boundaries[1] + 1, self.column_index[column]
+        cum_city = self.city_column(col)
+        return cum_city[end] - cum_city[begin], self.cum_canton[end, :, col] - self.cum_canton[begin, :, col]
+
+    def encode_jobs(self, df_jobs) -> np.ndarray:
+        """
+        (date, city) keys of jobs on the axes of the cube, -1 for the jobs whose date or city is not in the cube
+        """
+        date_idx = pd.DatetimeIndex(pd.to_datetime(self.dates)).get_indexer(pd.to_datetime(df_jobs['date']))
+        city_position = np.full(len(self.locations.df_cities) + 1, -1)  # the last entry for the unknown cities
+        city_position[self.city_codes] = np.arange(len(self.city_codes))
+        city_idx = city_position[self.locations.encode_cities(df_jobs['city'], df_jobs['canton'])]
+        return np.where((date_idx >= 0) & (city_idx >= 0), date_idx * len(self.df_cities) + city_idx, -1)
+
+    def key_counts(self, keys, date_boundaries) -> [np.ndarray, np.ndarray]:
+        """
+        Number of jobs per city and per canton between two date indexes, the jobs being given by their (date, city)
+        keys (see `encode_jobs`)
+        """
+        n_cities = len(self.df_cities)
+        keys = keys[(keys >= date_boundaries[0] * n_cities) & (keys < (date_boundaries[1] + 1) * n_cities)]
+        city_counts = np.bincount(keys % n_cities, minlength=n_cities).astype(np.int32)
+        canton_counts = np.bincount(self.city_canton_idx, weights=city_counts, minlength=len(self.cantons))
+        return city_counts, canton_counts.astype(np.int32)
+
+    def city_function_counts(self, date_boundaries, city_idx) -> pd.Series:
+        """
+        Number of jobs per function in a city (index on the city axis) between two date indexes
+        """
+        begin, end = date_boundaries[0], date_boundaries[1] + 1
+        entry_keys = self.entry_keys
+        if entry_keys is None:
+            counts = [cum[end, city_idx] - cum[begin, city_idx] for cum in self.cum_city[1:]]
+        else:  # the functions are not all computed : the entries of the city are counted
+            n_cities = len(self.df_cities)
+            in_city = np.flatnonzero((entry_keys % n_cities == city_idx) & (entry_keys >= begin * n_cities) &
+                                     (entry_keys < end * n_cities))
+            counts = np.bincount(np.searchsorted(self.entry_ptr, in_city, side='right') - 1,
+                                 minlength=len(self.job_functions)).astype(np.int32)
+        return pd.Series(counts, index=self.job_functions)
+
+    def canton_function_counts(self, date_boundaries, canton_idx) -> pd.Series:
+        """
+        Number of jobs per function in a canton (index on the canton axis) between two date indexes
+        """
+        begin, end = date_boundaries[0], date_boundaries[1] + 1
+        return pd.Series(self.cum_canton[end, canton_idx, 1:] - self.cum_canton[begin, canton_idx, 1:],
+                         index=self.job_functions)
+
+    def function_counts(self, date_boundaries) -> pd.Series:
+        """
+        Number of jobs per function in the whole country between two date indexes (both included)
+        """
+        return pd.Series(self.canton_counts(date_boundaries)[:, 1:].sum(axis=0), index=self.job_functions)
+
+    def city_canton_frames(self, date_boundaries, columns=None) -> [pd.DataFrame, pd.DataFrame]:
+        """
+        Creates the city and canton dataframes consumed by the charts, in the layout of `city_canton_jobs`.
+        `columns` restricts the counts to some columns, `All Jobs` first, all of them by default.
+        """
+        columns = self.columns if columns is None else list(columns)
+        df_count_city = pd.DataFrame(self.city_counts(date_boundaries, columns), columns=columns)
+        df_count_city.insert(0, 'canton', self.df_cities['canton'].values)
+        df_count_city.insert(2, 'municipality', self.df_cities['municipality'].values)
+        df_count_city.insert(3, 'lat', self.df_cities['lat'].values)
+        df_count_city.insert(4, 'lon', self.df_cities['lon'].values)
+
+        canton_counts = self.canton_counts(date_boundaries)[:, [self.column_index[column] for column in columns]]
+        df_count_canton = pd.DataFrame(canton_counts, columns=columns)
+        df_count_canton.insert(0, 'canton', self.cantons)
+        if self.canton_naming is not None:
+            df_count_canton = df_count_canton.merge(self.canton_naming, left_on=['canton'],
+                                                    right_on=['canton'])
+
+        return df_count_city, df_count_canton
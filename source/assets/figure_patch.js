@@ -0,0 +1,49 @@
+/*
+ * Clientside merge of the figure deltas sent by `ChartsManager.update_map_job_function`.
+ * The figures (and the canton geojson) are sent once with the layout, afterwards only the
+ * changed trace properties travel over the network.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    figures: {
+        patch: function (delta, fig_map, fig_pie, fig_Canton_bar, fig_city_bar) {
+            var no_update = window.dash_clientside.no_update;
+            var graphs = ['Swiss-Employment-Map', 'fun-pie', 'Canton_bar', 'city_bar'];
+            var figures = [fig_map, fig_pie, fig_Canton_bar, fig_city_bar];
+
+            function isObject(value) {
+                return value !== null && typeof value === 'object' && !Array.isArray(value);
+            }
+
+            // arrays are replaced, objects are merged - returns a new object
+            function merge(target, update) {
+                var merged = Object.assign({}, target);
+                Object.keys(update).forEach(function (key) {
+                    if (isObject(update[key]) && isObject(merged[key])) {
+                        merged[key] = merge(merged[key], update[key]);
+                    } else {
+                        merged[key] = update[key];
+                    }
+                });
+                return merged;
+            }
+
+            if (!delta) {
+                return figures.map(function () { return no_update; });
+            }
+            return graphs.map(function (graph_id, i) {
+                var updates = delta[graph_id];
+                if (!updates) {
+                    return no_update;
+                }
+                var figure = Object.assign({}, figures[i]);
+                figure.data = figure.data.slice();
+                updates.forEach(function (trace_update) {
+                    trace_update.traces.forEach(function (trace) {
+                        figure.data[trace] = merge(figure.data[trace], trace_update.update);
+                    });
+                });
+                return figure;
+            });
+        }
+    }
+});
@@ -1,67 +1,136 @@
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
 import dash
-from dash.dependencies import Input, Output
+import flask
+from dash.dependencies import Input, Output, State, ClientsideFunction
 import dash_core_components as dcc
 import dash_html_components as html
 import pandas as pd
+from source.aggregation import JobCube, top_k
+from source.figure_delta import FigureDelta
+from source.payload_cache import PayloadCache
+from source.serving import ResponseCache
+from source.metrics import Metrics, Profiler
+from source.search import query_terms
+from source.timeseries import rolling_mean
+
+logger = logging.getLogger(__name__)
 
 
 class ChartsManager:
     """
     This class manages the web app.
     An instance will recieve teh data and the plots. The HTML layout is defined at its creation.
-    The instance stores the current states of each chart (map, pie and two bar charts) dropdown menus and buttons.
-    When one elements is activated/clicked it modifies the aspect of others. Multiple elements combinations are
+    The current state of each session (job function, dates, map mode, `Staffing and Recruiting` button, selected
+    area) is stored client side in the `view-state` dcc.Store, the instance itself is never modified by the
+    callbacks. When one elements is activated/clicked it modifies the aspect of others. Multiple elements combinations are
     possibles to modify the display of others.
+
+    With `delta_updates` (default), the callbacks only send the modified trace properties to the browser where
+    they are merged into the figures sent with the layout. Otherwise the four whole figures are sent back.
+
+    The size of the figure updates of each interaction is recorded : the last `payload_log_size` interactions and
+    their totals per trigger are served at `/_payload-sizes`.
+
+    The trace updates of a view are computed once and kept in a PayloadCache bounded by `cache_entries` and
+    `cache_bytes`. Its counters are served at `/_payload-cache`.
+    The layout and callback responses are compressed and cached by a ResponseCache (see serving.py), the ETag of the
+    layout being derived from `dataset_version`. Its counters are served at `/_response-cache`.
+    The wall time of the phases of the callbacks, their payload sizes and the cache hits are served per trigger at
+    `/metrics` (Prometheus text format, see metrics.py). These four routes are only served with `diagnostics`.
+    With `profiling`, `/_profile?arm=<n>` profiles the next `n` callback requests (or the ones sent with an
+    `X-Profile` header) and `/_profile` shows the captures.
+    The city bar chart shows the `n_top_cities` cities with the most jobs.
+
+    The counts are read from `job_cube`, whose job functions are computed on demand : once the app is built, a
+    background thread computes the most common views and the remaining job functions.
+    The figures are go.Figure or figure dicts. The slider marks and dropdown options of the layout are computed from
+    the cube unless given by `layout_options` (see `layout_options` and snapshot.py).
+
+    With a `search_index` (see search.py), the search box restricts the map and the bar charts to the jobs whose
+    description contains all the words of the query.
+    With a `dedup_cube` (JobCube of the distinct offers, see JobCube.distinct_offers), the `Distinct offers` button
+    counts each near-duplicate cluster of postings once. The search results count every posting.
+    With a `timeseries` (see timeseries.py), a line chart shows the daily jobs of the selected function and area
+    with their 7 day average, the selected dates being highlighted, and the job functions trending at the end of the
+    selected dates are listed below it. They are updated from the `view-state` store.
     """
 
-    def __init__(self, df_jobs, city_coordinates,canton_naming,
+    def __init__(self, job_cube,
                  fig_map, fig_pie, fig_Canton_bar, fig_city_bar,
-                 selected_button_style, unselected_button_style):
-
-        self.df_jobs = df_jobs #raw data
-        self.city_coordinates = city_coordinates
-        self.df_canton_names = canton_naming
-        self.job_function = 'All Jobs'
+                 selected_button_style, unselected_button_style, delta_updates=True,
+                 cache_entries=512, cache_bytes=32 * 2 ** 20, n_top_cities=10, layout_options=None,
+                 dataset_version=None, profiling=False, search_index=None, dedup_cube=None, timeseries=None,
+                 payload_log_size=1000, diagnostics=False):
+
+        # aggregated counts per date, city and job function - the raw data is not kept
+        # every attribute below is read-only once the app is built : the callbacks are pure functions of their
+        # inputs and of the `view-state` store so that concurrent sessions/threads/workers do not interfere
+        # new data is served by restarting the app : its dataset version changes the ETag of the layout
+        self.n_top_cities = n_top_cities
+        self.cube = job_cube
+        # counts of the distinct offers, on the axes of the cube
+        self.dedup_cube = dedup_cube
+        # daily counts of the jobs, over all the scrapped days
+        self.timeseries = timeseries
+
+        # full-text search of the job descriptions, the documents being located on the axes of the cube
+        self.search_index = search_index
+        self.search_keys = None if search_index is None else self.cube.encode_jobs(search_index.df_docs)
 
         # date filtering & date formatting
-        self.unique_date = df_jobs['date'].unique()
-        unique_date_idx = list(range(len(self.unique_date)))
-        marks_slider = {idx: date_.strftime('%d/%m') for idx, date_ in zip(unique_date_idx, self.unique_date)}
-        beggin_date = unique_date_idx[0]
-        end_date = unique_date_idx[-1]
+        beggin_date = 0
+        end_date = len(self.cube.dates) - 1
+
+        # per session state, stored client side
+        self.initial_view_state = {'job_function': 'All Jobs', 'date_range': [beggin_date, end_date],
+                                   'map_mode': 'cities', 'staff_and_recr': True, 'canton': None, 'city': None,
+                                   'query': None, 'dedup': False}
 
-        # generate filtered city and canton dataframes
-        self.df_count_city, self.df_count_canton = self.date_filtering((beggin_date, end_date))
+        # slider marks and dropdown options
+        layout_options = layout_options or self.layout_options(self.cube)
 
-        self.df_city_color = self.df_count_city.municipality.to_frame()
-        self.df_city_color['color'] = 'rgb(20,110,220)'
+        self.city_color = 'rgb(20,110,220)'
         self.selected_city_color = 'rgb(255,0,0)'
+        self.trend_color = '#dc1e14'
 
-        self.df_job_function = df_jobs[df_jobs.columns[10:]].sum()
+        # charts - figures as sent with the layout
+        self.figures = {graph_id: figure if isinstance(figure, dict) else figure.to_plotly_json()
+                        for graph_id, figure in zip(['Swiss-Employment-Map', 'fun-pie', 'Canton_bar', 'city_bar'],
+                                                    [fig_map, fig_pie, fig_Canton_bar, fig_city_bar])}
 
-        self.scale_bubble = 800 / self.df_count_city[self.job_function].max()
+        # figure updates
+        self.delta_updates = delta_updates
 
-        # charts become attribute
-        self.fig_map = fig_map
-        self.fig_pie = fig_pie
-        self.fig_Canton_bar = fig_Canton_bar
-        self.fig_city_bar = fig_city_bar
+        # timings, payload sizes and cache hits per trigger
+        # the inputs of the callbacks are added by the ResponseCache, the line chart is labelled `time-series`
+        self.metrics = Metrics(triggers=['time-series'])
+        self.profiler = Profiler() if profiling else None
+        # (trigger, bytes of figure updates) of the last interactions
+        self.payload_log = deque(maxlen=payload_log_size)
 
+        # trace updates of the views, shared by all the sessions
+        self.payload_cache = PayloadCache(cache_entries, cache_bytes, sizeof=lambda delta: len(delta.to_json()))
 
         self.selected_button_style = selected_button_style
         self.unselected_button_style = unselected_button_style
-        self.btn_canton, self.btn_both, self.btn_staff_off = {}, {}, {}
-        self.btn_staff_on, self.btn_city = selected_button_style, selected_button_style
 
-        self.staff_and_recr = True
+        # line chart and trending job functions of the initial view
+        fig_time_series, trending = self.compute_time_series(self.initial_view_state) if timeseries is not None \
+            else ({}, [])
 
         self.app = dash.Dash(__name__, external_stylesheets=['https://codepen.io/chriddyp/pen/bWLwgP.css'], )
         self.app.title = 'SwissJobMap'
-        canton_dropdown_labels = self.df_count_canton.canton + ' - ' + self.df_count_canton.Name
-        job_functions = self.df_count_city.columns[5:]
 
 
         self.app.layout = html.Div(children=[
+            # trace updates sent by the main callback, merged into the figures by the browser
+            dcc.Store(id='figure-delta'),
+            # view state of the session, sent back to the main callback with each interaction
+            dcc.Store(id='view-state', data=self.initial_view_state),
             html.H1(children='Swiss Employment Map', style={'margin-left': 10, 'margin-bottom': 10}),
             html.Div(style={'background-color': '#dc1e14', 'height': 2, 'margin-bottom': 20}),
             html.H6(children=(
@@ -89,14 +158,22 @@ class ChartsManager:
                             html.Button('Cities', id='map-c', style=self.selected_button_style),
                             html.Button('Cantons', id='map-C', style=self.unselected_button_style),
                             html.Button('Both', id='map-b', style=self.unselected_button_style),
+                            html.Button('All postings', id='dedup-all', style=self.selected_button_style,
+                                        disabled=dedup_cube is None),
+                            html.Button('Distinct offers', id='dedup-once', style=self.unselected_button_style,
+                                        disabled=dedup_cube is None),
+                            dcc.Input(id='job-search', type='search', debounce=True,
+                                      placeholder='Search the job descriptions ...',
+                                      disabled=search_index is None,
+                                      style={'width': '40%', 'margin-left': 20}),
                         ]),
-                        dcc.Graph(id='Swiss-Employment-Map', figure=self.fig_map),
+                        dcc.Graph(id='Swiss-Employment-Map', figure=self.figures['Swiss-Employment-Map']),
                         html.Div([dcc.RangeSlider(id='DateSlider',
-                                                  min=unique_date_idx[0],
-                                                  max=unique_date_idx[-1],
+                                                  min=beggin_date,
+                                                  max=end_date,
                                                   value=[beggin_date, end_date],
                                                   step=None,
-                                                  marks=marks_slider)],
+                                                  marks=layout_options['marks'])],
                                  style={'margin-top': 20})
 
                     ],
@@ -106,9 +183,7 @@ class ChartsManager:
                     html.Div([
                         html.H3(children="Job Functions"),
                         dcc.Dropdown(id='function-DD',
-                                     options=[
-                                         {'label': jf + ' - ' + str(self.df_count_city[jf].sum()) + ' jobs', 'value': jf}
-                                         for jf in job_functions],
+                                     options=layout_options['job_functions'],
                                      placeholder='Select a job function ...'),
 
                         html.Div([html.H6('Staffing and Recruiting', style={'display': 'inline-block',
@@ -122,7 +197,7 @@ class ChartsManager:
                             html.H4(children='Switzerland - All Job Functions', id='dynamic-title',
                                     style={'margin-top': 30, 'margin-bottom': 30, 'text-align': 'center',
                                            'font-size': 'xx-large'}),
-                            dcc.Graph(id='fun-pie', figure=self.fig_pie,
+                            dcc.Graph(id='fun-pie', figure=self.figures['fun-pie'],
                                       clickData={'points': [{'label': 'All Jobs'}]})],
                             style={'vertical-align': 'bottom'}),
 
@@ -132,10 +207,9 @@ class ChartsManager:
                     html.Div([
                         html.Div([
                             html.H4(children='Cantons'),
-                            dcc.Dropdown(id='Canton_DD', options=[{'label': c_lab, 'value': C} for C, c_lab in
-                                                                  zip(self.df_count_canton.canton, canton_dropdown_labels)],
+                            dcc.Dropdown(id='Canton_DD', options=layout_options['cantons'],
                                          placeholder='Select a canton ...'),
-                            dcc.Graph(id='Canton_bar', figure=self.fig_Canton_bar),
+                            dcc.Graph(id='Canton_bar', figure=self.figures['Canton_bar']),
                             html.Div('The bars represent the cantons ranked by number of jobs of a certain function '
                                      'in decreasing order.', style={'font-size': 'large', 'font-family': 'avenir'})],
                             style={'width': '65%', 'display': 'inline-block', 'margin-left': 10, 'margin-right': 10}),
@@ -143,14 +217,22 @@ class ChartsManager:
                         html.Div([
                             html.H4(children='Cities'),
                             dcc.Dropdown(id='city_DD',
-                                         options=[{'label': c, 'value': c} for c in self.df_count_city.municipality],
+                                         options=layout_options['cities'],
                                          placeholder='Select a city ...'),
-                            dcc.Graph(id='city_bar', figure=self.fig_city_bar),
-                            html.Div('The chart displays the ten most represented cities for a particular job'
-                                     'function.', style={'font-size': 'large', 'font-family': 'avenir'})],
+                            dcc.Graph(id='city_bar', figure=self.figures['city_bar']),
+                            html.Div('The chart displays the {} most represented cities for a particular job'
+                                     'function.'.format(n_top_cities), style={'font-size': 'large', 'font-family': 'avenir'})],
                             style={'display': 'inline-block', 'width': '33%', 'margin-left': 10}),
                     ]),
 
+                    html.Div([
+                        html.H4(children='Evolution'),
+                        dcc.Graph(id='time-series', figure=fig_time_series),
+                        html.Div(id='trending-functions', children=trending,
+                                 style={'font-size': 'large', 'font-family': 'avenir'})],
+                        style={'margin-left': 10, 'margin-right': 10, 'margin-top': 20,
+                               'display': 'block' if timeseries is not None else 'none'}),
+
                     html.Footer(children=['Made by Jean-Baptiste PROST - Fall 2020', html.Br(),
                                           html.A([html.Img(src='./assets/GitHub-Logo.png',
                                                            style={'height': '2%', 'width': '2%', 'margin-right': 2})],
@@ -162,24 +244,41 @@ class ChartsManager:
                 ])
             ])
         ])
-        del canton_dropdown_labels, job_functions
-
-        self.app.callback([Output('Swiss-Employment-Map', 'figure'),
-                           Output('fun-pie', 'figure'),
-                           Output('Canton_bar', 'figure'),
-                           Output('city_bar', 'figure'),
-                           Output('map-c', 'style'), Output('map-C', 'style'), Output('map-b', 'style'),
+        del layout_options
+
+        figure_outputs = [Output('Swiss-Employment-Map', 'figure'), Output('fun-pie', 'figure'),
+                          Output('Canton_bar', 'figure'), Output('city_bar', 'figure')]
+        if self.delta_updates:
+            # the figures are patched in the browser
+            self.app.clientside_callback(ClientsideFunction(namespace='figures', function_name='patch'),
+                                         figure_outputs,
+                                         [Input('figure-delta', 'data')],
+                                         [State('Swiss-Employment-Map', 'figure'), State('fun-pie', 'figure'),
+                                          State('Canton_bar', 'figure'), State('city_bar', 'figure')])
+            figure_outputs = [Output('figure-delta', 'data')]
+
+        self.app.callback(figure_outputs +
+                          [Output('map-c', 'style'), Output('map-C', 'style'), Output('map-b', 'style'),
                            Output('staff-on', 'style'), Output('staff-off', 'style'),
-                           Output('dynamic-title', 'children')],
+                           Output('dedup-all', 'style'), Output('dedup-once', 'style'),
+                           Output('dynamic-title', 'children'),
+                           Output('view-state', 'data')],
                           [Input('map-c', 'n_clicks'), Input('map-C', 'n_clicks'), Input('map-b', 'n_clicks'),
                            Input('function-DD', 'value'), Input('fun-pie', 'clickData'),
                            Input('Canton_bar', 'clickData'), Input('Canton_DD', 'value'),
                            Input('city_bar', 'clickData'), Input('city_DD', 'value'),
                            Input('staff-on', 'n_clicks'), Input('staff-off', 'n_clicks'),
+                           Input('dedup-all', 'n_clicks'), Input('dedup-once', 'n_clicks'),
                            Input('Swiss-Employment-Map', 'clickData'),
-                           Input('DateSlider', 'value')],
+                           Input('DateSlider', 'value'), Input('job-search', 'value')],
+                          [State('view-state', 'data')],
                           prevent_initial_call=True)(self.update_map_job_function)
 
+        if self.timeseries is not None:
+            self.app.callback([Output('time-series', 'figure'), Output('trending-functions', 'children')],
+                              [Input('view-state', 'data')],
+                              prevent_initial_call=True)(self.update_time_series)
+
         self.app.callback(Output('function-DD', 'value'),
                           Input('fun-pie', 'clickData'),
                           prevent_initial_call=True)(self.update_job_function_dropdown_value)
@@ -191,210 +290,462 @@ class ChartsManager:
         self.app.callback(Output('city_DD', 'value'),
                           Input('city_bar', 'clickData'),
                           prevent_initial_call=True)(self.update_city_dropdown_value)
+        self.check_layout_ids()
+
+        # layout and callback responses, compressed once
+        self.response_cache = ResponseCache(self.app, dataset_version, metrics=self.metrics, profiler=self.profiler)
+        self.metrics.add_gauges('payload_cache', self.payload_cache.stats)
+        self.metrics.add_gauges('response_cache', self.response_cache.stats)
+        if diagnostics:
+            # the metrics and the cache internals are not served to the visitors of a default deployment
+            self.app.server.add_url_rule('/_payload-cache', 'payload-cache',
+                                         lambda: flask.jsonify(self.payload_cache.stats()))
+            self.app.server.add_url_rule('/_payload-sizes', 'payload-sizes',
+                                         lambda: flask.jsonify(self.payload_sizes()))
+            self.app.server.add_url_rule('/_response-cache', 'response-cache',
+                                         lambda: flask.jsonify(self.response_cache.stats()))
+            self.app.server.add_url_rule('/metrics', 'metrics', lambda: flask.Response(
+                self.metrics.export(), mimetype='text/plain; version=0.0.4'))
+        if self.profiler is not None:
+            self.app.server.add_url_rule('/_profile', 'profile', self.serve_profile)
+        # the common views and the job functions are computed in the background as soon as the app is built : each
+        # gunicorn worker imports the app (no --preload), and thus runs its own thread
+        self.start_background_fill()
+
+    def check_layout_ids(self) -> None:
+        """
+        Raises a ValueError if a component of the callbacks (output, input or state) is missing from the layout
+        """
+        callback_ids = set()
+        for callback in self.app._callback_list:
+            # multiple outputs are serialized as '..id.prop...id.prop..'
+            callback_ids.update(output.rsplit('.', 1)[0] for output in callback['output'].strip('.').split('...'))
+            callback_ids.update(dependency['id'] for dependency in callback['inputs'] + callback['state'])
+        missing = sorted(callback_ids - set(self.app.layout))
+        if missing:
+            raise ValueError('Components of the callbacks missing from the layout : ' + ', '.join(missing))
 
     def update_map_job_function(self, click_cities, click_cantons, click_both,
                                 job_function_dd, job_function_pie,
                                 Canton_bars, Canton_DD,
                                 city_bars, city_DD,
                                 staff_on, staff_off,
+                                dedup_all, dedup_once,
                                 map_click,
-                                date_boundaries):
+                                date_boundaries,
+                                search_query,
+                                view_state):
+        """
+        Updates the scattermapbox and the choroplethmapbox, the pie and the bar charts.
+        The previous view of the session is read from `view_state` and the new one is returned with the figures.
+        """
+        callb_id = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
+        with self.metrics.trigger(callb_id), self.metrics.phase('callback'):
+            return self.update_view(callb_id, job_function_dd, job_function_pie, Canton_bars, Canton_DD,
+                                    city_bars, city_DD, map_click, date_boundaries, search_query, view_state)
+
+    def update_view(self, callb_id, job_function_dd, job_function_pie, Canton_bars, Canton_DD, city_bars, city_DD,
+                    map_click, date_boundaries, search_query, view_state) -> list:
         """
-        Updates the scattermapbox and the choroplethmapbox
+        Outputs of `update_map_job_function` triggered by `callb_id`
         """
-        # buttons - Change map visualization
+        state = dict(self.initial_view_state, **(view_state or {}))
+        state['date_range'] = list(date_boundaries or state['date_range'])
+        previous_city = state['city']
 
-        job_function_triggered, date_filtering = False, False
-        canton, city = None, None
-        dynamic_title = 'Switzerland'
-        ctx = dash.callback_context
-        callb_id = ctx.triggered[0]['prop_id'].split('.')[0]
+        delta = FigureDelta()
+        map_updated, functions_updated, bubbles_updated, pie_updated = False, False, False, False
 
         # button --> map styling
         if callb_id.startswith('m'):
             if callb_id.endswith('C'):  # cantons
-                self.fig_map.update_traces(visible=True, selector=dict(type="choroplethmapbox"), overwrite=True)
-                self.fig_map.update_traces(visible=False, selector=dict(type="scattermapbox"), overwrite=True)
-                self.btn_canton = self.selected_button_style
-                self.btn_both = self.unselected_button_style
-                self.btn_city = self.unselected_button_style
+                state['map_mode'] = 'cantons'
             elif callb_id.endswith('c'):  # cities
-                self.fig_map.update_traces(visible=False, selector=dict(type="choroplethmapbox"), overwrite=True)
-                self.fig_map.update_traces(visible=True, selector=dict(type="scattermapbox"), overwrite=True)
-                self.btn_city = self.selected_button_style
-                self.btn_canton = self.unselected_button_style
-                self.btn_both = self.unselected_button_style
+                state['map_mode'] = 'cities'
             elif callb_id.endswith('b'):  # both
-                self.fig_map.update_traces(visible=True, selector=dict(type="choroplethmapbox"), overwrite=True)
-                self.fig_map.update_traces(visible=True, selector=dict(type="scattermapbox"), overwrite=True)
-                self.btn_both = self.selected_button_style
-                self.btn_canton = self.unselected_button_style
-                self.btn_city = self.unselected_button_style
+                state['map_mode'] = 'both'
+            map_updated = True
 
         # buttons for Staff and Recruiting
         elif callb_id.startswith('s'):
-            if callb_id.endswith('f'):  # off
-                self.staff_and_recr = False
-                self.btn_staff_off = self.selected_button_style
-                self.btn_staff_on = self.unselected_button_style
-            else:  # on
-                self.staff_and_recr = True
-                self.btn_staff_on = self.selected_button_style
-                self.btn_staff_off = self.unselected_button_style
-            self.pie_update(canton, city)
+            state['staff_and_recr'] = not callb_id.endswith('f')  # off
+            pie_updated = True
+
+        # buttons for the postings counted : all of them or each cluster of near-duplicates once
+        elif callb_id.startswith('d'):
+            state['dedup'] = callb_id.endswith('once') and self.dedup_cube is not None
+            functions_updated, pie_updated = True, True
 
         # Job_function
         elif callb_id.startswith('f'):
-            job_function_triggered = True  # for latter plotting
             if callb_id.endswith('D'):  # dropdown menu for job functions
-                self.job_function = job_function_dd
+                state['job_function'] = job_function_dd or 'All Jobs'
             else:  # pie chart
-                self.job_function = job_function_pie['points'][0]['label']
+                state['job_function'] = job_function_pie['points'][0]['label']
+            functions_updated = True
 
         # Canton
         elif callb_id.startswith('C'):
             if callb_id.endswith('r'):
-                canton = Canton_bars['points'][0]['label']
+                state['canton'], state['city'] = Canton_bars['points'][0]['label'], None
             elif Canton_DD is not None:  # dropdown menu
-                canton = Canton_DD
-
-            self.fig_map.update_traces(visible=True, selector=dict(type="choroplethmapbox"), overwrite=True)
-            self.fig_map.update_traces(visible=False, selector=dict(type="scattermapbox"), overwrite=True)
-            self.btn_canton = self.selected_button_style
-            self.btn_both = self.unselected_button_style
-            self.btn_city = self.unselected_button_style
+                state['canton'], state['city'] = Canton_DD, None
+            state['map_mode'] = 'cantons'
+            map_updated, pie_updated = True, True
 
         # city
         elif callb_id.startswith('c'):
             if callb_id.endswith('r'):
-                city = city_bars['points'][0]['label']
+                state['canton'], state['city'] = None, city_bars['points'][0]['label']
             elif city_DD is not None:  # dropdown menu
-                city = city_DD
-
-            # df_city_tmp = self.df_count_city[self.df_count_city.municipality == city]
-            self.df_city_color.at[self.df_city_color.municipality == city, 'color'] = 'rgb(255,0,0)'
-            self.fig_map.update_traces(visible=False, selector=dict(type="choroplethmapbox"), overwrite=True)
-            self.fig_map.update_traces(visible=True, selector=dict(type="scattermapbox"), overwrite=True)
-            self.btn_city = self.selected_button_style
-            self.btn_canton = self.unselected_button_style
-            self.btn_both = self.unselected_button_style
+                state['canton'], state['city'] = None, city_DD
+            state['map_mode'] = 'cities'
+            map_updated, pie_updated = True, True
 
         # click on the map
         elif callb_id.startswith('S'):
             if map_click['points'][0]['curveNumber'] == 1:  # cities
-                city = map_click['points'][0]['text'].split('<', 1)[0]
+                state['canton'], state['city'] = None, map_click['points'][0]['text'].split('<', 1)[0]
             else:
-                canton = map_click['points'][0]['location']
+                state['canton'], state['city'] = map_click['points'][0]['location'], None
+            pie_updated = True
 
         # date filtering
         elif callb_id.startswith('D'):
-            self.df_count_city, self.df_count_canton = self.date_filtering(date_boundaries)
-            date_filtering = True
-
-        if city is not None:  # locate the selected city with a red point/dot
-            # city is too small to be seen
-            if self.df_count_city.loc[self.df_count_city.municipality == city, self.job_function].values[0] < 50:
-                # extract the original nbr of jobs
-                nb_jobs_tmp = self.df_count_city.loc[self.df_count_city.municipality == city, self.job_function].values[
-                    0]
-                # set arbitrary size
-                self.df_count_city.at[
-                    self.df_count_city.municipality == city, self.job_function] = 50 / self.scale_bubble
-                self.fig_map.update_traces(marker={'color': self.df_city_color['color'],
-                                                   'size': self.df_count_city[self.job_function] * self.scale_bubble,
-                                                   'sizemode': 'area'},
-                                           selector={'type': 'scattermapbox'},
-                                           overwrite=True)
-                # re-set to  the original nbr of jobs
-                self.df_count_city.at[self.df_count_city.municipality == city, self.job_function] = nb_jobs_tmp
-            else:
-                self.fig_map.update_traces(marker={'color': self.df_city_color['color'],
-                                                   'size': self.df_count_city[self.job_function],
-                                                   'sizemode': 'area'},
-                                           selector={'type': 'scattermapbox'},
-                                           overwrite=True)
-            # re-set the city color to standard
-            self.df_city_color.at[self.df_city_color.municipality == city, 'color'] = 'rgb(20,110,220)'
-            self.pie_update(canton, city)
-
-            dynamic_title = 'City of ' + city
-
-        if canton is not None:  # locate the canton by drawing borders in red
-            self.pie_update(canton, city)
-            dynamic_title = 'Canton of ' + canton
-
-        if job_function_triggered or date_filtering:  # change bar plots and maps by filtering job by function or date
-            if self.job_function == 'All Jobs':
-                dynamic_title += ' -  All Job Functions'
-                self.scale_bubble = 1
-            else:
-                dynamic_title += ' - ' + self.job_function
-                self.scale_bubble = 500 / self.df_count_city[self.job_function].max()
-
-            self.fig_map.update_traces(lon=self.df_count_city['lon'], lat=self.df_count_city['lat'],
-                                       marker_size=self.df_count_city[self.job_function] * self.scale_bubble,
-                                       text=self.df_count_city['municipality'] + '<br>' + self.df_count_city[
-                                           self.job_function].astype(str) + '<extra></extra>',
-                                       selector=dict(mode='markers'), overwrite=True)
-
-            self.fig_map.update_traces(colorbar_title=self.job_function,
-                                       text=self.df_count_canton['canton'],
-                                       z=self.df_count_canton[self.job_function],
-                                       selector=dict(type="choroplethmapbox"), overwrite=True)
-
-            df_canton = self.df_count_canton[['canton', self.job_function]].sort_values(self.job_function,
-                                                                                        ascending=False)
-            df_top_10_city = self.df_count_city[['municipality', self.job_function]].sort_values(self.job_function,
-                                                                                                 ascending=False)[:10]
-
-            self.fig_Canton_bar.update_traces(y=df_canton[self.job_function], x=df_canton['canton'])
-            self.fig_city_bar.update_traces(y=df_top_10_city[self.job_function], x=df_top_10_city['municipality'])
-        #else:
-        #    dynamic_title += ' -  All Jobs'
-        if date_filtering:
-            self.pie_update(None, None)
-
-        return self.fig_map, self.fig_pie, self.fig_Canton_bar, self.fig_city_bar, \
-               self.btn_city, self.btn_canton, self.btn_both, self.btn_staff_on, self.btn_staff_off, \
-               dynamic_title
-
-    def pie_update(self, canton, city):
+            functions_updated, pie_updated = True, True
+
+        # search box - the query is normalized so that equivalent queries share their cached views
+        elif callb_id.startswith('j'):
+            if self.search_index is not None:
+                state['query'] = ' '.join(query_terms(search_query)) or None
+            functions_updated = True
+
+        # the selected city is drawn in red, the bubbles are redrawn when it changes
+        bubbles_updated = functions_updated or state['city'] != previous_city
+
+        updates = [(self.map_traces_update, map_updated), (self.bubbles_update, bubbles_updated),
+                   (self.functions_update, functions_updated), (self.pie_update, pie_updated)]
+        for update, updated in updates:
+            # whole figures : the view is rebuilt from the state on top of the initial figures
+            if updated or not self.delta_updates:
+                with self.metrics.phase(update.__name__):
+                    update(delta, state)
+        self.record_payload(callb_id, delta)
+
+        if self.delta_updates:
+            figures = [delta.updates]
+        else:
+            with self.metrics.phase('apply_figures'):
+                figures = [delta.apply(graph_id, figure) for graph_id, figure in self.figures.items()]
+
+        return figures + self.button_styles(state) + [self.dynamic_title(state), state]
+
+    @staticmethod
+    def layout_options(job_cube) -> dict:
+        """
+        Slider marks and dropdown options of the layout, the counts being the ones of the whole date range
+        """
+        date_range = (0, len(job_cube.dates) - 1)
+        # city and canton dataframes of the layout - the job functions are not needed
+        df_count_city, df_count_canton = job_cube.city_canton_frames(date_range, columns=['All Jobs'])
+        function_counts = job_cube.function_counts(date_range)
+        canton_dropdown_labels = df_count_canton.canton + ' - ' + df_count_canton.Name
+
+        return {'marks': {idx: date_.strftime('%d/%m') for idx, date_ in enumerate(job_cube.dates)},
+                'job_functions': [{'label': jf + ' - ' + str(function_counts[jf]) + ' jobs', 'value': jf}
+                                  for jf in job_cube.job_functions],
+                'cantons': [{'label': c_lab, 'value': C} for C, c_lab in zip(df_count_canton.canton,
+                                                                             canton_dropdown_labels)],
+                'cities': [{'label': c, 'value': c} for c in df_count_city.municipality]}
+
+    def map_traces_update(self, delta, state) -> None:
+        """
+        Shows or hides the canton choropleth and the city bubbles (with the Swiss borders)
+        """
+        cities = state['map_mode'] in ('cities', 'both')
+        cantons = state['map_mode'] in ('cantons', 'both')
+        delta.update_traces('Swiss-Employment-Map', [0, 1], visible=cities)
+        delta.update_traces('Swiss-Employment-Map', [2], visible=cantons)
+
+    def bubbles_update(self, delta, state) -> None:
+        """
+        Sizes the city bubbles by the number of jobs of the selected function and locates the selected city
+        with a red dot
+        """
+        key = ('bubbles', state['job_function'], view_dates(state), state['city'], state['query'], state['dedup'])
+        delta.add(self.cached_update(key, lambda: self.compute_bubbles(state)))
+
+    def compute_bubbles(self, state) -> FigureDelta:
+        """
+        Trace updates of the city bubbles (not cached)
+        """
+        job_function = state['job_function']
+        city_counts, _ = self.view_counts(state)
+        bubble_size = city_counts * self.bubble_scale(city_counts, job_function, state['query'])
+        city_color = np.full(len(city_counts), self.city_color, dtype=object)
+
+        if state['city'] is not None:
+            city_idx = self.cube.city_index.get(state['city'], [])
+            city_color[city_idx] = self.selected_city_color
+            # city is too small to be seen - set arbitrary size
+            bubble_size[city_idx] = np.maximum(bubble_size[city_idx], 50)
+
+        delta = FigureDelta()
+        delta.update_traces('Swiss-Employment-Map', [1],
+                            marker={'color': city_color, 'size': bubble_size, 'sizemode': 'area'},
+                            text=self.cube.df_cities['municipality'] + '<br>' + city_counts.astype(str))
+        return delta
+
+    def functions_update(self, delta, state) -> None:
+        """
+        Updates the choropleth and the bar charts with the number of jobs of the selected function
+        """
+        key = ('functions', state['job_function'], view_dates(state), state['query'], state['dedup'])
+        delta.add(self.cached_update(key, lambda: self.compute_functions(state)))
+
+    def compute_functions(self, state) -> FigureDelta:
+        """
+        Trace updates of the choropleth and of the bar charts (not cached)
+        """
+        job_function = state['job_function']
+        city_counts, canton_counts = self.view_counts(state)
+
+        delta = FigureDelta()
+        delta.update_traces('Swiss-Employment-Map', [2],
+                            colorbar={'title': {'text': job_function if state['query'] is None else
+                                                job_function + '<br>"' + state['query'] + '"'}},
+                            text=self.cube.cantons,
+                            z=canton_counts)
+
+        if state['query'] is None:
+            rankings = self.cube_of(state).rankings
+            canton_order = rankings.canton_order(state['date_range'], job_function)
+            top_cities = rankings.top_cities(state['date_range'], job_function, self.n_top_cities)
+        else:
+            canton_order = top_k(canton_counts, len(canton_counts))
+            top_cities = top_k(city_counts, self.n_top_cities)
+
+        delta.update_traces('Canton_bar', [0], y=canton_counts[canton_order], x=self.cube.cantons[canton_order],
+                            customdata=self.cube.canton_names[canton_order])
+        delta.update_traces('city_bar', [0], y=city_counts[top_cities],
+                            x=self.cube.df_cities['municipality'].values[top_cities])
+        return delta
+
+    def view_counts(self, state) -> [np.ndarray, np.ndarray]:
+        """
+        Number of jobs of the job function of a view per city and per canton, restricted to the jobs matching its
+        search query if any
+        """
+        if state['query'] is None:
+            return self.cube_of(state).column_counts(state['date_range'], state['job_function'])
+        with self.metrics.phase('search'):
+            doc_ids = self.search_index.search(state['query'])
+            if state['job_function'] != 'All Jobs':
+                doc_ids = self.search_index.with_function(doc_ids, state['job_function'])
+        return self.cube.key_counts(self.search_keys[doc_ids], state['date_range'])
+
+    def cube_of(self, state) -> JobCube:
+        """
+        Cube of the postings counted by a view : all of them, or the distinct offers
+        """
+        return self.dedup_cube if state['dedup'] else self.cube
+
+    @staticmethod
+    def bubble_scale(city_counts, job_function, query=None) -> float:
+        """
+        Scaling factor of the bubble areas
+        """
+        if (job_function == 'All Jobs' and query is None) or city_counts.max() == 0:
+            return 1
+        return 500 / city_counts.max()
+
+    def cached_update(self, key, compute) -> FigureDelta:
+        """
+        Trace updates of the view `key` from the payload cache, computed by `compute()` if missing
+        """
+        computed = []
+        delta = self.payload_cache.get_or_compute(key, lambda: computed.append(True) or compute())
+        self.metrics.count('cache_lookups_total', cache='payload', view=key[0], result='miss' if computed else 'hit')
+        return delta
+
+    def record_payload(self, callb_id, delta) -> None:
+        """
+        Keeps track of the size of the figure updates sent for each kind of interaction
+        """
+        with self.metrics.phase('payload_size'):
+            payload_bytes = len(delta.to_json())
+        self.metrics.observe('callback_payload_bytes', payload_bytes)
+        self.payload_log.append((self.metrics.trigger_label(callb_id), payload_bytes))
+        logger.debug('%s - %d bytes of figure updates', callb_id, payload_bytes)
+
+    def payload_sizes(self) -> dict:
+        """
+        Sizes of the figure updates of the last interactions, and their number, mean and max per trigger
+        """
+        interactions = list(self.payload_log)
+        per_trigger = {}
+        for callb_id, payload_bytes in interactions:
+            per_trigger.setdefault(callb_id, []).append(payload_bytes)
+        return {'interactions': [{'trigger': callb_id, 'bytes': payload_bytes}
+                                 for callb_id, payload_bytes in interactions],
+                'triggers': {callb_id: {'count': len(sizes), 'mean_bytes': sum(sizes) / len(sizes),
+                                        'max_bytes': max(sizes)} for callb_id, sizes in per_trigger.items()}}
+
+    def button_styles(self, state) -> list:
+        """
+        Styles of the map buttons (cities, cantons, both), of the `Staffing and Recruiting` buttons (on, off) and of
+        the postings buttons (all postings, distinct offers)
+        """
+        selected = [state['map_mode'] == 'cities', state['map_mode'] == 'cantons', state['map_mode'] == 'both',
+                    state['staff_and_recr'], not state['staff_and_recr'], not state['dedup'], state['dedup']]
+        return [self.selected_button_style if is_selected else self.unselected_button_style
+                for is_selected in selected]
+
+    @staticmethod
+    def dynamic_title(state) -> str:
+        """
+        Title of the pie chart : selected area and job function
+        """
+        if state['city'] is not None:
+            dynamic_title = 'City of ' + state['city']
+        elif state['canton'] is not None:
+            dynamic_title = 'Canton of ' + state['canton']
+        else:
+            dynamic_title = 'Switzerland'
+
+        if state['job_function'] == 'All Jobs':
+            return dynamic_title + ' - All Job Functions'
+        return dynamic_title + ' - ' + state['job_function']
+
+    def pie_update(self, delta, state):
         """
         Updates the pie chart according to the city, the canton or the binary `Staffing adn Recruiting` button
         """
+        area = ('city', state['city']) if state['city'] is not None else ('canton', state['canton'])
+        key = ('pie', view_dates(state), area, state['staff_and_recr'], state['dedup'])
+        delta.add(self.cached_update(key, lambda: self.compute_pie(state)))
 
-        if city is not None:
-            if self.staff_and_recr:
-                df_tmp = self.df_count_city[self.df_count_city.municipality == city]
-            else:
-                df_tmp = self.df_count_city.drop(columns=['Staffing and Recruiting'])
-                df_tmp = df_tmp[df_tmp.municipality == city]
-
-            df_tmp = df_tmp.drop(columns=['All Jobs', 'municipality', 'lon', 'lat', 'canton']).transpose()
-            self.fig_pie.update_traces(labels=df_tmp.index,
-                                       values=df_tmp.iloc[:, 0],
-                                       overwrite=True)
-        elif canton is not None:
-            if self.staff_and_recr:
-                df_tmp = self.df_count_canton[self.df_count_canton.canton == canton]
-            else:
-                df_tmp = self.df_count_canton.drop(columns=['Staffing and Recruiting'])
-                df_tmp = df_tmp[df_tmp.canton == canton]
-
-            df_tmp = df_tmp.drop(columns=['All Jobs', 'canton']).transpose()
-            self.fig_pie.update_traces(labels=df_tmp.index,
-                                       values=df_tmp.iloc[:, 0],
-                                       overwrite=True)
-        elif not self.staff_and_recr:
-            df_tmp = self.df_job_function.drop(['Staffing and Recruiting'])
-            self.fig_pie.update_traces(labels=df_tmp.index,
-                                       values=df_tmp, overwrite=True)
-        #date filtering
+    def compute_pie(self, state) -> FigureDelta:
+        """
+        Trace updates of the pie chart (not cached)
+        """
+        cube = self.cube_of(state)
+        if state['city'] is not None:
+            city_idx = cube.city_index[state['city']][0]
+            df_tmp = cube.city_function_counts(state['date_range'], city_idx)
+        elif state['canton'] is not None:
+            canton_idx = cube.canton_index[state['canton']]
+            df_tmp = cube.canton_function_counts(state['date_range'], canton_idx)
+        else:
+            df_tmp = cube.function_counts(state['date_range'])
+
+        if not state['staff_and_recr']:
+            df_tmp = df_tmp.drop(['Staffing and Recruiting'], errors='ignore')
+
+        delta = FigureDelta()
+        delta.update_traces('fun-pie', [0], labels=df_tmp.index, values=df_tmp,
+                            hovertemplate='%{label}<br>%{value} jobs - %{percent}<extra></extra>')
+        return delta
+
+    def warm_cache(self, n_functions=5, n_cantons=5) -> None:
+        """
+        Computes the most common views over the whole date range : the `n_functions` job functions with the most
+        jobs (and All Jobs), the pie of Switzerland and of the `n_cantons` cantons with the most jobs
+        """
+        state = dict(self.initial_view_state)
+        function_counts = self.cube.function_counts(state['date_range'])
+        top_functions = function_counts.sort_values(ascending=False, kind='stable').index[:n_functions]
+        _, canton_counts = self.cube.column_counts(state['date_range'], 'All Jobs')
+        top_cantons = self.cube.cantons[np.argsort(-canton_counts, kind='stable')[:n_cantons]]
+
+        delta = FigureDelta()
+        with self.metrics.trigger('warm_cache'):
+            for job_function in ['All Jobs'] + list(top_functions):
+                self.functions_update(delta, dict(state, job_function=job_function))
+                self.bubbles_update(delta, dict(state, job_function=job_function))
+            for canton in [None] + list(top_cantons):
+                for staff_and_recr in (True, False):
+                    self.pie_update(delta, dict(state, canton=canton, staff_and_recr=staff_and_recr))
+        logger.info('Payload cache warmed up - %d views, %d bytes', len(self.payload_cache),
+                    self.payload_cache.stats()['bytes'])
+
+    def start_background_fill(self) -> threading.Thread:
+        """
+        Starts the thread computing the common views and the job functions of the cube not requested yet
+        """
+        thread = threading.Thread(target=self.background_fill, args=(self.cube,), name='job-cube-fill', daemon=True)
+        thread.start()
+        return thread
+
+    def background_fill(self, cube) -> None:
+        """
+        Warms the payload cache up, then computes the remaining job functions of `cube`
+        """
+        start = time.perf_counter()
+        self.warm_cache()
+        cube.fill()
+        if self.dedup_cube is not None:
+            self.dedup_cube.fill()
+        logger.info('Job functions computed in the background in %.2fs', time.perf_counter() - start)
+
+    def update_time_series(self, view_state) -> list:
+        """
+        Updates the line chart and the trending job functions with the view of the session
+        """
+        state = dict(self.initial_view_state, **(view_state or {}))
+        with self.metrics.trigger('time-series'), self.metrics.phase('callback'):
+            return list(self.compute_time_series(state))
+
+    def compute_time_series(self, state) -> [dict, list]:
+        """
+        Line chart of the daily jobs of the function of a view in its area and job functions trending over the 7
+        days ending at its last date (not cached)
+        """
+        timeseries = self.timeseries
+        if state['city'] is not None:
+            area = {'city': int(self.cube.city_codes[self.cube.city_index[state['city']][0]])}
+        elif state['canton'] is not None:
+            area = {'canton': state['canton']}
+        else:
+            area = {}
+        job_function = state['job_function']
+        if job_function in timeseries.column_index:
+            counts = timeseries.daily(job_function, **area)
         else:
-            self.fig_pie.update_traces(labels=self.df_job_function.index,
-                                       values=self.df_job_function,
-                                       hovertemplate='%{label}<br>%{value} jobs - %{percent}<extra></extra>',
-                                       overwrite=True)
+            counts = np.zeros(timeseries.n_days, dtype=np.int32)
+        days = timeseries.days.strftime('%Y-%m-%d').tolist()
+        first, last = (timeseries.day_index(self.cube.dates[date_idx]) for date_idx in view_dates(state))
+
+        title = self.dynamic_title(state)
+        growth = timeseries.growth(job_function, last, **area) if job_function in timeseries.column_index \
+            else float('nan')
+        if not np.isnan(growth):
+            title += ' - {:+.0%} week over week'.format(growth)
+        figure = {'data': [{'type': 'bar', 'x': days, 'y': counts, 'name': 'Jobs per day',
+                            'marker': {'color': self.city_color}, 'opacity': 0.5},
+                           {'type': 'scatter', 'mode': 'lines', 'x': days, 'y': rolling_mean(counts, 7),
+                            'name': '7 day average', 'line': {'color': self.trend_color}}],
+                  'layout': {'height': 250, 'margin': {'l': 40, 'r': 10, 't': 40, 'b': 30},
+                             'title': {'text': title}, 'legend': {'orientation': 'h'}, 'bargap': 0,
+                             'shapes': [{'type': 'rect', 'xref': 'x', 'yref': 'paper', 'x0': days[first],
+                                         'x1': days[last], 'y0': 0, 'y1': 1, 'fillcolor': self.trend_color,
+                                         'opacity': 0.1, 'line': {'width': 0}}] if days else []}}
+
+        df_trending = timeseries.trending(last, **area)
+        trending = [html.Strong('Trending job functions - 7 days to {}'.format(days[last]) if days else '')] + \
+                   [html.Div('{} : {} jobs ({:+.0%})'.format(function, int(row.current), row.growth))
+                    for function, row in df_trending.iterrows()]
+        return figure, trending
+
+    def serve_profile(self) -> flask.Response:
+        """
+        Arms the profiler for the next `arm` callback requests if given, returns the last captures
+        """
+        arm = flask.request.args.get('arm', type=int)
+        if arm is not None:
+            self.profiler.arm(arm)
+            return flask.Response('Profiling the next {} callback requests\n'.format(arm), mimetype='text/plain')
+        return flask.Response(self.profiler.last(), mimetype='text/plain')
 
     def update_job_function_dropdown_value(self, job_function) -> str:
         """
@@ -414,52 +765,57 @@ class ChartsManager:
         """
         return city_bars['points'][0]['label']
 
-    def date_filtering(self, date_boundaries) -> [pd.DataFrame, pd.DataFrame]:
+    def date_filtering(self, date_boundaries, columns=None) -> [pd.DataFrame, pd.DataFrame]:
         """
-        Filter the jobs by date
+        Filter the jobs by date - the counts are read from the precomputed cube
         """
-        date_min = self.unique_date[date_boundaries[0]]
-        date_max = self.unique_date[date_boundaries[1]]
-        # filtering
-        df_jobs_filtered = self.df_jobs[(self.df_jobs.date >= date_min) & (self.df_jobs.date <= date_max)]
+        return self.cube.city_canton_frames(date_boundaries, columns)
+
+
+def view_dates(state) -> tuple:
+    """
+    Normalized date range of a view state
+    """
+    return tuple(int(date_idx) for date_idx in state['date_range'])
 
-        # create city and canton dataframes with optional extra filtering on the job function
-        if self.job_function != 'All Jobs':
-            return city_canton_jobs(df_jobs_filtered, self.city_coordinates,
-                                    job_function=self.job_function, canton_naming=self.df_canton_names)
-        else:
-            return city_canton_jobs(df_jobs_filtered, self.city_coordinates,
-                                    job_function=False, canton_naming=self.df_canton_names)
-
-
-def city_canton_jobs(df_jobs, city_coordinates, job_function=False, canton_naming=None):
-    # group jobs by city and cantons
-    df_count = df_jobs[['title', 'city', 'canton']].groupby(['city', 'canton']). \
-        count().rename(columns={'title': 'All Jobs'}).reset_index()
-    df_count_city = df_count.merge(city_coordinates,
-                                   left_on=['city', 'canton'],
-                                   right_on=['municipality', 'canton']).drop(columns=['city'])
-
-    if job_function:
-        df_count_tmp = df_jobs[[job_function, 'city', 'canton']].groupby(['city', 'canton']).sum(). \
-            astype(int).reset_index()
-        df_count_city = df_count_city.merge(df_count_tmp, left_on=['municipality', 'canton'],
-                                            right_on=['city', 'canton']).drop(columns=['city'])
-
-    else:
-        for job_function in df_jobs.columns[5:]:
-            df_count_tmp = df_jobs[[job_function, 'city', 'canton']]. \
-                groupby(['city', 'canton']).sum().astype(int).reset_index()
-            df_count_city = df_count_city.merge(df_count_tmp, left_on=['municipality', 'canton'],
-                                                right_on=['city', 'canton']).drop(columns=['city'])
+
+def city_canton_jobs(df_jobs, function_matrix, locations, job_function=False, functions=None):
+    """
+    Counts the jobs per city and per canton, overall (`All Jobs`) and per job function.
+
+    Inputs:
+     - df_jobs : pd.DataFrame with the `city` and `canton` of the jobs
+     - function_matrix : FunctionMatrix of the job functions, aligned with df_jobs
+     - locations : Locations, shared dictionary of the cities and cantons
+     - job_function : optional str, restricts the counts to a single job function
+     - functions : optional list of job functions to count, all of them by default
+
+    Returns the city and canton pd.DataFrames
+    """
+    if functions is None:
+        functions = [job_function] if job_function else function_matrix.functions
+    function_matrix = function_matrix.select(list(functions))
+
+    # count the jobs on the integer city codes - every job function is counted in a single pass
+    city_codes = locations.encode_cities(df_jobs['city'], df_jobs['canton'])
+    n_cities = len(locations.df_cities)
+    all_jobs = np.bincount(city_codes[city_codes >= 0], minlength=n_cities)
+    function_counts = function_matrix.group_sum(city_codes, n_cities)
+
+    # cities having jobs, ordered by name
+    cities = locations.sorted_cities(np.flatnonzero(all_jobs))
+    df_count_city = locations.df_cities.iloc[cities].reset_index(drop=True)
+    df_count_city.insert(1, 'All Jobs', all_jobs[cities])
+    df_count_city = pd.concat([df_count_city, pd.DataFrame(function_counts[cities],
+                                                           columns=function_matrix.functions)], axis=1)
+    df_count_city = df_count_city[['canton', 'All Jobs', 'municipality', 'lat', 'lon'] + function_matrix.functions]
 
     # cantons
     df_count_canton = df_count_city.drop(columns=['municipality', 'lat', 'lon']). \
         groupby('canton').sum().reset_index()
 
-    if canton_naming is not None:
-        df_count_canton = df_count_canton.merge(canton_naming, left_on=['canton'],
+    if locations.canton_naming is not None:
+        df_count_canton = df_count_canton.merge(locations.canton_naming, left_on=['canton'],
                                                 right_on=['canton'])
 
     return df_count_city, df_count_canton
-
@@ -0,0 +1,255 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from source.search import WORD, fold, strip_html
+from source.storage import list_parts, load_part, load_content, content_keys, job_keys, CLUSTER_COLUMN
+
+"""
+Near-duplicate detection of the job postings.
+The same offer is often published again on later days, or slightly edited, by the company or by several staffing
+agencies : such postings are grouped in clusters so that the web app can count each offer once.
+
+The text of a job (title, company and description) is cut into shingles of SHINGLE_SIZE consecutive words. Its
+MinHash signature holds, for each of N_PERMUTATIONS hash functions, the minimum hash of its shingles : two jobs have
+the same value for a function with a probability equal to the Jaccard similarity of their shingles. The signatures
+are cut into N_BANDS bands (locality sensitive hashing) : the jobs sharing a whole band with a job are its
+candidates, the candidates agreeing on at least `threshold` of the values are its near-duplicates. A job joins the
+cluster of its most similar near-duplicate, or starts a new cluster identified by its key.
+
+The band keys of the stored jobs are kept in a sorted table, the candidates of a job being found by binary searches
+whatever the number of stored jobs. The clusters are assigned when the jobs are appended (see storage.append_jobs),
+the stored jobs without clusters are processed by : python -m source.dedup ./Data/
+"""
+
+N_PERMUTATIONS = 64
+N_BANDS = 16
+SHINGLE_SIZE = 3
+THRESHOLD = 0.7
+MAX_CANDIDATES = 32  # most recent candidates of each band
+COMPACT_ROWS = 50000  # jobs added before their band keys are merged into the sorted table
+SHINGLE_CHUNK = 2 ** 14  # shingles hashed at once, (SHINGLE_CHUNK, N_PERMUTATIONS) uint64 arrays
+
+
+def splitmix64(values) -> np.ndarray:
+    """
+    Bijective mixing of uint64 values (SplitMix64 finalizer), identical on every platform and numpy version
+    """
+    values = np.asarray(values, dtype=np.uint64) + np.uint64(0x9e3779b97f4a7c15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+# hash functions h(x) = (a * x + b) >> 32 (mod 2 ** 64), a being odd
+MULTIPLIERS = splitmix64(np.arange(N_PERMUTATIONS)) | np.uint64(1)
+INCREMENTS = splitmix64(np.arange(N_PERMUTATIONS, 2 * N_PERMUTATIONS))
+
+
+def shingle_hashes(texts) -> [np.ndarray, np.ndarray]:
+    """
+    Hashes of the shingles (SHINGLE_SIZE consecutive words, folded) of texts, a text shorter than a shingle being a
+    single shingle
+
+    Returns the uint64 hashes and the number of shingles of each text
+    """
+    words = [WORD.findall(fold(text)) for text in texts]
+    lengths = np.array([len(text_words) for text_words in words], dtype=np.int64)
+    # word hashes of all the texts, followed by the hash of the empty texts
+    word_hashes = np.append(pd.util.hash_array(np.array([word for text_words in words for word in text_words],
+                                                        dtype=object)), np.uint64(0))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    empty = lengths == 0
+    starts[empty] = len(word_hashes) - 1
+    lasts = np.where(empty, starts, starts + lengths - 1)
+
+    n_shingles = np.maximum(lengths - SHINGLE_SIZE + 1, 1)
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(n_shingles, out=offsets[1:])
+    first_words = np.repeat(starts, n_shingles) + np.arange(offsets[-1]) - np.repeat(offsets[:-1], n_shingles)
+    shingle_lasts = np.repeat(lasts, n_shingles)
+    hashes = np.zeros(offsets[-1], dtype=np.uint64)
+    for position in range(SHINGLE_SIZE):
+        hashes = splitmix64(hashes ^ word_hashes[np.minimum(first_words + position, shingle_lasts)])
+    return hashes, n_shingles
+
+
+def minhash_signatures(texts) -> np.ndarray:
+    """
+    MinHash signatures of texts : (n_texts, N_PERMUTATIONS) uint32 np.ndarray
+    """
+    hashes, n_shingles = shingle_hashes(texts)
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(n_shingles, out=offsets[1:])
+    signatures = np.empty((len(texts), N_PERMUTATIONS), dtype=np.uint32)
+    # by blocks of texts, the (shingles, permutations) matrix being bounded
+    begin = 0
+    while begin < len(texts):
+        end = max(int(np.searchsorted(offsets, offsets[begin] + SHINGLE_CHUNK, side='right')) - 1, begin + 1)
+        block = hashes[offsets[begin]:offsets[end], None] * MULTIPLIERS + INCREMENTS
+        signatures[begin:end] = np.minimum.reduceat(block >> np.uint64(32), offsets[begin:end] - offsets[begin],
+                                                    axis=0)
+        begin = end
+    return signatures
+
+
+def band_keys(signatures) -> np.ndarray:
+    """
+    Keys of the bands of signatures : (n, N_BANDS) uint64 np.ndarray, the keys of two bands being different
+    """
+    bands = np.asarray(signatures, dtype=np.uint64).reshape(len(signatures), N_BANDS, -1)
+    keys = np.broadcast_to(np.arange(N_BANDS, dtype=np.uint64), bands.shape[:2])
+    for row in range(bands.shape[2]):
+        keys = splitmix64(keys ^ bands[:, :, row])
+    return keys
+
+
+def job_texts(df_jobs, df_content) -> list:
+    """
+    Text compared for each job : its title, company and description (the text of the job content of the same key)
+    """
+    descriptions = pd.Series(df_content['content'].values if len(df_content) else [],
+                             index=content_keys(df_content) if len(df_content) else [], dtype=object)
+    descriptions = descriptions[~descriptions.index.duplicated()]
+    contents = descriptions.reindex(job_keys(df_jobs)).values
+    return [str(title) + ' ' + str(company) + ' ' + (strip_html(content) if isinstance(content, str) else '')
+            for title, company, content in zip(df_jobs['title'], df_jobs['company'], contents)]
+
+
+class NearDuplicates:
+    """
+    LSH index of the MinHash signatures of the stored jobs, assigning the near-duplicate clusters of new jobs.
+
+    Inputs:
+     - signatures : list of (n, N_PERMUTATIONS) uint32 np.ndarrays, signatures of the stored jobs (one per part)
+     - clusters : list of (n,) uint64 np.ndarrays, cluster of the stored jobs, aligned with `signatures`
+     - threshold : float, share of equal MinHash values of two near-duplicates (estimated Jaccard similarity)
+
+    The jobs given to `assign` are added to the index : they are candidates of the next ones.
+    """
+
+    def __init__(self, signatures=(), clusters=(), threshold=THRESHOLD):
+        self.threshold = threshold
+        # jobs are numbered in the order of the blocks, job `row` being in the block of offset <= row
+        self.signatures, self.clusters, self.offsets = [], [], [0]
+        for block_signatures, block_clusters in zip(signatures, clusters):
+            self.add_block(block_signatures, block_clusters)
+        # sorted band keys of the jobs [0, n_indexed[ and their jobs
+        self.table_keys, self.table_rows = np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+        self.n_indexed = 0
+        # band keys of the jobs added since : key --> jobs
+        self.recent = {}
+        self.compact()
+
+    @classmethod
+    def load(cls, DATA_DIR, threshold=THRESHOLD) -> 'NearDuplicates':
+        """
+        Index of the stored jobs having signatures
+        """
+        parts = [part for part in list_parts(DATA_DIR) if os.path.exists(os.path.join(part, 'minhash.npy'))]
+        return cls([np.load(os.path.join(part, 'minhash.npy'), mmap_mode='r') for part in parts],
+                   [np.load(os.path.join(part, CLUSTER_COLUMN + '.npy'), mmap_mode='r') for part in parts], threshold)
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def add_block(self, signatures, clusters) -> None:
+        self.signatures.append(signatures)
+        self.clusters.append(clusters)
+        self.offsets.append(self.offsets[-1] + len(signatures))
+
+    def gather(self, blocks, rows) -> np.ndarray:
+        """
+        Entries of `rows` in a list of blocks (self.signatures or self.clusters)
+        """
+        block_idx = np.searchsorted(self.offsets, rows, side='right') - 1
+        values = np.empty((len(rows),) + blocks[0].shape[1:], dtype=blocks[0].dtype)
+        for block in np.unique(block_idx):
+            in_block = block_idx == block
+            values[in_block] = blocks[block][rows[in_block] - self.offsets[block]]
+        return values
+
+    def compact(self) -> None:
+        """
+        Merges the band keys of the jobs added since the last compaction into the sorted table
+        """
+        new_rows = np.arange(self.n_indexed, len(self))
+        if not len(new_rows):
+            return
+        keys = np.concatenate([self.table_keys, band_keys(self.gather(self.signatures, new_rows)).ravel()])
+        rows = np.concatenate([self.table_rows, np.repeat(new_rows, N_BANDS)])
+        # stable : the jobs of a key stay ordered, most recent last
+        order = np.argsort(keys, kind='stable')
+        self.table_keys, self.table_rows = keys[order], rows[order]
+        self.n_indexed = len(self)
+        self.recent = {}
+
+    def assign(self, texts, keys) -> [np.ndarray, np.ndarray]:
+        """
+        Clusters of new jobs, given by their texts (see `job_texts`) and keys, the jobs being added to the index
+
+        Returns the uint64 clusters and the MinHash signatures of the jobs
+        """
+        signatures = minhash_signatures(texts)
+        job_bands = band_keys(signatures)
+        clusters = np.empty(len(texts), dtype=np.uint64)
+        first_row = len(self)
+        self.add_block(signatures, clusters)
+
+        # candidates among the jobs of the sorted table : binary searches of all the bands at once
+        begins = np.searchsorted(self.table_keys, job_bands, side='left')
+        ends = np.searchsorted(self.table_keys, job_bands, side='right')
+        begins = np.maximum(begins, ends - MAX_CANDIDATES)
+        for idx, bands in enumerate(job_bands.tolist()):
+            candidates = [self.table_rows[begin:end] for begin, end in zip(begins[idx], ends[idx]) if end > begin]
+            candidates += [self.recent[band][-MAX_CANDIDATES:] for band in bands if band in self.recent]
+            clusters[idx] = keys[idx]
+            if candidates:
+                rows = np.unique(np.concatenate(candidates))
+                similarities = (self.gather(self.signatures, rows) == signatures[idx]).mean(axis=1)
+                best = np.argmax(similarities)
+                if similarities[best] >= self.threshold:
+                    clusters[idx] = self.gather(self.clusters, rows[best:best + 1])[0]
+            for band in bands:
+                self.recent.setdefault(band, []).append(first_row + idx)
+
+        if len(self) - self.n_indexed >= max(COMPACT_ROWS, self.n_indexed // 4):
+            self.compact()
+        return clusters, signatures
+
+
+def save_array(array, path) -> None:
+    """
+    Writes an .npy file, the file being replaced only once complete
+    """
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.replace(path + '.tmp', path)
+
+
+def assign_stored(DATA_DIR, threshold=THRESHOLD) -> int:
+    """
+    Assigns the clusters of the stored jobs without clusters, part by part in the order of the dataset. The
+    signatures are written last : a part is processed again if interrupted.
+
+    Returns the number of jobs assigned
+    """
+    near_duplicates = NearDuplicates.load(DATA_DIR, threshold)
+    df_content = load_content(DATA_DIR)
+    n_jobs = 0
+    for part in list_parts(DATA_DIR):
+        if os.path.exists(os.path.join(part, 'minhash.npy')):
+            continue
+        df_part = load_part(part)
+        clusters, signatures = near_duplicates.assign(job_texts(df_part, df_content),
+                                                      np.load(os.path.join(part, 'keys.npy')))
+        save_array(clusters, os.path.join(part, CLUSTER_COLUMN + '.npy'))
+        save_array(signatures, os.path.join(part, 'minhash.npy'))
+        n_jobs += len(df_part)
+    return n_jobs
+
+
+if __name__ == '__main__':
+    DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else './Data/'
+    print('{} stored jobs assigned to their near-duplicate clusters'.format(assign_stored(DATA_DIR)))
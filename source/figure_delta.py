@@ -0,0 +1,67 @@
+import json
+import plotly.utils
+
+"""
+Delta updates of the charts.
+Instead of re-sending whole go.Figure objects (geojson included) after each interaction, the callbacks only
+send the trace properties that changed. The figures drawn at start up stay in the browser and the delta is
+merged into them by the `figures.patch` clientside function (assets/figure_patch.js).
+"""
+
+
+class FigureDelta:
+    """
+    Collects the changes to apply to the traces of the app figures.
+
+    Each change is stored as a list of trace indexes and a nested dict of trace properties, arrays being
+    replaced and dicts being merged. A delta is keyed by the id of the dcc.Graph holding the figure.
+    """
+
+    def __init__(self):
+        self.updates = {}
+
+    def update_traces(self, graph_id, traces, **update) -> None:
+        """
+        Records an update of the traces `traces` (list of trace indexes) of the figure of `graph_id`
+        """
+        self.updates.setdefault(graph_id, []).append({'traces': list(traces), 'update': update})
+
+    def add(self, other) -> None:
+        """
+        Appends the changes recorded by another FigureDelta
+        """
+        for graph_id, trace_updates in other.updates.items():
+            self.updates.setdefault(graph_id, []).extend(trace_updates)
+
+    def apply(self, graph_id, figure) -> dict:
+        """
+        Returns a copy of the figure dict of `graph_id` with the recorded changes, `figure` is left untouched
+        """
+        figure = dict(figure, data=list(figure['data']))
+        for trace_update in self.updates.get(graph_id, []):
+            for trace in trace_update['traces']:
+                figure['data'][trace] = merge(figure['data'][trace], trace_update['update'])
+        return figure
+
+    def to_json(self) -> str:
+        """
+        Serializes the delta the same way Dash serializes the callback outputs
+        """
+        return json.dumps(self.updates, cls=plotly.utils.PlotlyJSONEncoder)
+
+    def __bool__(self):
+        return bool(self.updates)
+
+
+def merge(target, update) -> dict:
+    """
+    Returns a copy of the `target` dict updated by `update` : dicts are merged, any other value is replaced.
+    Only the modified branches are copied.
+    """
+    merged = dict(target)
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
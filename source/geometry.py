@@ -0,0 +1,202 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+"""
+Preprocessing of the map geometries.
+The geojson files hold the borders at full resolution (altitude included) while the map is drawn at zoom ~7, where
+most of these points fall into the same pixel. The build step :
+ - simplifies every line and ring with the Douglas-Peucker algorithm, with a tolerance set by the zoom level at
+   which the details must stay visible,
+ - quantizes the coordinates on a grid (QUANTIZATION degrees), the altitude being dropped,
+ - only keeps the requested feature properties,
+ - stores the result in a compressed binary cache, `<DATA_DIR>/geometry/<file>.z<zoom>.<hash>.npz`, keyed by the
+   hash of the source file and of the kept properties.
+The map then loads the cache instead of parsing the geojson, and sends far fewer (and shorter) coordinates.
+"""
+
+GEOMETRY_DIR = 'geometry'
+QUANTIZATION = 1e-4  # degrees, ~10 m
+TILE_SIZE = 256  # pixels of a map tile
+
+
+def tolerance_for_zoom(zoom, pixels=0.5) -> float:
+    """
+    Simplification tolerance, in degrees, of `pixels` pixels at the zoom level `zoom` of the map
+    """
+    return pixels * 360 / (TILE_SIZE * 2 ** zoom)
+
+
+def simplify(points, tolerance) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of a line : keeps the points farther than `tolerance` from the simplified line.
+    The end points are always kept, a closed ring keeps at least 4 points.
+
+    Inputs:
+     - points : (n, 2) np.ndarray of coordinates
+     - tolerance : float, maximum distance between the line and its simplification
+
+    Returns the kept points, (m, 2) np.ndarray
+    """
+    n = len(points)
+    if n < 3:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*segment)
+        if length > 0:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        else:  # closed ring : distance to the first point
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            keep[first + 1 + farthest] = True
+            stack += [(first, first + 1 + farthest), (first + 1 + farthest, last)]
+
+    is_ring = np.array_equal(points[0], points[-1])
+    if is_ring and keep.sum() < 4 and n >= 4:
+        keep[[n // 3, 2 * n // 3]] = True
+    return points[keep]
+
+
+def quantize(points, step=QUANTIZATION) -> np.ndarray:
+    """
+    Integer grid coordinates (int32) of the points, consecutive duplicates removed
+    """
+    codes = np.round(points / step).astype(np.int32)
+    is_new = np.ones(len(codes), dtype=bool)
+    is_new[1:] = (codes[1:] != codes[:-1]).any(axis=1)
+    return codes[is_new]
+
+
+def simplify_path(points, tolerance, step=QUANTIZATION) -> np.ndarray:
+    """
+    Simplified and quantized points of a line or ring. The points merged by the quantization can leave a ring with
+    less than 4 points : it is then quantized at full resolution, and without removing its duplicates if it is
+    smaller than the grid
+    """
+    codes = quantize(simplify(points, tolerance), step)
+    is_ring = len(points) >= 4 and np.array_equal(points[0], points[-1])
+    if is_ring and len(codes) < 4:
+        codes = quantize(points, step)
+        if len(codes) < 4:
+            codes = np.round(points / step).astype(np.int32)
+    return codes
+
+
+def split_paths(coordinates, paths) -> object:
+    """
+    Replaces the point arrays (lines and rings) of nested geojson coordinates by their index in `paths`, where
+    they are appended as (n, 2) np.ndarray
+    """
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        raise ValueError('coordinates of a single point')
+    if coordinates and isinstance(coordinates[0][0], (int, float)):
+        paths.append(np.array([point[:2] for point in coordinates], dtype=np.float64))
+        return len(paths) - 1
+    return [split_paths(nested, paths) for nested in coordinates]
+
+
+def join_paths(skeleton, paths) -> object:
+    """
+    Inverse of `split_paths`
+    """
+    if isinstance(skeleton, int):
+        return paths[skeleton]
+    return [join_paths(nested, paths) for nested in skeleton]
+
+
+def cache_path(JSON_PATH, zoom, properties, DATA_DIR) -> str:
+    """
+    Path of the cache of a geojson file, keyed by the hash of the file and of the kept properties
+    """
+    with open(JSON_PATH, 'rb') as f:
+        key = hashlib.sha1(f.read() + json.dumps(properties).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(JSON_PATH))[0]
+    return os.path.join(DATA_DIR or os.path.dirname(JSON_PATH), GEOMETRY_DIR,
+                        '{}.z{:g}.{}.npz'.format(name, zoom, key))
+
+
+def build_geometry(JSON_PATH, zoom, properties=None, DATA_DIR=None) -> dict:
+    """
+    Simplifies and quantizes the features of a geojson file and writes them to the cache
+
+    Inputs:
+     - JSON_PATH : path of the geojson file
+     - zoom : float, zoom level down to which the simplification is not visible
+     - properties : list of the feature properties to keep, all of them if None
+     - DATA_DIR : data folder directory holding the cache, the directory of the geojson by default
+
+    Returns the arrays of the cache (see `load_geojson`)
+    """
+    with open(JSON_PATH, 'r') as j:
+        geojson = json.loads(j.read())
+
+    paths, features = [], []
+    tolerance = tolerance_for_zoom(zoom)
+    for feature in geojson['features']:
+        props = feature['properties'] if properties is None else {key: feature['properties'].get(key)
+                                                                   for key in properties}
+        skeleton = split_paths(feature['geometry']['coordinates'], paths)
+        features.append({'properties': props, 'type': feature['geometry']['type'], 'paths': skeleton})
+
+    codes = [simplify_path(path, tolerance) for path in paths]
+    lengths = np.array([len(path) for path in codes], dtype=np.int64)
+    codes = np.concatenate(codes) if codes else np.zeros((0, 2), dtype=np.int32)
+    # delta encoding : the successive points are close, the deltas are small integers that compress well
+    deltas = np.diff(codes, axis=0, prepend=np.zeros((1, 2), dtype=np.int32)).astype(np.int32)
+    cache = {'features': np.array(json.dumps(features)), 'lengths': lengths, 'deltas': deltas,
+             'step': np.array(QUANTIZATION)}
+
+    path = cache_path(JSON_PATH, zoom, properties, DATA_DIR)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # caches of the previous versions of the file
+        prefix = os.path.basename(path).rsplit('.', 2)[0] + '.'
+        for outdated in os.listdir(os.path.dirname(path)):
+            if outdated.startswith(prefix) and len(outdated) == len(os.path.basename(path)):
+                os.remove(os.path.join(os.path.dirname(path), outdated))
+        np.savez_compressed(path, **cache)
+    except OSError:  # read-only data folder, the geometry is rebuilt at each start
+        pass
+    return cache
+
+
+def load_geojson(JSON_PATH, zoom, properties=None, DATA_DIR=None) -> dict:
+    """
+    Loads the simplified and quantized geojson of `JSON_PATH` from the cache, built if missing or outdated
+
+    Inputs:
+     - JSON_PATH : path of the geojson file
+     - zoom : float, zoom level down to which the simplification is not visible
+     - properties : list of the feature properties to keep, all of them if None
+     - DATA_DIR : data folder directory holding the cache, the directory of the geojson by default
+
+    Returns the geojson dict
+    """
+    path = cache_path(JSON_PATH, zoom, properties, DATA_DIR)
+    if os.path.exists(path):
+        with np.load(path) as npz:
+            cache = {key: npz[key] for key in npz.files}
+    else:
+        cache = build_geometry(JSON_PATH, zoom, properties, DATA_DIR)
+    features = json.loads(str(cache['features']))
+
+    coordinates = np.cumsum(cache['deltas'], axis=0) * float(cache['step'])
+    # rounding the floats to the grid keeps their json serialization short
+    coordinates = np.round(coordinates, int(-np.floor(np.log10(float(cache['step']))))).tolist()
+    offsets = np.concatenate([[0], np.cumsum(cache['lengths'])])
+    paths = [coordinates[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'properties': feature['properties'],
+                          'geometry': {'type': feature['type'], 'coordinates': join_paths(feature['paths'], paths)}}
+                         for feature in features]}
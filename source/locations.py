@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+"""
+Shared dictionary of the locations.
+The municipalities of `df_city_coordinates.csv` and the cantons are given dense integer codes once, the jobs are then
+grouped and counted on these codes instead of on the city and canton strings.
+"""
+
+
+def factorize(values) -> [np.ndarray, np.ndarray]:
+    """
+    Integer codes (-1 for missing values) and distinct values of a column, read from the categories of a
+    categorical column
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return np.asarray(values.cat.codes), np.asarray(values.cat.categories, dtype=object)
+    codes, uniques = pd.factorize(values)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+class Locations:
+    """
+    Dense integer codes of the municipalities (rows of the city coordinates) and of the cantons (sorted).
+
+    Inputs:
+     - city_coordinates : pd.DataFrame with the `municipality`, `canton`, `lat` and `lon` of the cities
+     - canton_naming : optional pd.DataFrame with the full `Name` of each `canton`
+    """
+
+    def __init__(self, city_coordinates, canton_naming=None):
+        self.df_cities = city_coordinates[['municipality', 'canton', 'lat', 'lon']].reset_index(drop=True)
+        self.canton_naming = canton_naming
+
+        cantons = self.df_cities['canton']
+        if canton_naming is not None:
+            cantons = pd.concat([cantons, canton_naming['canton']])
+        self.cantons = np.sort(cantons.unique())
+        self.canton_index = {canton: code for code, canton in enumerate(self.cantons)}
+
+        self.city_index = {(municipality, canton): code for code, (municipality, canton) in
+                           enumerate(zip(self.df_cities['municipality'], self.df_cities['canton']))}
+        self.city_cantons = np.array([self.canton_index[canton] for canton in self.df_cities['canton']])
+
+    def encode_cantons(self, cantons) -> np.ndarray:
+        """
+        Canton codes of a column of cantons, -1 for the unknown cantons
+        """
+        codes, uniques = factorize(cantons)
+        lookup = np.array([self.canton_index.get(canton, -1) for canton in uniques] + [-1], dtype=np.int64)
+        return lookup[codes]
+
+    def encode_cities(self, cities, cantons) -> np.ndarray:
+        """
+        City codes of the (city, canton) pairs of two columns, -1 for the cities without coordinates.
+        Only the distinct pairs are looked up in the dictionary.
+        """
+        city_codes, city_names = factorize(cities)
+        canton_codes, canton_names = factorize(cantons)
+        # pairs of codes, shifted so that the missing values (-1) are 0
+        n_cantons = len(canton_names) + 1
+        pairs = (city_codes.astype(np.int64) + 1) * n_cantons + canton_codes + 1
+        unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+        city_names = np.concatenate([[None], city_names])
+        canton_names = np.concatenate([[None], canton_names])
+        lookup = np.array([self.city_index.get((city_names[pair // n_cantons], canton_names[pair % n_cantons]), -1)
+                           for pair in unique_pairs], dtype=np.int64)
+        return lookup[inverse]
+
+    def sorted_cities(self, codes) -> np.ndarray:
+        """
+        City codes ordered by municipality and canton names
+        """
+        return codes[np.lexsort((self.df_cities['canton'].values[codes], self.df_cities['municipality'].values[codes]))]
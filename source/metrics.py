@@ -0,0 +1,233 @@
+import io
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+"""
+Latency instrumentation of the web app.
+The callbacks record the wall time of their phases, the size of their payloads and the hits of the caches, labelled
+by the element that triggered them (`callb_id`). The trigger is sent by the browser : only the known triggers (the
+inputs of the callbacks) are used as labels, any other one being recorded as `other`, so that the number of series
+does not depend on the requests. The metrics are served at `/metrics` in the Prometheus text format,
+to be scraped in production and compared between releases :
+ - swissjobmap_callback_phase_seconds{trigger, phase} : histogram of the time of each phase,
+ - swissjobmap_callback_payload_bytes{trigger} : histogram of the size of the figure updates,
+ - swissjobmap_response_bytes_total{trigger, encoding} : bytes of the (compressed) responses,
+ - swissjobmap_cache_lookups_total{cache, trigger, view, result} : hits and misses of the caches,
+ - the counters of the caches (entries, bytes, evictions ...) as gauges.
+A Profiler captures a cProfile of single requests, on demand.
+"""
+
+NAMESPACE = 'swissjobmap'
+OTHER_TRIGGER = 'other'
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+DESCRIPTIONS = {
+    'callback_phase_seconds': ('histogram', 'Wall time of the phases of the callbacks', SECONDS_BUCKETS),
+    'callback_payload_bytes': ('histogram', 'Size of the figure updates sent by the callbacks', BYTES_BUCKETS),
+    'response_bytes_total': ('counter', 'Bytes of the callback responses, as sent', None),
+    'cache_lookups_total': ('counter', 'Lookups of the payload and response caches', None),
+}
+
+
+def format_labels(labels) -> str:
+    """
+    Prometheus representation of a tuple of (name, value) labels
+    """
+    if not labels:
+        return ''
+    values = ('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+              for name, value in labels)
+    return '{' + ','.join(values) + '}'
+
+
+class Metrics:
+    """
+    Thread safe histograms and counters, labelled by the trigger of the current callback.
+
+    Inputs:
+     - triggers : iterable of the known triggers, completed by `add_triggers`. Any trigger is a label if None.
+
+    `trigger(callb_id)` sets the trigger of the metrics recorded by the current thread, `phase(name)` times a block.
+    The functions given to `add_gauges(prefix, stats)` are called at each export, their numeric values being
+    exported as gauges (e.g. PayloadCache.stats).
+    """
+
+    def __init__(self, triggers=None):
+        self.histograms = {}  # (name, labels) --> [bucket counts, sum, count]
+        self.counters = {}  # (name, labels) --> value
+        self.gauges = []  # (prefix, function returning a dict)
+        self.triggers = None if triggers is None else frozenset(triggers)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def add_triggers(self, triggers) -> None:
+        """
+        Adds `triggers` to the known triggers
+        """
+        with self.lock:
+            self.triggers = (self.triggers or frozenset()) | frozenset(triggers)
+
+    def trigger_label(self, callb_id) -> str:
+        """
+        Label of the trigger `callb_id` : itself if it is known, OTHER_TRIGGER otherwise
+        """
+        triggers = self.triggers
+        return callb_id if triggers is None or callb_id in triggers else OTHER_TRIGGER
+
+    @contextmanager
+    def trigger(self, callb_id):
+        """
+        Labels the metrics recorded by the current thread within the block with `callb_id` (see `trigger_label`)
+        """
+        previous = getattr(self.local, 'trigger', None)
+        self.local.trigger = self.trigger_label(callb_id)
+        try:
+            yield
+        finally:
+            self.local.trigger = previous
+
+    @contextmanager
+    def phase(self, phase):
+        """
+        Records the wall time of the block as `phase` of the current callback
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('callback_phase_seconds', time.perf_counter() - start, phase=phase)
+
+    def labels(self, labels) -> tuple:
+        """
+        Sorted labels, with the trigger of the current thread
+        """
+        labels = dict(labels, trigger=getattr(self.local, 'trigger', None) or 'none')
+        return tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels) -> None:
+        """
+        Adds `value` to the histogram `name`
+        """
+        key = (name, self.labels(labels))
+        buckets = DESCRIPTIONS[name][2]
+        with self.lock:
+            histogram = self.histograms.setdefault(key, [[0] * len(buckets), 0, 0])
+            for idx, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][idx] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def count(self, name, value=1, **labels) -> None:
+        """
+        Adds `value` to the counter `name`
+        """
+        key = (name, self.labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_gauges(self, prefix, stats) -> None:
+        """
+        Exports the numeric values of the dict returned by `stats()` as gauges `<prefix>_<key>`
+        """
+        self.gauges.append((prefix, stats))
+
+    def export(self) -> str:
+        """
+        Metrics in the Prometheus text format
+        """
+        with self.lock:
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in
+                          self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for name, (kind, description, bounds) in DESCRIPTIONS.items():
+            full_name = NAMESPACE + '_' + name
+            lines += ['# HELP {} {}'.format(full_name, description), '# TYPE {} {}'.format(full_name, kind)]
+            if kind == 'histogram':
+                for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, bucket_count in zip(bounds, buckets):
+                        lines.append('{}_bucket{} {}'.format(full_name, format_labels(labels + (('le', bound),)),
+                                                             bucket_count))
+                    lines.append('{}_bucket{} {}'.format(full_name, format_labels(labels + (('le', '+Inf'),)), count))
+                    lines.append('{}_sum{} {}'.format(full_name, format_labels(labels), total))
+                    lines.append('{}_count{} {}'.format(full_name, format_labels(labels), count))
+            else:
+                lines += ['{}{} {}'.format(full_name, format_labels(labels), value)
+                          for (metric, labels), value in sorted(counters.items()) if metric == name]
+
+        for prefix, stats in self.gauges:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    full_name = '{}_{}_{}'.format(NAMESPACE, prefix, key)
+                    lines += ['# TYPE {} gauge'.format(full_name), '{} {}'.format(full_name, value)]
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """
+    cProfile capture of single requests.
+
+    `arm(n)` arms the profiler for the next `n` requests (see `take`), `run` profiles a request. The statistics of
+    the last 10 captures (sorted by cumulative time) are returned by `last`.
+    """
+
+    def __init__(self, n_lines=40):
+        self.n_lines = n_lines
+        self.armed = 0
+        self.captures = []  # text of the captures
+        self.lock = threading.Lock()
+        # a single profiler can be active at a time
+        self.run_lock = threading.Lock()
+
+    def arm(self, n=1) -> None:
+        """
+        Profiles the next `n` requests
+        """
+        with self.lock:
+            self.armed = n
+
+    def take(self) -> bool:
+        """
+        Whether the current request is to be profiled, the profiler being disarmed by one request if armed
+        """
+        with self.lock:
+            if self.armed <= 0:
+                return False
+            self.armed -= 1
+            return True
+
+    def run(self, description, function):
+        """
+        Returns `function()`, its cProfile statistics being kept with `description`
+        """
+        with self.run_lock:
+            return self.capture(description, function)
+
+    def capture(self, description, function):
+        """
+        Runs and profiles `function`, the lock being held
+        """
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(function)
+        finally:
+            output = io.StringIO()
+            output.write('{} - {:.2f} ms\n'.format(description, 1e3 * (time.perf_counter() - start)))
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(self.n_lines)
+            with self.lock:
+                self.captures = (self.captures + [output.getvalue()])[-10:]
+
+    def last(self) -> str:
+        """
+        Statistics of the last captured requests, most recent first
+        """
+        with self.lock:
+            return '\n'.join(reversed(self.captures)) or 'No request profiled\n'
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+
+"""
+Bounded LRU cache of the computed chart payloads.
+The sessions keep asking for the same views (All Jobs, the main job functions, the whole date range, the big
+cantons) : the trace updates computed for a view are kept, keyed by the normalized view parameters, and shared by
+all the sessions and threads. The cache is bounded both in number of entries and in bytes, the least recently used
+entries being evicted first.
+"""
+
+
+class PayloadCache:
+    """
+    Thread safe LRU cache with entry and byte limits.
+
+    Inputs:
+     - max_entries : int, maximum number of entries
+     - max_bytes : int, maximum total size of the entries, as given by `sizeof`
+     - sizeof : function returning the size in bytes of a value
+
+    `invalidate` empties the cache and discards the values being computed, e.g. to measure cold views.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=32 * 2 ** 20, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()  # key --> (value, size)
+        self.n_bytes = 0
+        self.generation = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the value of `key`, computed by `compute()` and stored if missing
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return self.entries[key][0]
+            self.counters['misses'] += 1
+            generation = self.generation
+
+        # computed outside of the lock : concurrent misses of a same key compute the same value
+        value = compute()
+        size = self.sizeof(value)
+        with self.lock:
+            if generation == self.generation and key not in self.entries and size <= self.max_bytes:
+                self.entries[key] = (value, size)
+                self.n_bytes += size
+                self.evict()
+        return value
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits its limits, the lock being held
+        """
+        while len(self.entries) > self.max_entries or self.n_bytes > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.n_bytes -= size
+            self.counters['evictions'] += 1
+
+    def invalidate(self) -> None:
+        """
+        Empties the cache
+        """
+        with self.lock:
+            self.entries.clear()
+            self.n_bytes = 0
+            self.generation += 1
+            self.counters['invalidations'] += 1
+
+    def stats(self) -> dict:
+        """
+        Counters of the cache, with its number of entries and size in bytes
+        """
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.n_bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes)
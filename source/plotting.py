@@ -1,11 +1,10 @@
-import pickle
-import json
-import os
 import pandas as pd
 import numpy as np
 
 import plotly.graph_objects as go
 from plotly.colors import label_rgb, n_colors
+from source.geometry import load_geojson
+from source.aggregation import top_k
 
 """
 Functions used to plot the charts at the launching of the web app. 
@@ -13,35 +12,28 @@ Their successive modification will be done by a `update` method.
 """
 
 # Geography - geojson handling
+# the map is drawn at zoom 6.95 : the borders are simplified to stay accurate when zoomed in up to GEOMETRY_ZOOM
+GEOMETRY_ZOOM = 9
+
+
 def load_swiss_borders_df(DATA_DIR):
     """
-    Load the longitude and latitude of Swiss municipalities
+    Load the longitude and latitude of the Swiss borders, simplified and quantized (see geometry.py)
     :param DATA_DIR: data folder directory
-    :return: pd.DataFrame of lon and lat for each municipality
+    :return: pd.DataFrame of lon and lat of the border points
     """
-    JSON_PATH = DATA_DIR + '/Switzerland.geojson'
-    if 'swiss_borders.p' not in os.listdir(DATA_DIR):
-        with open(JSON_PATH, 'r') as j:
-            swiss_borders = json.loads(j.read())
-        df_borders = pd.DataFrame(data={'lat': [np.array(feature["geometry"]["coordinates"][0])[:, 1] for feature in
-                                                swiss_borders['features']][0],
-                                        'lon': [np.array(feature["geometry"]["coordinates"][0])[:, 0] for feature in
-                                                swiss_borders['features']][0]})
-        pickle.dump(df_borders, open(DATA_DIR + '/df_swiss_borders.p', 'wb'))
-        return df_borders
-    else:
-        return pickle.load(open(DATA_DIR + '/df_swiss_borders.p', 'rb'))
+    swiss_borders = load_geojson(DATA_DIR + '/Switzerland.geojson', GEOMETRY_ZOOM)
+    border = np.array(swiss_borders['features'][0]['geometry']['coordinates'][0])
+    return pd.DataFrame(data={'lat': border[:, 1], 'lon': border[:, 0]})
 
 
 def load_swiss_canton_geojson(DATA_DIR):
     '''
     :param DATA_DIR: data folder directory
-    :return: the geojson dict of the cantons' borders
+    :return: the geojson dict of the cantons' borders, simplified and quantized (see geometry.py), holding only
+    the `NAME` of the cantons
     '''
-    JSON_PATH = DATA_DIR + '/SwissCanton.geojson'
-    with open(JSON_PATH, 'r') as j:
-        swiss_canton_geojson = json.loads(j.read())
-    return swiss_canton_geojson
+    return load_geojson(DATA_DIR + '/SwissCanton.geojson', GEOMETRY_ZOOM, properties=['NAME'])
 
 
 def draw_canton_and_bubble_chart(job_function, df_count_city, df_count_canton,
@@ -117,17 +109,17 @@ def draw_canton_and_bubble_chart(job_function, df_count_city, df_count_canton,
     return fig_map
 
 
-def draw_pie_chart(df_jobs, bar_plot_height) -> go.Figure:
+def draw_pie_chart(function_matrix, bar_plot_height) -> go.Figure:
     """
     Creates the pie chart
 
     Inputs:
-    - df_jobs : pd.DataFrame containing the raw information about jobs web pages
+    - function_matrix : FunctionMatrix of the job functions of the jobs
     - bar_plot_height : int defining the height unit used for HTML rendering
 
     Returns a go.Figure
     """
-    df_job_function = df_jobs[df_jobs.columns[5:]].sum()
+    df_job_function = function_matrix.sum()
 
     colors = [label_rgb(c) for c in n_colors((200, 27, 18), (113, 15, 11), df_job_function.shape[0])]
     fig_pie = go.Figure(go.Pie(labels=df_job_function.index,
@@ -141,7 +133,8 @@ def draw_pie_chart(df_jobs, bar_plot_height) -> go.Figure:
     return fig_pie
 
 
-def draw_bar_charts(df_count_city, df_count_canton, job_function, bar_plot_height) -> [go.Figure, go.Figure]:
+def draw_bar_charts(df_count_city, df_count_canton, job_function, bar_plot_height,
+                    n_cities=10) -> [go.Figure, go.Figure]:
     """
     Draw the two bar charts.
 
@@ -150,12 +143,14 @@ def draw_bar_charts(df_count_city, df_count_canton, job_function, bar_plot_heigh
      df_count_canton: pd.DataFrame, nbr of jobs per canton
      job_function: str, job function
      bar_plot_height: int, the height of the bar plots
+     n_cities: int, number of cities of the city bar chart
 
     Returns two go.Figures
     """
     # bar chart for cantons
     # ordering job numbers in decreasing order
-    df_canton = df_count_canton[['canton', 'Name', job_function]].sort_values(job_function, ascending=False)
+    df_canton = df_count_canton[['canton', 'Name', job_function]]
+    df_canton = df_canton.iloc[top_k(df_canton[job_function].values, len(df_canton))]
     fig_Canton_bar = go.Figure(go.Bar(y=df_canton[job_function], x=df_canton['canton'],
                                       customdata=df_canton['Name'],
                                       marker={'color': 'rgb(220,30,20)'},
@@ -166,9 +161,10 @@ def draw_bar_charts(df_count_city, df_count_canton, job_function, bar_plot_heigh
                                        'yaxis': {'gridcolor': 'rgb(250,205,214)'},
                                        'height': bar_plot_height})
 
-    # get the top 10 most represented cities by job function
-    df_top_10_city = df_count_city[['municipality', job_function]].sort_values(job_function, ascending=False)[:10]
-    fig_city_bar = go.Figure(go.Bar(y=df_top_10_city[job_function], x=df_top_10_city['municipality'],
+    # get the `n_cities` most represented cities by job function
+    df_top_city = df_count_city[['municipality', job_function]]
+    df_top_city = df_top_city.iloc[top_k(df_top_city[job_function].values, n_cities)]
+    fig_city_bar = go.Figure(go.Bar(y=df_top_city[job_function], x=df_top_city['municipality'],
                                     marker={'color': 'rgb(220,30,20)'},
                                     hovertemplate='%{y} jobs<extra></extra>',
                                     showlegend=False),
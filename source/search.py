@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import html
+import hashlib
+import unicodedata
+from array import array
+import numpy as np
+import pandas as pd
+from source.sparse import FunctionMatrix
+from source.storage import load_content, load_jobs, load_keys, content_keys
+
+"""
+Full-text search over the scrapped job descriptions.
+The `content` html of every job is stripped of its tags, folded (lower case, accents removed) and split into words,
+the stopwords of German, French, Italian and English being dropped. The inverted index maps each word (term) to the
+sorted ids of the documents containing it. Each postings list is stored as the gaps between consecutive ids,
+encoded as varints (7 bits per byte, the high bit flagging a following byte) : most gaps fit in a single byte.
+
+A query is a list of words, all of them being required (a trailing `*` matches every term starting with the word) :
+the shortest postings list is decoded first and only its documents are looked up in the longer ones.
+The index keeps the city, canton, date and job functions of the job of each document, so that the web app can count
+the matching jobs without the job dataframe.
+
+The index is built offline into `<DATA_DIR>/search_index.npz` : python -m source.search ./Data/
+"""
+
+SEARCH_INDEX = 'search_index.npz'
+VARINT_CHUNK = 2 ** 20
+
+TAG = re.compile(r'<[^>]*>')
+COMBINING = re.compile('[\u0300-\u036f]')
+WORD = re.compile(r'[^\W_]+')
+QUERY_TERM = re.compile(r'([^\W_]+)(\*?)')
+
+# folded (lower case, no accents) - `it` is kept for the IT jobs
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+if in into is its itself just me more most my no nor not now of off on once only or other our ours out over own same
+she should so some such than that the their them then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you your yours
+
+aber alle allem allen aller alles als also am an andere anderen auch auf aus bei bin bis bist da damit dann das dass
+dem den denn der des dich die dies diese diesem diesen dieser dieses dir doch dort du durch ein eine einem einen
+einer eines er es etwas euch euer fur gegen hab habe haben hat hatte ich ihm ihn ihnen ihr ihre ihrem ihren ihrer im
+in indem ins ist jede jedem jeden jeder jedes jetzt kann kein keine konnen man mein meine mit muss nach nicht nichts
+noch nun nur ob oder ohne sehr sein seine sich sie sind so sollte sondern sonst uber um und uns unser unsere unter
+vom von vor war waren warum was weil welche wenn werden wie wir wird wo zu zum zur zwischen
+
+afin ainsi au aux avec ce ceci cela celle celles celui ces cet cette ceux chez comme dans de des donc dont du elle
+elles en entre est et etre eux il ils je la le les leur leurs lui ma mais me meme mes moi mon ne nos notre nous on
+ou par pas plus pour qu que quel quelle qui sa sans se ses son sont sous sur ta te tes toi ton tres tu un une vos
+votre vous
+
+ad agli ai al alla alle allo anche che chi ci come con da dal dalla dalle dei del della delle dello di ed essere gli
+ha hanno il io la le lei lo loro lui ma mi ne nei nel nella nelle noi non per piu quale quando questa questo se si
+sia sono su sua sue suo tra tutti tutto una uno voi vostro
+""".split())
+
+
+def strip_html(content) -> str:
+    """
+    Text of an html page : tags removed and entities unescaped
+    """
+    return html.unescape(TAG.sub(' ', content))
+
+
+def fold(text) -> str:
+    """
+    Lower case text without accents
+    """
+    return COMBINING.sub('', unicodedata.normalize('NFKD', text.casefold()))
+
+
+def tokenize(content) -> list:
+    """
+    Words of an html page, folded, without the stopwords and the single characters
+    """
+    return [word for word in WORD.findall(fold(strip_html(content))) if len(word) > 1 and word not in STOPWORDS]
+
+
+def query_terms(query) -> tuple:
+    """
+    Sorted distinct terms of a query, the prefix terms ending with `*`. The stopwords are ignored.
+    """
+    if not query:
+        return ()
+    return tuple(sorted({word + star for word, star in QUERY_TERM.findall(fold(query))
+                         if len(word) > 1 and (star or word not in STOPWORDS)}))
+
+
+def encode_varints(values) -> [np.ndarray, np.ndarray]:
+    """
+    Varint encoding of non-negative integers : 7 bits per byte, least significant first, the high bit being set on
+    every byte but the last one of a value
+
+    Returns the uint8 np.ndarray of the encoded values and the number of bytes of each value
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        n_bytes += values >= np.uint64(1 << shift)
+    encoded = []
+    # by chunks, the (values, bytes) matrix being bounded
+    for start in range(0, len(values), VARINT_CHUNK):
+        chunk, chunk_bytes = values[start:start + VARINT_CHUNK], n_bytes[start:start + VARINT_CHUNK]
+        positions = np.arange(chunk_bytes.max())
+        groups = (chunk[:, None] >> (7 * positions).astype(np.uint64)) & np.uint64(0x7f)
+        groups |= (positions < chunk_bytes[:, None] - 1).astype(np.uint64) << np.uint64(7)
+        encoded.append(groups[positions < chunk_bytes[:, None]].astype(np.uint8))
+    return (np.concatenate(encoded) if encoded else np.zeros(0, dtype=np.uint8)), n_bytes
+
+
+def decode_varints(buffer) -> np.ndarray:
+    """
+    Integers (int64) of a varint encoded buffer, see `encode_varints`
+    """
+    buffer = np.asarray(buffer, dtype=np.uint8)
+    ends = np.flatnonzero(buffer < 0x80)
+    if len(ends) == len(buffer):  # single byte values
+        return buffer.astype(np.int64)
+    starts = np.zeros(len(ends), dtype=np.int64)
+    starts[1:] = ends[:-1] + 1
+    shifts = 7 * (np.arange(len(buffer)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((buffer & 0x7f).astype(np.int64) << shifts, starts)
+
+
+def intersect_sorted(doc_ids, other) -> np.ndarray:
+    """
+    Ids of `doc_ids` also in `other`, both being sorted without duplicates
+    """
+    if not len(other):
+        return other
+    positions = np.minimum(np.searchsorted(other, doc_ids), len(other) - 1)
+    return doc_ids[other[positions] == doc_ids]
+
+
+class SearchIndex:
+    """
+    Inverted index of the job descriptions.
+
+    Inputs:
+     - terms : sorted str np.ndarray, vocabulary of the index
+     - term_ptr : int64 np.ndarray of length n_terms + 1, offsets of the postings of each term in `postings`
+     - doc_freq : int32 np.ndarray, number of documents of each term
+     - postings : uint8 np.ndarray, gaps between the document ids of each term, varint encoded
+     - df_docs : pd.DataFrame with the `city`, `canton` and `date` of the job of each document
+     - function_matrix : FunctionMatrix of the job functions of each document
+     - version : str, fingerprint of the indexed documents
+    """
+
+    def __init__(self, terms, term_ptr, doc_freq, postings, df_docs, function_matrix, version=None):
+        self.terms = np.asarray(terms, dtype=str)
+        self.term_ptr = np.asarray(term_ptr, dtype=np.int64)
+        self.doc_freq = np.asarray(doc_freq, dtype=np.int32)
+        self.postings = np.asarray(postings, dtype=np.uint8)
+        self.df_docs = df_docs
+        self.function_matrix = function_matrix
+        self.function_index = {function: code for code, function in enumerate(function_matrix.functions)}
+        self.version = version
+
+    @classmethod
+    def build(cls, contents, df_docs, function_matrix) -> 'SearchIndex':
+        """
+        Indexes the html `contents` of the documents, df_docs and function_matrix being aligned with them
+        """
+        vocabulary = {}  # term --> id, in order of appearance
+        term_ids = array('i')
+        lengths = np.zeros(len(df_docs), dtype=np.int64)
+        for doc, content in enumerate(contents):
+            words = set(tokenize(content)) if isinstance(content, str) else ()
+            term_ids.extend([vocabulary.setdefault(word, len(vocabulary)) for word in words])
+            lengths[doc] = len(words)
+
+        # terms sorted so that a prefix matches a range of terms
+        terms = np.array(list(vocabulary), dtype=str)
+        order = np.argsort(terms)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[order] = np.arange(len(terms))
+        term_ids = rank[np.frombuffer(term_ids, dtype=np.int32) if term_ids else np.zeros(0, dtype=np.int32)]
+
+        # (term, document) pairs, grouped by term - the documents stay sorted within a term
+        doc_ids = np.repeat(np.arange(len(lengths)), lengths)
+        by_term = np.argsort(term_ids, kind='stable')
+        term_ids, doc_ids = term_ids[by_term], doc_ids[by_term]
+        doc_freq = np.bincount(term_ids, minlength=len(terms))
+        firsts = np.zeros(len(terms), dtype=np.int64)
+        np.cumsum(doc_freq[:-1], out=firsts[1:])
+
+        # first document of each term, then the gaps
+        gaps = np.diff(doc_ids, prepend=0)
+        gaps[firsts] = doc_ids[firsts]
+        postings, n_bytes = encode_varints(gaps)
+        term_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, weights=n_bytes, minlength=len(terms)).astype(np.int64), out=term_ptr[1:])
+        version = hashlib.sha1(postings.tobytes())
+        version.update(pd.util.hash_pandas_object(df_docs, index=False).values.tobytes())
+        version.update(function_matrix.indptr.tobytes() + function_matrix.indices.tobytes())
+        return cls(terms[order], term_ptr, doc_freq, postings, df_docs, function_matrix, version.hexdigest())
+
+    def __len__(self):
+        return len(self.df_docs)
+
+    def term_range(self, term) -> [int, int]:
+        """
+        Range of the terms matching a query term : the term itself, or the terms starting with a prefix term
+        """
+        if term.endswith('*'):
+            prefix = term[:-1]
+            return tuple(np.searchsorted(self.terms, [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]))
+        begin = np.searchsorted(self.terms, term)
+        return begin, begin + int(begin < len(self.terms) and self.terms[begin] == term)
+
+    def term_postings(self, begin, end) -> np.ndarray:
+        """
+        Sorted ids of the documents containing any of the terms of the range [begin, end[
+        """
+        doc_ids = np.cumsum(decode_varints(self.postings[self.term_ptr[begin]:self.term_ptr[end]]))
+        if end - begin > 1:
+            # the first id of each term is not a gap
+            counts = self.doc_freq[begin:end]
+            lasts = np.cumsum(counts)[:-1] - 1
+            doc_ids -= np.repeat(np.concatenate([[0], doc_ids[lasts]]), counts)
+            doc_ids = np.unique(doc_ids)
+        return doc_ids
+
+    def search(self, query) -> np.ndarray:
+        """
+        Sorted ids of the documents containing all the terms of `query`, None if the query has no term
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        # shortest postings first
+        ranges = sorted(map(self.term_range, terms), key=lambda r: self.term_ptr[r[1]] - self.term_ptr[r[0]])
+        doc_ids = self.term_postings(*ranges[0])
+        for begin, end in ranges[1:]:
+            if not len(doc_ids):
+                break
+            doc_ids = intersect_sorted(doc_ids, self.term_postings(begin, end))
+        return doc_ids
+
+    def with_function(self, doc_ids, job_function) -> np.ndarray:
+        """
+        Ids of `doc_ids` whose job has the function `job_function`
+        """
+        code = self.function_index.get(job_function)
+        if code is None:
+            return doc_ids[:0]
+        matrix = self.function_matrix.take(doc_ids)
+        return doc_ids[np.unique(matrix.row_ids()[matrix.indices == code])]
+
+    def save(self, path) -> str:
+        """
+        Writes the index to an .npz file, the file being replaced only once complete
+        """
+        arrays = {'terms': self.terms, 'term_ptr': self.term_ptr, 'doc_freq': self.doc_freq,
+                  'postings': self.postings, 'dates': self.df_docs['date'].values.astype('datetime64[D]'),
+                  'indptr': self.function_matrix.indptr, 'indices': self.function_matrix.indices,
+                  'functions': np.array(self.function_matrix.functions, dtype=str), 'version': np.array(self.version)}
+        for column in ('city', 'canton'):
+            codes, categories = pd.factorize(self.df_docs[column].astype(str))
+            arrays[column + '_codes'] = codes.astype(np.int32)
+            arrays[column + '_categories'] = np.array(categories, dtype=str)
+        tmp_path = path + '.{}.tmp.npz'.format(os.getpid())
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'SearchIndex':
+        """
+        Reads an index written by `save`
+        """
+        with np.load(path) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        df_docs = pd.DataFrame({column: pd.Categorical.from_codes(arrays[column + '_codes'],
+                                                                  categories=arrays[column + '_categories'])
+                                for column in ('city', 'canton')})
+        df_docs['date'] = arrays['dates']
+        function_matrix = FunctionMatrix(arrays['indptr'], arrays['indices'], arrays['functions'].tolist())
+        return cls(arrays['terms'], arrays['term_ptr'], arrays['doc_freq'], arrays['postings'], df_docs,
+                   function_matrix, str(arrays['version']))
+
+
+def document_functions(doc_keys, DATA_DIR) -> FunctionMatrix:
+    """
+    Job functions of the documents, read from the stored job of the same key (none if the job is not stored)
+    """
+    stored_keys = load_keys(DATA_DIR)
+    rows = pd.Index(stored_keys).get_indexer(doc_keys) if len(stored_keys) else np.full(len(doc_keys), -1)
+    if not (rows >= 0).any():
+        return FunctionMatrix.from_coordinates(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                                               len(doc_keys), [])
+    _, function_matrix = load_jobs(DATA_DIR, columns=[])
+    matrix = function_matrix.take(np.maximum(rows, 0))
+    row_ids = matrix.row_ids()
+    stored = rows[row_ids] >= 0
+    return FunctionMatrix.from_coordinates(row_ids[stored], matrix.indices[stored], len(doc_keys), matrix.functions)
+
+
+def build_index(DATA_DIR) -> SearchIndex:
+    """
+    Indexes the stored job descriptions, one document per job
+    """
+    df_content = load_content(DATA_DIR)
+    if df_content.empty:
+        df_content = pd.DataFrame(columns=['title', 'company', 'city', 'canton', 'date', 'content'])
+    df_docs = df_content[['city', 'canton']].fillna('unknown')
+    df_docs['date'] = pd.to_datetime(df_content['date'], dayfirst=True).dt.normalize()
+    doc_keys = content_keys(df_content)
+    # a job described several times is indexed with its most recent description
+    is_first = ~pd.Series(doc_keys).duplicated().values
+    df_docs, doc_keys = df_docs[is_first].reset_index(drop=True), doc_keys[is_first]
+    return SearchIndex.build(df_content['content'].values[is_first], df_docs, document_functions(doc_keys, DATA_DIR))
+
+
+def load_index(DATA_DIR) -> SearchIndex:
+    """
+    Loads the search index of `DATA_DIR`, None if it was not built
+    """
+    path = os.path.join(DATA_DIR, SEARCH_INDEX)
+    return SearchIndex.load(path) if os.path.exists(path) else None
+
+
+if __name__ == '__main__':
+    DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else './Data/'
+    search_index = build_index(DATA_DIR)
+    print('{} documents, {} terms - index written to {}'.format(
+        len(search_index), len(search_index.terms), search_index.save(os.path.join(DATA_DIR, SEARCH_INDEX))))
@@ -0,0 +1,212 @@
+import gzip
+import json
+import hashlib
+import threading
+import brotli
+import flask
+import plotly.utils
+from source.payload_cache import PayloadCache
+from source.metrics import Metrics
+
+"""
+Compressed and cached HTTP responses of the web app.
+ - The layout (`/_dash-layout`), which carries the initial figures, only changes with the data : it is serialized
+   once, compressed once per encoding (brotli and gzip, at their highest levels) at the first request of the
+   encoding, and served with an ETag derived from the dataset version, so that browsers revalidate it and get a
+   `304 Not Modified` instead of the whole layout.
+ - The callback responses (`/_dash-update-component`) are pure functions of the request body (inputs and
+   `view-state`) : they are compressed with the encoding accepted by the browser and the compressed bytes are kept
+   in a bounded PayloadCache keyed by the hash of the request body and the encoding, so that the common views are
+   neither recomputed nor recompressed.
+The other routes (index, scripts) are left to Flask-Compress, set up by Dash.
+The callback requests are timed (phases `request`, `dispatch` - the Dash callback with the (de)serialization of its
+inputs and outputs - and `compress`), their sizes and cache hits recorded in a Metrics (see metrics.py), labelled by
+their trigger if it is an input of the callbacks. A request profiled by a Profiler (armed, or sent with the
+`X-Profile` header) skips the cache.
+"""
+
+ENCODINGS = ['br', 'gzip']  # by order of preference
+MIN_SIZE = 500  # bytes, smaller bodies are sent uncompressed
+
+
+def compress(body, encoding, fast=True) -> bytes:
+    """
+    Compresses `body` with `encoding` ('br', 'gzip' or 'identity'), `fast` for the bodies compressed per request
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=4 if fast else 11)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6 if fast else 9)
+    return body
+
+
+def choose_encoding(accept_encoding) -> str:
+    """
+    Preferred encoding of ENCODINGS accepted by a client, from its `Accept-Encoding` header, 'identity' if none
+    """
+    qualities = {}
+    for part in accept_encoding.lower().split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                pass
+        qualities[name.strip()] = quality
+    accepted = [encoding for encoding in ENCODINGS if qualities.get(encoding, qualities.get('*', 0)) > 0]
+    if not accepted:
+        return 'identity'
+    return max(accepted, key=lambda encoding: qualities.get(encoding, qualities.get('*', 0)))
+
+
+def callback_inputs(app) -> set:
+    """
+    Ids of the components whose properties are inputs of the callbacks of a Dash app
+    """
+    return {dependency['id'] for callback in app._callback_list for dependency in callback['inputs']}
+
+
+def compressed_response(body, encoding, mimetype='application/json') -> flask.Response:
+    """
+    Response carrying `body`, already compressed with `encoding`
+    """
+    response = flask.Response(body, mimetype=mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+class StaticBody:
+    """
+    Body compressed once with each encoding of ENCODINGS, at the first request of the encoding : the compression at
+    the highest level is kept out of the boot of the web process.
+
+    Inputs:
+     - body : bytes
+     - version : str, identifying the body, used as its ETag
+    """
+
+    def __init__(self, body, version):
+        self.encoded = {'identity': body}
+        self.etag = version
+        self.lock = threading.Lock()
+
+    def encode(self, encoding) -> bytes:
+        """
+        Body compressed with `encoding`, compressed on the first call
+        """
+        if encoding not in self.encoded:
+            with self.lock:
+                if encoding not in self.encoded:
+                    self.encoded[encoding] = compress(self.encoded['identity'], encoding, fast=False)
+        return self.encoded[encoding]
+
+    def response(self, request) -> flask.Response:
+        """
+        Response to `request` : `304 Not Modified` if the client already has this version, otherwise the body in
+        the encoding preferred by the client
+        """
+        if self.etag in request.if_none_match:
+            response = flask.Response(status=304)
+            response.headers['Vary'] = 'Accept-Encoding'
+        else:
+            encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+            if len(self.encoded['identity']) < MIN_SIZE:
+                encoding = 'identity'
+            response = compressed_response(self.encode(encoding), encoding)
+        response.set_etag(self.etag)
+        # cached by the browser but revalidated at each load
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+class ResponseCache:
+    """
+    Serves the layout and the callbacks of a Dash app with compressed and cached responses.
+
+    Inputs:
+     - app : dash.Dash, its layout and callbacks defined
+     - dataset_version : str identifying the data shown by the app (see snapshot.fingerprint), the ETag of the
+       layout is derived from it and from the layout content
+     - cache_entries, cache_bytes : limits of the cache of compressed callback responses
+     - metrics : Metrics recording the timings, sizes and cache hits of the callbacks
+     - profiler : optional Profiler of the callback requests
+
+    `invalidate` discards the cached callback responses (the layout is kept), e.g. to measure cold callbacks.
+    """
+
+    def __init__(self, app, dataset_version=None, cache_entries=1024, cache_bytes=32 * 2 ** 20, metrics=None,
+                 profiler=None):
+        self.app = app
+        self.metrics = metrics or Metrics()
+        self.profiler = profiler
+        self.callbacks = PayloadCache(cache_entries, cache_bytes, sizeof=lambda response: len(response[1]))
+        # the triggers sent by the browsers are only metric labels if they are inputs of the callbacks
+        self.metrics.add_triggers(callback_inputs(app))
+        self.layout = self.build_layout(dataset_version)
+
+        prefix = app.config.routes_pathname_prefix
+        self.dispatch = app.server.view_functions[prefix + '_dash-update-component']
+        app.server.view_functions[prefix + '_dash-layout'] = lambda: self.layout.response(flask.request)
+        app.server.view_functions[prefix + '_dash-update-component'] = self.serve_callback
+
+    def build_layout(self, dataset_version) -> StaticBody:
+        """
+        Serializes and compresses the layout of the app
+        """
+        body = json.dumps(self.app._layout_value(), cls=plotly.utils.PlotlyJSONEncoder).encode()
+        version = hashlib.sha1(body).hexdigest()[:16]
+        if dataset_version:
+            version = '{}-{}'.format(dataset_version[:16], version)
+        return StaticBody(body, version)
+
+    def serve_callback(self) -> flask.Response:
+        """
+        Response of a callback request, computed and compressed once per request body and encoding.
+        A callback that does not update (`PreventUpdate`) or fails raises before anything is cached.
+        """
+        encoding = choose_encoding(flask.request.headers.get('Accept-Encoding', ''))
+        changed = (flask.request.get_json(silent=True) or {}).get('changedPropIds') or ['none']
+        callb_id = self.metrics.trigger_label(changed[0].split('.')[0])
+
+        with self.metrics.trigger(callb_id), self.metrics.phase('request'):
+            if self.profiler is not None and (self.profiler.take() or 'X-Profile' in flask.request.headers):
+                mimetype, body, encoding = self.profiler.run(callb_id, lambda: self.compute_callback(encoding))
+            else:
+                key = (hashlib.sha1(flask.request.get_data()).digest(), encoding)
+                computed = []
+                mimetype, body, encoding = self.callbacks.get_or_compute(
+                    key, lambda: computed.append(True) or self.compute_callback(encoding))
+                self.metrics.count('cache_lookups_total', cache='response', view='callback',
+                                   result='miss' if computed else 'hit')
+            self.metrics.count('response_bytes_total', len(body), encoding=encoding)
+            return compressed_response(body, encoding, mimetype=mimetype)
+
+    def compute_callback(self, encoding) -> tuple:
+        """
+        Runs the callback of the current request, returns the mimetype, body and encoding of its response
+        """
+        with self.metrics.phase('dispatch'):
+            response = flask.make_response(self.dispatch())
+        body = response.get_data()
+        if len(body) < MIN_SIZE:
+            encoding = 'identity'
+        with self.metrics.phase('compress'):
+            body = compress(body, encoding)
+        return response.mimetype, body, encoding
+
+    def invalidate(self) -> None:
+        """
+        Discards the cached callback responses
+        """
+        self.callbacks.invalidate()
+
+    def stats(self) -> dict:
+        """
+        Counters of the callback response cache, with the sizes of the layout in each encoding served so far
+        """
+        return dict(self.callbacks.stats(),
+                    layout={encoding: len(body) for encoding, body in self.layout.encoded.items()},
+                    layout_etag=self.layout.etag)
@@ -0,0 +1,163 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from source.storage import list_parts, load_jobs, CLUSTER_COLUMN
+from source.locations import Locations
+from source.aggregation import JobCube
+from source.charts_manager import ChartsManager
+
+"""
+Prepared state of the web app.
+Building the app means loading the jobs, counting them and drawing the initial figures (geometries included),
+which needs pandas and plotly.graph_objects. The build step does it once and stores the result in a single
+artifact, `<DATA_DIR>/app_snapshot.npz` :
+ - the arrays of the JobCube, every job function computed, and of the JobCube of the distinct offers (each
+   near-duplicate cluster counted once, see dedup.py),
+ - the locations (city coordinates and canton names),
+ - the initial figures, as JSON,
+ - the slider marks and dropdown options of the layout, as JSON.
+The web process only loads the artifact. It is rebuilt when the jobs, their clusters or the source files change,
+or when the artifact format changes (SNAPSHOT_VERSION).
+Build command, run from the repository root : python -m source.snapshot ./Data/
+"""
+
+SNAPSHOT = 'app_snapshot.npz'
+SNAPSHOT_VERSION = 2
+SOURCE_FILES = ['df_city_coordinates.csv', 'canton_naming.csv', 'Switzerland.geojson', 'SwissCanton.geojson',
+                'mapbox_token.txt']
+GRAPH_IDS = ['Swiss-Employment-Map', 'fun-pie', 'Canton_bar', 'city_bar']
+BAR_PLOT_HEIGHT = 150
+
+
+class Snapshot:
+    """
+    Prepared state of the web app.
+
+    Inputs:
+     - job_cube : JobCube with every job function computed
+     - figures : dict of the initial figure dicts, keyed by the ids of their dcc.Graph
+     - layout_options : dict of the slider marks and dropdown options (see ChartsManager.layout_options)
+     - version : fingerprint of the data the snapshot was built from, if known
+     - dedup_cube : optional JobCube of the distinct offers, on the axes of job_cube
+    """
+
+    def __init__(self, job_cube, figures, layout_options, version=None, dedup_cube=None):
+        self.job_cube = job_cube
+        self.dedup_cube = dedup_cube
+        self.figures = figures
+        self.layout_options = layout_options
+        self.version = version
+
+
+def fingerprint(DATA_DIR) -> str:
+    """
+    Hash of the data of the app : names of the parts of the job dataset (a part is never modified, except its
+    near-duplicate clusters that can be added later) and content of the source files
+    """
+    digest = hashlib.sha1('version {}'.format(SNAPSHOT_VERSION).encode())
+    for part in list_parts(DATA_DIR):
+        digest.update(os.path.relpath(part, DATA_DIR).encode())
+        digest.update(str(os.path.exists(os.path.join(part, CLUSTER_COLUMN + '.npy'))).encode())
+    for name in SOURCE_FILES:
+        with open(os.path.join(DATA_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_snapshot(DATA_DIR) -> Snapshot:
+    """
+    Loads the jobs, counts them and draws the initial figures
+    """
+    # imported here : the web process only draws the figures when the snapshot is missing or outdated
+    from source.plotting import draw_canton_and_bubble_chart, draw_pie_chart, draw_bar_charts
+
+    df_city_coordinates = pd.read_csv(os.path.join(DATA_DIR, 'df_city_coordinates.csv'))
+    df_canton_naming = pd.read_csv(os.path.join(DATA_DIR, 'canton_naming.csv'), index_col='Idx')
+    # integer codes of the cities and cantons, shared by all the aggregations
+    locations = Locations(df_city_coordinates, df_canton_naming)
+    # only the columns used by the charts are read from the columnar dataset
+    df_jobs, function_matrix = load_jobs(DATA_DIR, columns=['city', 'canton', 'date', CLUSTER_COLUMN])
+    job_cube = JobCube(df_jobs, function_matrix, locations, lazy=False)
+    dedup_cube = JobCube.distinct_offers(df_jobs, function_matrix, job_cube, lazy=False)
+    df_count_city, df_count_canton = job_cube.city_canton_frames((0, len(job_cube.dates) - 1), columns=['All Jobs'])
+
+    scale_bubble = 1
+    job_function = 'All Jobs'
+    fig_map = draw_canton_and_bubble_chart(job_function, df_count_city, df_count_canton, scale_bubble, DATA_DIR,
+                                           BAR_PLOT_HEIGHT)
+    fig_pie = draw_pie_chart(function_matrix, BAR_PLOT_HEIGHT)
+    fig_Canton_bar, fig_city_bar = draw_bar_charts(df_count_city, df_count_canton, job_function, BAR_PLOT_HEIGHT)
+
+    figures = {graph_id: figure.to_plotly_json()
+               for graph_id, figure in zip(GRAPH_IDS, [fig_map, fig_pie, fig_Canton_bar, fig_city_bar])}
+    return Snapshot(job_cube, figures, ChartsManager.layout_options(job_cube), dedup_cube=dedup_cube)
+
+
+def save_snapshot(snapshot, DATA_DIR, key=None) -> str:
+    """
+    Writes the snapshot to `<DATA_DIR>/app_snapshot.npz`, the file being replaced only once complete
+
+    Returns the path of the snapshot
+    """
+    # imported here : only the build step serializes the figure objects
+    import plotly.utils
+    locations = snapshot.job_cube.locations
+    arrays = {'cube_' + name: array for name, array in snapshot.job_cube.to_arrays().items()}
+    if snapshot.dedup_cube is not None:
+        arrays.update({'dedup_' + name: array for name, array in snapshot.dedup_cube.to_arrays().items()})
+    arrays['fingerprint'] = np.array(key or fingerprint(DATA_DIR))
+    arrays['locations'] = np.array(json.dumps({
+        'cities': locations.df_cities.to_dict(orient='list'),
+        'canton_naming': None if locations.canton_naming is None else
+        locations.canton_naming.to_dict(orient='list')}))
+    arrays['figures'] = np.array(json.dumps(snapshot.figures, cls=plotly.utils.PlotlyJSONEncoder))
+    arrays['layout_options'] = np.array(json.dumps(snapshot.layout_options))
+
+    path = os.path.join(DATA_DIR, SNAPSHOT)
+    tmp_path = path + '.{}.tmp.npz'.format(os.getpid())
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_snapshot(arrays) -> Snapshot:
+    """
+    Restores the snapshot from the arrays of an app_snapshot.npz file
+    """
+    locations = json.loads(str(arrays['locations']))
+    canton_naming = None if locations['canton_naming'] is None else pd.DataFrame(locations['canton_naming'])
+    locations = Locations(pd.DataFrame(locations['cities']), canton_naming)
+    job_cube = JobCube.from_arrays({name[5:]: array for name, array in arrays.items() if name.startswith('cube_')},
+                                   locations)
+    dedup_arrays = {name[6:]: array for name, array in arrays.items() if name.startswith('dedup_')}
+    dedup_cube = JobCube.from_arrays(dedup_arrays, locations) if dedup_arrays else None
+    return Snapshot(job_cube, json.loads(str(arrays['figures'])), json.loads(str(arrays['layout_options'])),
+                    str(arrays['fingerprint']), dedup_cube)
+
+
+def load_snapshot(DATA_DIR) -> Snapshot:
+    """
+    Loads the snapshot of `DATA_DIR`, built (and saved if possible) when missing or outdated
+    """
+    path = os.path.join(DATA_DIR, SNAPSHOT)
+    key = fingerprint(DATA_DIR)
+    if os.path.exists(path):
+        with np.load(path) as npz:
+            if str(npz['fingerprint']) == key:
+                return read_snapshot({name: npz[name] for name in npz.files})
+
+    snapshot = build_snapshot(DATA_DIR)
+    snapshot.version = key
+    try:
+        save_snapshot(snapshot, DATA_DIR, key)
+    except OSError:  # read-only data folder, the snapshot is rebuilt at each start
+        pass
+    return snapshot
+
+
+if __name__ == '__main__':
+    DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else './Data/'
+    print('Snapshot written to {}'.format(save_snapshot(build_snapshot(DATA_DIR), DATA_DIR)))
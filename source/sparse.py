@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+"""
+Sparse representation of the job functions.
+Most jobs have one to three job functions out of ~150 : instead of a dense dummy matrix, the functions of the jobs
+are stored in the compressed sparse row (CSR) layout, i.e. the functions of job `i` are
+`functions[indices[indptr[i]:indptr[i + 1]]]`.
+"""
+
+
+class FunctionMatrix:
+    """
+    Job x job function 0/1 matrix in the CSR layout. Its rows are aligned with the rows of the job dataframe.
+
+    Inputs:
+     - indptr : int64 np.ndarray of length n_jobs + 1, offsets of the rows in `indices`
+     - indices : int16 np.ndarray, job function codes (columns) of the non-zero entries, sorted within each row
+     - functions : list of the job function names (columns)
+    """
+
+    def __init__(self, indptr, indices, functions):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int16)
+        self.functions = list(functions)
+
+    @classmethod
+    def from_lists(cls, job_function_lists) -> 'FunctionMatrix':
+        """
+        Creates the matrix from an iterable of lists of job functions (one list per job), functions sorted by name
+        """
+        job_function_lists = [lst if isinstance(lst, (list, tuple)) else [] for lst in job_function_lists]
+        lengths = np.array([len(lst) for lst in job_function_lists], dtype=np.int64)
+        codes, functions = pd.factorize(pd.Series([f for lst in job_function_lists for f in lst], dtype=object),
+                                        sort=True)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        return cls.from_coordinates(rows, codes, len(lengths), functions)
+
+    @classmethod
+    def from_dense(cls, dense, functions) -> 'FunctionMatrix':
+        """
+        Creates the matrix from a dense (jobs x functions) array or pd.DataFrame of dummies
+        """
+        rows, codes = np.nonzero(np.asarray(dense))
+        return cls.from_coordinates(rows, codes, len(dense), functions)
+
+    @classmethod
+    def from_coordinates(cls, rows, codes, n_rows, functions) -> 'FunctionMatrix':
+        """
+        Creates the matrix from the (row, function code) coordinates of the non-zero entries, duplicates are dropped
+        """
+        flat = np.unique(np.asarray(rows, dtype=np.int64) * len(functions) + codes)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat // max(len(functions), 1), minlength=n_rows), out=indptr[1:])
+        return cls(indptr, flat % max(len(functions), 1), functions)
+
+    @classmethod
+    def concat(cls, matrices) -> 'FunctionMatrix':
+        """
+        Stacks the rows of several matrices, the functions being the union of their functions
+        """
+        functions = pd.Index(pd.unique(np.concatenate([m.functions for m in matrices]))) if matrices else []
+        indptr = [np.zeros(1, dtype=np.int64)]
+        offset = 0
+        for matrix in matrices:
+            indptr.append(matrix.indptr[1:] + offset)
+            offset += matrix.nnz
+        indices = [functions.get_indexer(matrix.functions)[matrix.indices] for matrix in matrices]
+        return cls(np.concatenate(indptr), np.concatenate(indices) if indices else [], list(functions))
+
+    @property
+    def nnz(self) -> int:
+        return int(self.indptr[-1])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def row_ids(self) -> np.ndarray:
+        """
+        Row (job) of each non-zero entry
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+    def take(self, rows) -> 'FunctionMatrix':
+        """
+        Selects rows from a boolean mask or an array of row indexes
+        """
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        starts, lengths = self.indptr[rows], np.diff(self.indptr)[rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        entries = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return FunctionMatrix(indptr, self.indices[entries], self.functions)
+
+    def select(self, functions) -> 'FunctionMatrix':
+        """
+        Keeps only the columns of `functions` (in this order), a function that is not a column has no jobs
+        """
+        idx = pd.Index(self.functions).get_indexer(functions)
+        keep = idx >= 0  # -1 : unknown function
+        mapping = np.full(len(self.functions), -1, dtype=np.int64)
+        mapping[idx[keep]] = np.arange(len(functions))[keep]
+        codes = mapping[self.indices]
+        kept = codes >= 0
+        return FunctionMatrix.from_coordinates(self.row_ids()[kept], codes[kept], len(self), functions)
+
+    def sum(self) -> pd.Series:
+        """
+        Number of jobs per function
+        """
+        return pd.Series(np.bincount(self.indices, minlength=len(self.functions)), index=self.functions)
+
+    def group_sum(self, groups, n_groups) -> np.ndarray:
+        """
+        Number of jobs per group and function : dense (n_groups x functions) int64 array.
+        Rows whose group is negative are ignored.
+        """
+        entry_groups = np.asarray(groups)[self.row_ids()]
+        kept = entry_groups >= 0
+        flat = entry_groups[kept] * len(self.functions) + self.indices[kept]
+        return np.bincount(flat, minlength=n_groups * len(self.functions)).reshape(n_groups, len(self.functions))
+
+    def to_dense(self, dtype=np.int8) -> np.ndarray:
+        """
+        Dense (jobs x functions) dummy matrix
+        """
+        dense = np.zeros((len(self), len(self.functions)), dtype=dtype)
+        dense[self.row_ids(), self.indices] = 1
+        return dense
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import pickle
+import datetime
+import numpy as np
+import pandas as pd
+from source.sparse import FunctionMatrix
+
+"""
+Columnar on-disk storage of the job dataframe.
+
+The jobs are stored in `<DATA_DIR>/jobs/`, one directory per scrapping date holding one part per scrapping run :
+
+    jobs/2020-12-10/part-000/meta.json      number of rows, categories and job functions of the part
+                             city.npy       int16 codes in meta['categories']['city']
+                             canton.npy     int8 codes in meta['categories']['canton']
+                             title.npy      int32 codes in meta['categories']['title']
+                             company.npy    int32 codes in meta['categories']['company']
+                             date.npy       datetime64[D] publishing dates
+                             indptr.npy     int64 row offsets of the CSR job function matrix
+                             indices.npy    int16 job function codes in meta['functions']
+                             keys.npy       uint64 hash of the job identity, used to drop duplicates
+                             cluster.npy    uint64 key of the first job of the near-duplicate cluster of each job
+                             minhash.npy    uint32 MinHash signatures of the jobs (see dedup.py)
+
+A part is written once and never modified : appending jobs only adds a part. Every column is a plain `.npy`
+file that is memory-mapped at loading time, so the web app only reads the columns it needs. The near-duplicate
+files are only written when the jobs are appended with a NearDuplicates index (or by `python -m source.dedup`), the
+jobs of a part without them being their own cluster.
+
+The job descriptions (`content` html and the job identity) are pickled dataframes appended as parts of
+`<DATA_DIR>/jobs_content/<scrapping date>/`, next to the former `df_jobs_content.p`.
+"""
+
+JOBS_DIR = 'jobs'
+CONTENT_DIR = 'jobs_content'
+LEGACY_CONTENT = 'df_jobs_content.p'
+JOB_COLUMNS = ['title', 'company', 'city', 'canton', 'date']
+CLUSTER_COLUMN = 'cluster'
+CATEGORICAL_COLUMNS = {'title': np.int32, 'company': np.int32, 'city': np.int16, 'canton': np.int8}
+
+
+def job_functions(df_jobs) -> list:
+    """
+    Returns the job function (numeric dummy) columns of a dense job dataframe (pickled df_jobs.p layout)
+    """
+    return [column for column in df_jobs.columns
+            if column not in JOB_COLUMNS and pd.api.types.is_numeric_dtype(df_jobs[column])]
+
+
+def job_keys(df_jobs) -> np.ndarray:
+    """
+    Hash of the identity of each job (title, company, location and publishing date)
+    """
+    df_keys = df_jobs[JOB_COLUMNS].astype(str)
+    return pd.util.hash_pandas_object(df_keys, index=False).values
+
+
+def content_keys(df_content) -> np.ndarray:
+    """
+    Keys of the jobs of job contents (df_jobs_content layout), their identity being normalized as in
+    split_data_frame
+    """
+    df_keys = df_content[['title', 'company', 'city', 'canton']].fillna({'city': 'unknown', 'canton': 'unknown'})
+    df_keys = df_keys.fillna(0)
+    df_keys['date'] = pd.to_datetime(df_content['date'], dayfirst=True).dt.normalize()
+    return job_keys(df_keys)
+
+
+def list_parts(DATA_DIR) -> list:
+    """
+    Returns the directories of all the parts of the dataset, oldest first
+    """
+    jobs_dir = os.path.join(DATA_DIR, JOBS_DIR)
+    if not os.path.isdir(jobs_dir):
+        return []
+    return [os.path.join(jobs_dir, scrap_date, part)
+            for scrap_date in sorted(os.listdir(jobs_dir)) if not scrap_date.startswith('.')
+            for part in sorted(os.listdir(os.path.join(jobs_dir, scrap_date))) if part.startswith('part-')]
+
+
+def load_keys(DATA_DIR) -> np.ndarray:
+    """
+    Keys (see `job_keys`) of the stored jobs, in the order of `load_jobs`
+    """
+    keys = [np.load(os.path.join(part, 'keys.npy'), mmap_mode='r') for part in list_parts(DATA_DIR)]
+    return np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+
+
+def load_part(part) -> pd.DataFrame:
+    """
+    Jobs of a single part (directory), with plain `title`, `company`, `city` and `canton` columns
+    """
+    with open(os.path.join(part, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    data = {column: np.asarray(meta['categories'][column], dtype=object)[np.load(os.path.join(part, column + '.npy'))]
+            for column in CATEGORICAL_COLUMNS}
+    data['date'] = np.load(os.path.join(part, 'date.npy'))
+    return pd.DataFrame(data, columns=JOB_COLUMNS)
+
+
+def append_jobs(df_jobs, function_matrix, DATA_DIR, scrap_date=None, near_duplicates=None, texts=None) -> int:
+    """
+    Appends the jobs that are not already stored as a new part of the dataset
+
+    Inputs:
+     - df_jobs : pd.DataFrame with the `title`, `company`, `city`, `canton` and `date` of the jobs
+     - function_matrix : FunctionMatrix of the job functions, aligned with df_jobs
+     - DATA_DIR : data folder directory
+     - scrap_date : datetime.date of the scrapping run (partitioning key), today by default
+     - near_duplicates : optional NearDuplicates (see dedup.py), assigning the near-duplicate clusters of the jobs
+     - texts : text of each job compared by near_duplicates (see dedup.job_texts), its title and company by default
+
+    Returns the number of jobs written
+    """
+    keys = job_keys(df_jobs)
+    # duplicates within the batch and with the previous parts
+    is_new = ~pd.Series(keys).duplicated().values
+    stored_keys = load_keys(DATA_DIR)
+    if len(stored_keys):
+        is_new &= ~np.isin(keys, stored_keys)
+    df_jobs, function_matrix, keys = df_jobs[is_new], function_matrix.take(is_new), keys[is_new]
+    if df_jobs.empty:
+        return 0
+    if near_duplicates is not None:
+        if texts is None:
+            texts = df_jobs['title'].astype(str) + ' ' + df_jobs['company'].astype(str)
+        else:
+            texts = np.asarray(texts, dtype=object)[is_new]
+        clusters, signatures = near_duplicates.assign(list(texts), keys)
+
+    scrap_date = scrap_date or datetime.date.today()
+    date_dir = os.path.join(DATA_DIR, JOBS_DIR, scrap_date.isoformat())
+    os.makedirs(date_dir, exist_ok=True)
+    part_dir = os.path.join(date_dir, 'part-{:03d}'.format(sum(p.startswith('part-') for p in os.listdir(date_dir))))
+    tmp_dir = os.path.join(date_dir, '.tmp-' + os.path.basename(part_dir))
+    os.makedirs(tmp_dir)
+
+    meta = {'n_rows': len(df_jobs), 'functions': function_matrix.functions, 'categories': {}}
+    for column, dtype in CATEGORICAL_COLUMNS.items():
+        codes, categories = pd.factorize(df_jobs[column].astype(str))
+        meta['categories'][column] = list(categories)
+        np.save(os.path.join(tmp_dir, column + '.npy'), codes.astype(dtype))
+    np.save(os.path.join(tmp_dir, 'date.npy'), pd.to_datetime(df_jobs['date']).values.astype('datetime64[D]'))
+    np.save(os.path.join(tmp_dir, 'indptr.npy'), function_matrix.indptr)
+    np.save(os.path.join(tmp_dir, 'indices.npy'), function_matrix.indices)
+    np.save(os.path.join(tmp_dir, 'keys.npy'), keys)
+    if near_duplicates is not None:
+        np.save(os.path.join(tmp_dir, CLUSTER_COLUMN + '.npy'), clusters)
+        np.save(os.path.join(tmp_dir, 'minhash.npy'), signatures)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # the part only becomes visible once complete
+    os.rename(tmp_dir, part_dir)
+    return len(df_jobs)
+
+
+def load_jobs(DATA_DIR, columns=None, parts=None) -> [pd.DataFrame, FunctionMatrix]:
+    """
+    Loads the stored jobs and their job functions. Only the files of the requested columns are read (memory-mapped).
+
+    Inputs:
+     - DATA_DIR : data folder directory
+     - columns : list of job columns to load (among JOB_COLUMNS and `cluster`), JOB_COLUMNS by default
+     - parts : list of the part directories to load (see `list_parts`), all of them by default
+
+    Returns a pd.DataFrame, with categorical `title`, `company`, `city` and `canton` columns, and the FunctionMatrix
+    of the job functions
+    """
+    columns = JOB_COLUMNS if columns is None else [column for column in JOB_COLUMNS + [CLUSTER_COLUMN]
+                                                   if column in columns]
+    parts = list_parts(DATA_DIR) if parts is None else list(parts)
+    if not parts:
+        return pd.DataFrame(columns=columns), FunctionMatrix(np.zeros(1), [], [])
+    metas = []
+    for part in parts:
+        with open(os.path.join(part, 'meta.json'), 'r') as f:
+            metas.append(json.load(f))
+
+    data = {}
+    for column in columns:
+        if column == CLUSTER_COLUMN:
+            # the jobs of the parts without clusters are their own cluster
+            data[column] = np.concatenate([np.load(os.path.join(part, CLUSTER_COLUMN + '.npy'), mmap_mode='r')
+                                           if os.path.exists(os.path.join(part, CLUSTER_COLUMN + '.npy')) else
+                                           np.load(os.path.join(part, 'keys.npy'), mmap_mode='r') for part in parts])
+            continue
+        arrays = [np.load(os.path.join(part, column + '.npy'), mmap_mode='r') for part in parts]
+        if column == 'date':
+            data[column] = np.concatenate(arrays)
+        else:
+            # codes of each part are translated to the codes of the union of the categories
+            categories = pd.Index(pd.unique(np.concatenate([meta['categories'][column] for meta in metas])))
+            codes = [categories.get_indexer(meta['categories'][column])[array] for meta, array in zip(metas, arrays)]
+            data[column] = pd.Categorical.from_codes(np.concatenate(codes), categories=categories)
+    df_jobs = pd.DataFrame(data, columns=columns)
+
+    function_matrix = FunctionMatrix.concat([FunctionMatrix(np.load(os.path.join(part, 'indptr.npy'), mmap_mode='r'),
+                                                            np.load(os.path.join(part, 'indices.npy'), mmap_mode='r'),
+                                                            meta['functions'])
+                                             for meta, part in zip(metas, parts)])
+    return df_jobs, function_matrix
+
+
+def append_content(df_content, DATA_DIR, scrap_date=None) -> str:
+    """
+    Writes the job contents as a new part of `<DATA_DIR>/jobs_content/<scrap date>/`, the part only becoming
+    visible once complete
+
+    Returns the path of the part
+    """
+    scrap_date = scrap_date or datetime.date.today()
+    date_dir = os.path.join(DATA_DIR, CONTENT_DIR, scrap_date.isoformat())
+    os.makedirs(date_dir, exist_ok=True)
+    path = os.path.join(date_dir, 'part-{:03d}.p'.format(sum(p.startswith('part-') for p in os.listdir(date_dir))))
+    tmp_path = os.path.join(date_dir, '.tmp-' + os.path.basename(path))
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(df_content, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_content(DATA_DIR) -> pd.DataFrame:
+    """
+    Loads the job contents : the former pickled df_jobs_content.p and the parts of `jobs_content/`, most recent
+    first, without duplicates
+    """
+    frames = []
+    content_dir = os.path.join(DATA_DIR, CONTENT_DIR)
+    if os.path.isdir(content_dir):
+        for scrap_date in sorted(os.listdir(content_dir), reverse=True):
+            date_dir = os.path.join(content_dir, scrap_date)
+            for part in sorted((p for p in os.listdir(date_dir) if p.startswith('part-')), reverse=True):
+                frames.append(pickle.load(open(os.path.join(date_dir, part), 'rb')))
+    if os.path.exists(os.path.join(DATA_DIR, LEGACY_CONTENT)):
+        frames.append(pickle.load(open(os.path.join(DATA_DIR, LEGACY_CONTENT), 'rb')))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+if __name__ == '__main__':
+    # conversion of a pickled df_jobs : python -m source.storage ./Data/
+    DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else './Data/'
+    df_jobs_pickled = pickle.load(open(os.path.join(DATA_DIR, 'df_jobs.p'), 'rb'))
+    functions = job_functions(df_jobs_pickled)
+    print('{} jobs written'.format(append_jobs(df_jobs_pickled, FunctionMatrix.from_dense(df_jobs_pickled[functions],
+                                                                                         functions), DATA_DIR)))
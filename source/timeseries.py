@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from source.storage import list_parts, load_jobs
+from source.locations import Locations
+
+"""
+Time series of the job counts.
+The daily number of jobs per canton, city and job function is kept over a rolling window of consecutive days
+(`<DATA_DIR>/timeseries.npz`). The stored jobs are counted once : after each scrapping run, only the parts of the
+dataset that are not counted yet are appended. The web app then reads the daily and weekly counts, rolling averages,
+week over week growth and trending job functions from these arrays, without going back to the jobs.
+Update command, run from the repository root : python -m source.timeseries ./Data/
+"""
+
+TIMESERIES = 'timeseries.npz'
+MAX_DAYS = 730
+DAY_BITS = 16  # days since 1970-01-01 held by the low bits of the city entry keys
+DAY_MASK = (1 << DAY_BITS) - 1
+
+
+def day_numbers(dates) -> np.ndarray:
+    """
+    Days since 1970-01-01 of a column (or a list) of dates
+    """
+    return np.asarray(pd.to_datetime(pd.Series(dates)).values.astype('datetime64[D]').astype(np.int64))
+
+
+def rolling_mean(counts, window=7) -> np.ndarray:
+    """
+    Trailing mean of daily counts over `window` days, the first days being averaged over the days available
+    """
+    cum = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    ends = np.arange(1, len(counts) + 1)
+    begins = np.maximum(ends - window, 0)
+    return (cum[ends] - cum[begins]) / (ends - begins)
+
+
+class TimeSeries:
+    """
+    Daily job counts per canton, city and job function over a rolling window of consecutive days.
+
+    The counts of the cantons are a dense (day, canton, column) array, the first column holding all the jobs
+    (`All Jobs`) as in the JobCube. Most (column, city) pairs have no job on most days : the counts of the cities
+    are sorted (series, day) entries, a series being a (column, city) pair, with their cumulative sums so that the
+    number of jobs of a series between two days is two binary searches and a subtraction.
+    Jobs are added by `append`, the days more than `max_days` days before the last one being dropped. Only the jobs
+    located in a city of Locations are counted, the canton of a job being the one of its city as in the JobCube.
+
+    Inputs:
+     - cantons : sorted canton names (canton axis), the ones of Locations
+     - n_cities : int, number of cities (city axis, codes of Locations)
+     - functions : list of the job function names
+     - first_day : int, first day of the series (days since 1970-01-01)
+     - canton_counts : (n_days, n_cantons, n_columns) int32 np.ndarray
+     - city_keys : sorted int64 np.ndarray of the (series, day) entries of the cities, series << DAY_BITS | day
+     - city_counts : int32 np.ndarray, number of jobs of each entry
+     - parts : list of the dataset parts counted, relative to the data folder
+     - max_days : int, number of days kept
+    """
+
+    def __init__(self, cantons, n_cities, functions, first_day, canton_counts, city_keys, city_counts, parts=(),
+                 max_days=MAX_DAYS):
+        self.cantons = np.asarray(cantons, dtype=object)
+        self.canton_index = {canton: idx for idx, canton in enumerate(self.cantons)}
+        self.n_cities = int(n_cities)
+        self.functions = list(functions)
+        self.first_day = int(first_day)
+        self.canton_counts = np.asarray(canton_counts, dtype=np.int32)
+        self.city_keys = np.asarray(city_keys, dtype=np.int64)
+        self.city_counts = np.asarray(city_counts, dtype=np.int32)
+        self.parts = list(parts)
+        self.max_days = max_days
+        self.index()
+
+    @classmethod
+    def empty(cls, locations, max_days=MAX_DAYS) -> 'TimeSeries':
+        """
+        Time series without any job on the axes of `locations`
+        """
+        return cls(locations.cantons, len(locations.df_cities), [], 0,
+                   np.zeros((0, len(locations.cantons), 1), dtype=np.int32), [], [], max_days=max_days)
+
+    def index(self) -> None:
+        """
+        Lookups derived from the arrays : column index and cumulative counts of the city entries
+        """
+        self.columns = ['All Jobs'] + self.functions
+        self.column_index = {column: idx for idx, column in enumerate(self.columns)}
+        self.city_cum = np.zeros(len(self.city_counts) + 1, dtype=np.int64)
+        np.cumsum(self.city_counts, out=self.city_cum[1:])
+
+    @property
+    def n_days(self) -> int:
+        return len(self.canton_counts)
+
+    @property
+    def days(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex((self.first_day + np.arange(self.n_days)).astype('datetime64[D]'))
+
+    @property
+    def version(self) -> str:
+        """
+        Fingerprint of the counted parts and of the window
+        """
+        return hashlib.sha1(json.dumps([self.parts, self.first_day, self.n_days]).encode()).hexdigest()
+
+    def compatible(self, locations) -> bool:
+        """
+        True if the axes of the series are the ones of `locations`
+        """
+        return self.n_cities == len(locations.df_cities) and list(self.cantons) == list(locations.cantons)
+
+    def set_days(self, first_day, last_day) -> None:
+        """
+        Moves the window of the series to [first_day, last_day], the counts outside being dropped
+        """
+        counts = np.zeros((last_day - first_day + 1,) + self.canton_counts.shape[1:], dtype=np.int32)
+        begin, end = max(first_day, self.first_day), min(last_day, self.first_day + self.n_days - 1)
+        if end >= begin:
+            counts[begin - first_day:end - first_day + 1] = \
+                self.canton_counts[begin - self.first_day:end - self.first_day + 1]
+        entry_days = self.city_keys & DAY_MASK
+        kept = (entry_days >= first_day) & (entry_days <= last_day)
+        self.first_day, self.canton_counts = first_day, counts
+        self.city_keys, self.city_counts = self.city_keys[kept], self.city_counts[kept]
+
+    def append(self, df_jobs, function_matrix, locations, parts=()) -> int:
+        """
+        Adds the counts of new jobs, the days being extended up to the most recent job
+
+        Inputs:
+         - df_jobs : pd.DataFrame with the `city`, `canton` and `date` of the jobs
+         - function_matrix : FunctionMatrix of the job functions, aligned with df_jobs
+         - locations : Locations the series was created with
+         - parts : names of the dataset parts of the jobs
+
+        Returns the number of jobs counted
+        """
+        # new job functions are new columns
+        known = set(self.functions)
+        new_functions = [function for function in function_matrix.functions if function not in known]
+        if new_functions:
+            self.functions += new_functions
+            padding = np.zeros(self.canton_counts.shape[:2] + (len(new_functions),), dtype=np.int32)
+            self.canton_counts = np.concatenate([self.canton_counts, padding], axis=2)
+            self.index()
+        function_columns = np.array([self.column_index[function] for function in function_matrix.functions],
+                                    dtype=np.int64)
+
+        days = day_numbers(df_jobs['date'])
+        city_codes = locations.encode_cities(df_jobs['city'], df_jobs['canton'])
+        located = city_codes >= 0
+        if located.any():
+            last_day = int(days[located].max())
+            first_day = int(days[located].min())
+            if self.n_days:
+                last_day = max(last_day, self.first_day + self.n_days - 1)
+                first_day = min(first_day, self.first_day)
+            self.set_days(max(first_day, last_day - self.max_days + 1), last_day)
+        counted = located & (days >= self.first_day)
+
+        # (job, column) entries : every job in `All Jobs` and in each of its functions
+        row_ids = function_matrix.row_ids()
+        in_window = counted[row_ids]
+        rows = np.concatenate([np.flatnonzero(counted), row_ids[in_window]])
+        columns = np.concatenate([np.zeros(counted.sum(), dtype=np.int64),
+                                  function_columns[function_matrix.indices[in_window]]])
+        n_days, n_cantons, n_columns = self.canton_counts.shape
+        flat = ((days[rows] - self.first_day) * n_cantons + locations.city_cantons[city_codes[rows]]) * n_columns + \
+            columns
+        self.canton_counts += np.bincount(flat, minlength=n_days * n_cantons * n_columns).reshape(
+            n_days, n_cantons, n_columns).astype(np.int32)
+
+        keys = (columns * self.n_cities + city_codes[rows]) << DAY_BITS | days[rows]
+        self.city_keys, inverse = np.unique(np.concatenate([self.city_keys, keys]), return_inverse=True)
+        self.city_counts = np.bincount(inverse, weights=np.concatenate([self.city_counts, np.ones(len(keys))]),
+                                       minlength=len(self.city_keys)).astype(np.int32)
+        self.parts += list(parts)
+        self.index()
+        return int(counted.sum())
+
+    def day_index(self, date) -> int:
+        """
+        Index of a date on the day axis, clipped to the days of the series
+        """
+        return int(np.clip(day_numbers([date])[0] - self.first_day, 0, max(self.n_days - 1, 0)))
+
+    def city_ranges(self, city, columns, first, last) -> [np.ndarray, np.ndarray]:
+        """
+        Ranges of the entries of a city (code of Locations) for some column indexes between two day indexes
+        """
+        series = (np.asarray(columns, dtype=np.int64) * self.n_cities + city) << DAY_BITS
+        return (np.searchsorted(self.city_keys, series + self.first_day + first, side='left'),
+                np.searchsorted(self.city_keys, series + self.first_day + last, side='right'))
+
+    def daily(self, column, canton=None, city=None) -> np.ndarray:
+        """
+        Number of jobs of a column (job function or `All Jobs`) on each day, in the whole country, in a canton
+        (name) or in a city (code of Locations)
+        """
+        col = self.column_index[column]
+        if city is not None:
+            (begin,), (end,) = self.city_ranges(city, [col], 0, self.n_days - 1)
+            counts = np.zeros(self.n_days, dtype=np.int32)
+            counts[(self.city_keys[begin:end] & DAY_MASK) - self.first_day] = self.city_counts[begin:end]
+            return counts
+        if canton is not None:
+            return self.canton_counts[:, self.canton_index[canton], col]
+        return self.canton_counts[:, :, col].sum(axis=1)
+
+    def weekly(self, column, canton=None, city=None) -> pd.Series:
+        """
+        Number of jobs of a column per week (starting on Monday), the first and last weeks being partial
+        """
+        return pd.Series(self.daily(column, canton, city), index=self.days).resample('W-MON', label='left',
+                                                                                    closed='left').sum()
+
+    def window_counts(self, first, last, canton=None, city=None) -> np.ndarray:
+        """
+        Number of jobs of every column between two day indexes (both included)
+        """
+        if city is not None:
+            begins, ends = self.city_ranges(city, np.arange(len(self.columns)), first, last)
+            return self.city_cum[ends] - self.city_cum[begins]
+        if canton is not None:
+            return self.canton_counts[first:last + 1, self.canton_index[canton]].sum(axis=0)
+        return self.canton_counts[first:last + 1].sum(axis=(0, 1))
+
+    def growth_counts(self, last=None, window=7, canton=None, city=None) -> [np.ndarray, np.ndarray]:
+        """
+        Number of jobs of every column over the `window` days ending at day index `last` (the last day by default)
+        and over the `window` days before
+        """
+        last = self.n_days - 1 if last is None else last
+        current = self.window_counts(max(last - window + 1, 0), last, canton, city)
+        previous = self.window_counts(max(last - 2 * window + 1, 0), last - window, canton, city) \
+            if last >= window else np.zeros(len(self.columns), dtype=np.int64)
+        return current, previous
+
+    def growth(self, column, last=None, window=7, canton=None, city=None) -> float:
+        """
+        Week over week (by default) growth of the number of jobs of a column, NaN without jobs the previous week
+        """
+        current, previous = self.growth_counts(last, window, canton, city)
+        col = self.column_index[column]
+        return current[col] / previous[col] - 1 if previous[col] else float('nan')
+
+    def trending(self, last=None, window=7, canton=None, city=None, k=5, min_count=5) -> pd.DataFrame:
+        """
+        The `k` job functions whose number of jobs grew the most between the `window` days before day index `last`
+        and the `window` days ending on it, among the functions having at least `min_count` jobs over the former
+
+        Returns a pd.DataFrame of the `current` and `previous` counts and of the `growth` of the functions
+        """
+        current, previous = self.growth_counts(last, window, canton, city)
+        df_trending = pd.DataFrame({'current': current[1:], 'previous': previous[1:]}, index=self.functions)
+        df_trending = df_trending[df_trending['previous'] >= max(min_count, 1)]
+        df_trending['growth'] = df_trending['current'] / df_trending['previous'] - 1
+        return df_trending.sort_values(['growth', 'current'], ascending=False, kind='stable').head(k)
+
+    def save(self, path) -> str:
+        """
+        Writes the series to an .npz file, the file being replaced only once complete
+        """
+        tmp_path = path + '.{}.tmp.npz'.format(os.getpid())
+        np.savez(tmp_path, cantons=self.cantons.astype(str), n_cities=np.array(self.n_cities),
+                 functions=np.array(self.functions, dtype=str), first_day=np.array(self.first_day),
+                 canton_counts=self.canton_counts, city_keys=self.city_keys, city_counts=self.city_counts,
+                 parts=np.array(json.dumps(self.parts)), max_days=np.array(self.max_days))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path) -> 'TimeSeries':
+        """
+        Reads a series written by `save`
+        """
+        with np.load(path) as arrays:
+            return cls(arrays['cantons'].tolist(), int(arrays['n_cities']), arrays['functions'].tolist(),
+                       int(arrays['first_day']), arrays['canton_counts'], arrays['city_keys'], arrays['city_counts'],
+                       json.loads(str(arrays['parts'])), int(arrays['max_days']))
+
+
+def update_timeseries(DATA_DIR, max_days=MAX_DAYS) -> TimeSeries:
+    """
+    Appends the parts of the dataset that are not counted yet to the time series of `DATA_DIR` and saves it. The
+    series is rebuilt when the cities or cantons changed, or when the window is different.
+    """
+    locations = Locations(pd.read_csv(os.path.join(DATA_DIR, 'df_city_coordinates.csv')),
+                          pd.read_csv(os.path.join(DATA_DIR, 'canton_naming.csv'), index_col='Idx'))
+    path = os.path.join(DATA_DIR, TIMESERIES)
+    timeseries = TimeSeries.load(path) if os.path.exists(path) else None
+    if timeseries is None or not timeseries.compatible(locations) or timeseries.max_days != max_days:
+        timeseries = TimeSeries.empty(locations, max_days)
+
+    counted = set(timeseries.parts)
+    new_parts = [part for part in list_parts(DATA_DIR) if os.path.relpath(part, DATA_DIR) not in counted]
+    if new_parts:
+        df_jobs, function_matrix = load_jobs(DATA_DIR, columns=['city', 'canton', 'date'], parts=new_parts)
+        timeseries.append(df_jobs, function_matrix, locations,
+                          parts=[os.path.relpath(part, DATA_DIR) for part in new_parts])
+    if new_parts or not os.path.exists(path):
+        timeseries.save(path)
+    return timeseries
+
+
+def load_timeseries(DATA_DIR) -> TimeSeries:
+    """
+    Loads the time series of `DATA_DIR`, None if it was not built
+    """
+    path = os.path.join(DATA_DIR, TIMESERIES)
+    return TimeSeries.load(path) if os.path.exists(path) else None
+
+
+if __name__ == '__main__':
+    DATA_DIR = sys.argv[1] if len(sys.argv) > 1 else './Data/'
+    timeseries = update_timeseries(DATA_DIR)
+    print('Time series of {} days ({} parts counted) written to {}'.format(
+        timeseries.n_days, len(timeseries.parts), os.path.join(DATA_DIR, TIMESERIES)))